@@ -0,0 +1,286 @@
+# api.py — API REST (ASGI) para integrações (compras, ERP)
+#
+#   API_TOKEN=... uvicorn api:app --host 0.0.0.0 --port 8000 --workers 2
+#
+# Reaproveita os mesmos serviços da UI (services/*), sem Streamlit.
+# Conexões: API_POOL por processo; sem conexão livre em BANCO_POOL_TIMEOUT_S
+# a resposta é 503 (Retry-After).
+import asyncio
+import contextlib
+import hmac
+import os
+import re
+
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+from services.banco import (
+    PoolEsgotado,
+    atualizar_status,
+    buscar_contrato_por_id,
+    configurar_pool,
+    criar_tabelas,
+    erros_de_banco,
+    listar_contratos_por_status,
+)
+from services.cache_docx import ler_docx_contrato, nome_download
+from services.cnpj import ClienteCNPJAsync
+from services.eventos import desde
+from services.exportacao import csv_em_pedacos
+from services.geracao import criar_contrato
+from services.modelos import nomes_modelos, semear_modelos
+from services.sla import sla_medias_finalizados
+from services.sla_analise import contratos_parados
+from services.status import STATUS_ORDEM
+
+API_TOKEN = os.getenv("API_TOKEN", "")
+API_POOL = int(os.getenv("API_POOL", "8"))
+LIMITE_PADRAO = 50
+LIMITE_MAXIMO = 500
+
+MIME_DOCX = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+
+
+# -----------------------------
+# Helpers
+# -----------------------------
+def _erro(status_code: int, mensagem: str) -> JSONResponse:
+    return JSONResponse({"erro": mensagem}, status_code=status_code)
+
+def _limite(valor, padrao: int) -> int:
+    # 1..LIMITE_MAXIMO; ValueError se não for inteiro
+    return max(1, min(int(valor if valor is not None else padrao), LIMITE_MAXIMO))
+
+async def _pool_esgotado(request, exc):
+    # banco saturado: o cliente deve tentar de novo (não é erro dele nem bug)
+    return JSONResponse({"erro": str(exc)}, status_code=503, headers={"Retry-After": "5"})
+
+def _contrato(contrato_id: int):
+    # excluídos (soft delete) não existem para a API
+    return buscar_contrato_por_id(contrato_id, incluir_excluidos=False)
+
+def _autorizado(request) -> bool:
+    if not API_TOKEN:
+        return False
+    auth = request.headers.get("authorization", "")
+    return hmac.compare_digest(auth, f"Bearer {API_TOKEN}")
+
+def _contrato_json(row) -> dict:
+    # mesma ordem de listar_contratos_por_status
+    contrato_id, numero, _razao, status, arquivo, forn_cnpj, forn_razao, versao, tipo_modelo, criado_em = row[:10]
+    return {
+        "id": contrato_id,
+        "numero": numero,
+        "status": status,
+        "fornecedor_cnpj": forn_cnpj,
+        "fornecedor_razao": forn_razao,
+        "versao": int(versao),
+        "tipo_modelo": tipo_modelo,
+        "criado_em": criado_em,
+        "tem_arquivo": bool(arquivo),
+    }
+
+def protegido(handler):
+    async def _handler(request):
+        if not _autorizado(request):
+            return _erro(401, "Token inválido ou API_TOKEN não configurado.")
+        return await handler(request)
+    return _handler
+
+
+# -----------------------------
+# Endpoints
+# -----------------------------
+async def saude(request):
+    return JSONResponse({"ok": True})
+
+@protegido
+async def criar(request):
+    try:
+        corpo = await request.json()
+    except Exception:
+        return _erro(400, "JSON inválido.")
+    if not isinstance(corpo, dict):
+        return _erro(400, "O corpo deve ser um objeto JSON.")
+
+    cnpj = str(corpo.get("cnpj") or "").strip()
+    numero = str(corpo.get("numero") or "").strip()
+    tipo_modelo = str(corpo.get("tipo_modelo") or "").strip()
+
+    if not numero:
+        return _erro(422, "O número do contrato é obrigatório.")
+    if not cnpj:
+        return _erro(422, "Informe o CNPJ.")
+    if len(re.sub(r"\D", "", cnpj)) != 14:
+        return _erro(422, "O CNPJ deve ter 14 dígitos.")
+    modelos = await asyncio.to_thread(nomes_modelos)
+    if tipo_modelo not in modelos:
+        return _erro(422, f"tipo_modelo deve ser um de: {', '.join(modelos)}")
+
+    try:
+        dados = await request.app.state.cnpj.consultar(cnpj)
+    except Exception as e:
+        status = getattr(getattr(e, "response", None), "status_code", None)
+        if status in (400, 404):
+            return _erro(422, f"CNPJ inválido ou não encontrado na BrasilAPI ({status}).")
+        return _erro(502, f"Falha ao consultar CNPJ: {e}")
+
+    integridade, falhas_banco = erros_de_banco()
+    try:
+        contrato_id, numero_final, _arquivo = await asyncio.to_thread(criar_contrato, dados, numero, tipo_modelo)
+    except ValueError as e:
+        return _erro(422, str(e))
+    except integridade as e:
+        return _erro(409, f"Conflito ao gravar o contrato: {e}")
+    except falhas_banco as e:
+        return _erro(503, f"Banco indisponível, tente de novo: {e}")
+    row = await asyncio.to_thread(_contrato, contrato_id)
+    return JSONResponse(
+        {"id": contrato_id, "numero": numero_final, "versao": int(row[7]), "status": row[3]},
+        status_code=201,
+    )
+
+@protegido
+async def listar(request):
+    status = request.query_params.get("status", "")
+    if status not in STATUS_ORDEM:
+        return _erro(422, f"status deve ser um de: {', '.join(STATUS_ORDEM)}")
+
+    try:
+        limite = _limite(request.query_params.get("limite"), LIMITE_PADRAO)
+        antes_de = request.query_params.get("antes_de")
+        antes_de = int(antes_de) if antes_de else None
+    except ValueError:
+        return _erro(422, "limite/antes_de devem ser inteiros.")
+
+    rows = await asyncio.to_thread(listar_contratos_por_status, status, limite, antes_de)
+    itens = [_contrato_json(r) for r in rows]
+    proximo = itens[-1]["id"] if len(itens) == limite else None
+    return JSONResponse({"itens": itens, "proximo": proximo})
+
+@protegido
+async def detalhe(request):
+    contrato_id = request.path_params["contrato_id"]
+    row = await asyncio.to_thread(_contrato, contrato_id)
+    if not row:
+        return _erro(404, "Contrato não encontrado.")
+    return JSONResponse({
+        "id": row[0],
+        "numero": row[1],
+        "status": row[3],
+        "fornecedor_cnpj": row[5],
+        "fornecedor_razao": row[6],
+        "versao": int(row[7]),
+        "tipo_modelo": row[8],
+        "criado_em": row[9],
+        "atualizado_em": row[10],
+        "finalizado_em": row[11],
+    })
+
+@protegido
+async def mover_status(request):
+    contrato_id = request.path_params["contrato_id"]
+    try:
+        corpo = await request.json()
+    except Exception:
+        return _erro(400, "JSON inválido.")
+    if not isinstance(corpo, dict):
+        return _erro(400, "O corpo deve ser um objeto JSON.")
+
+    novo = str(corpo.get("status") or "")
+    if novo not in STATUS_ORDEM:
+        return _erro(422, f"status deve ser um de: {', '.join(STATUS_ORDEM)}")
+
+    row = await asyncio.to_thread(_contrato, contrato_id)
+    if not row:
+        return _erro(404, "Contrato não encontrado.")
+
+    await asyncio.to_thread(atualizar_status, contrato_id, novo, corpo.get("por") or "api")
+    return JSONResponse({"id": contrato_id, "de": row[3], "para": novo})
+
+@protegido
+async def baixar_docx(request):
+    contrato_id = request.path_params["contrato_id"]
+    row = await asyncio.to_thread(_contrato, contrato_id)
+    if not row:
+        return _erro(404, "Contrato não encontrado.")
+
+    try:
+        blob = await asyncio.to_thread(ler_docx_contrato, contrato_id, row[4])
+    except (FileNotFoundError, ValueError) as e:
+        return _erro(410, str(e))
+
+    nome = nome_download(row[1], row[4], contrato_id)
+    return Response(blob, media_type=MIME_DOCX, headers={"Content-Disposition": f'attachment; filename="{nome}"'})
+
+@protegido
+async def sla(request):
+    medias = await asyncio.to_thread(sla_medias_finalizados)
+    return JSONResponse(medias or {"N": 0})
+
+@protegido
+async def envelhecimento(request):
+    try:
+        k = _limite(request.query_params.get("k"), 10)
+    except ValueError:
+        return _erro(422, "k deve ser inteiro.")
+    return JSONResponse(await asyncio.to_thread(contratos_parados, k))
+
+@protegido
+async def exportar_csv(request):
+    tipo = request.path_params["tipo"]
+    if tipo not in ("contratos", "historico"):
+        return _erro(404, "Exportação inexistente.")
+    status = request.query_params.get("status") or None
+    if status and status not in STATUS_ORDEM:
+        return _erro(422, f"status deve ser um de: {', '.join(STATUS_ORDEM)}")
+    fornecedor = request.query_params.get("fornecedor_cnpj") or None
+
+    return StreamingResponse(
+        csv_em_pedacos(tipo, status=status, fornecedor_cnpj=fornecedor),
+        media_type="text/csv; charset=utf-8",
+        headers={"Content-Disposition": f'attachment; filename="{tipo}.csv"'},
+    )
+
+@protegido
+async def feed_eventos(request):
+    # feed de mudanças: guarde "proximo" e peça de novo com desde=proximo
+    try:
+        seq = int(request.query_params.get("desde", 0))
+        limite = _limite(request.query_params.get("limite"), LIMITE_MAXIMO)
+    except ValueError:
+        return _erro(422, "desde/limite devem ser inteiros.")
+    eventos, proximo = await asyncio.to_thread(desde, seq, limite)
+    return JSONResponse({"eventos": eventos, "proximo": proximo})
+
+
+# -----------------------------
+# App
+# -----------------------------
+@contextlib.asynccontextmanager
+async def _ciclo_de_vida(app):
+    criar_tabelas()
+    semear_modelos()
+    configurar_pool(API_POOL)
+    async with ClienteCNPJAsync() as cli:
+        app.state.cnpj = cli
+        yield
+
+
+app = Starlette(
+    routes=[
+        Route("/saude", saude),
+        Route("/contratos", criar, methods=["POST"]),
+        Route("/contratos", listar, methods=["GET"]),
+        Route("/contratos/{contrato_id:int}", detalhe, methods=["GET"]),
+        Route("/contratos/{contrato_id:int}/status", mover_status, methods=["POST"]),
+        Route("/contratos/{contrato_id:int}/docx", baixar_docx, methods=["GET"]),
+        Route("/sla", sla, methods=["GET"]),
+        Route("/sla/envelhecimento", envelhecimento, methods=["GET"]),
+        Route("/exportacao/{tipo}.csv", exportar_csv, methods=["GET"]),
+        Route("/eventos", feed_eventos, methods=["GET"]),
+    ],
+    exception_handlers={PoolEsgotado: _pool_esgotado},
+    lifespan=_ciclo_de_vida,
+)
@@ -1,175 +1,81 @@
 # app.py (CONSOLIDADO)
 import os
-from datetime import datetime, timedelta, timezone
+import time
+from datetime import timedelta
 
 import streamlit as st
+from streamlit.errors import StreamlitAPIException
 
+from services import eventos
 from services.banco import (
     criar_tabelas,
-    inserir_contrato_fornecedor,
-    atualizar_numero_arquivo,
     listar_contratos_por_status,
-    contar_por_status,
+    contar_por_status_com_seq,
+    buscar_contratos_da_etapa,
+    ultimo_evento_seq,
     listar_fornecedores_resumo,
     listar_versoes_por_fornecedor,
-    buscar_contrato_por_id,
     atualizar_status,
+    atualizar_status_em_lote,
     excluir_contrato,
-    listar_finalizados,
-    obter_status_logs,
 )
 from services.auth import autenticar, garantir_admin_padrao
-from services.cnpj import consultar_cnpj
-from services.contrato import gerar_contrato, gerar_numero_contrato
+from services.cache_docx import ler_docx_contrato, nome_download
+from services.modelos import nomes_modelos, semear_modelos
+from services.reconciliacao import iniciar_em_segundo_plano
+from services.status import ETAPAS_POR_PERFIL, STATUS_LABEL, STATUS_ORDEM
 
-
-# -----------------------------
-# Config
-# -----------------------------
-MODELOS = {
-    "NDA": "templates/nda.docx",
-    "Contrato de API": "templates/contrato_api.docx",
-}
-
-STATUS_LABEL = {
-    "FILA_INICIO": "🧾 Fila de Início",
-    "ANALISE_JURIDICA_LGPD": "🟨 Jurídico/LGPD",
-    "ANALISE_DEMANDANTE": "🟦 Demandante",
-    "ANALISE_FORNECEDOR": "🟧 Fornecedor",
-    "FINALIZADO": "🟩 Finalizado",
-}
-STATUS_ORDEM = list(STATUS_LABEL.keys())
+# Módulos pesados (python-docx, requests, numpy, openpyxl, LibreOffice/UNO)
+# são importados só onde são usados, para a tela de login abrir rápido.
 
 
 # -----------------------------
-# SLA (horas úteis seg-sex 09-18)
+# Init (1x por processo, não a cada rerun)
 # -----------------------------
-def parse_iso(ts: str) -> datetime:
-    # banco salva ISO com timezone UTC
-    return datetime.fromisoformat(ts)
-
-def business_seconds(start: datetime, end: datetime) -> int:
-    """
-    Conta segundos dentro do horário útil (09:00–18:00) em dias úteis (seg-sex).
-    Observação: Streamlit Cloud roda em UTC; aqui consideramos 09–18 UTC.
-    Se quiser 09–18 America/Sao_Paulo, eu ajusto com timezone depois.
-    """
-    if not start or not end or end <= start:
-        return 0
-
-    work_start_h = 9
-    work_end_h = 18
-
-    cur = start
-    total = 0
+# contagens, fornecedores e parados vêm do índice em memória (services/indice,
+# numpy) assim que ele carregar; sem a variável, tudo sai do banco
+INDICE_MEMORIA = os.getenv("INDICE_MEMORIA", "0") == "1"
 
-    while cur < end:
-        # fim de semana
-        if cur.weekday() >= 5:
-            cur = datetime(cur.year, cur.month, cur.day, 0, 0, tzinfo=cur.tzinfo) + timedelta(days=1)
-            continue
+@st.cache_resource(show_spinner=False)
+def inicializar() -> bool:
+    criar_tabelas()
+    semear_modelos()
+    iniciar_em_segundo_plano()
+    eventos.iniciar_em_segundo_plano()
+    if INDICE_MEMORIA:
+        from services import indice
 
-        day_start = datetime(cur.year, cur.month, cur.day, work_start_h, 0, tzinfo=cur.tzinfo)
-        day_end = datetime(cur.year, cur.month, cur.day, work_end_h, 0, tzinfo=cur.tzinfo)
+        indice.iniciar_em_segundo_plano()
+    return garantir_admin_padrao()
 
-        window_start = max(cur, day_start)
-        window_end = min(end, day_end)
+admin_ok = inicializar()
 
-        if window_end > window_start:
-            total += int((window_end - window_start).total_seconds())
+# contadores, lista e avisos se atualizam sozinhos lendo o feed de mudanças
+# (barramento em memória: sem SQL enquanto nada muda)
+INTERVALO_FEED = eventos.INTERVALO_S if eventos.ativo() else None
+RESSINCRONIZAR_S = 600  # arquivamento etc. mudam contagens sem passar pelo feed
 
-        cur = datetime(cur.year, cur.month, cur.day, 0, 0, tzinfo=cur.tzinfo) + timedelta(days=1)
 
-    return total
-
-def sec_to_hours(sec: int) -> float:
-    return round(sec / 3600, 2)
-
-def sec_to_business_days(sec: int) -> float:
-    # 9h úteis = 1 dia útil
-    return round((sec / 3600) / 9, 2)
-
-def sla_por_etapa(contrato_id: int) -> dict:
-    """
-    Retorna {status: segundos_uteis} para um contrato, até FINALIZADO.
-    Usa status_log (entrada em cada etapa).
-    """
-    logs = obter_status_logs(contrato_id)  # (de_status, para_status, alterado_em)
-    timeline = []
-    for _de, para, ts in logs:
-        if para and ts:
-            timeline.append((para, parse_iso(ts)))
-
-    if not timeline:
-        return {}
-
-    by_stage = {}
-    for i, (status_i, t_i) in enumerate(timeline):
-        if status_i == "FINALIZADO":
-            break
-        if i + 1 >= len(timeline):
-            break
-        status_next, t_next = timeline[i + 1]
-        # Se o próximo já é FINALIZADO, conta tempo até ele e para
-        sec = business_seconds(t_i, t_next)
-        by_stage[status_i] = by_stage.get(status_i, 0) + sec
-        if status_next == "FINALIZADO":
-            break
-
-    return by_stage
-
-def sla_medias_finalizados():
+def _indice(sincronizado: bool = False):
     """
-    Retorna médias (dias úteis) para:
-      - Total (criado_em -> finalizado_em)
-      - Por etapa: Jurídico, Demandante, Fornecedor (e fila se quiser)
-    Considera apenas contratos FINALIZADOS.
+    services.indice, se INDICE_MEMORIA=1 e já carregado; senão None (usa o banco).
+    sincronizado=True (rerun completo): antes, aplica os eventos até agora,
+    para quem acabou de gravar ver a mudança.
     """
-    finalizados = listar_finalizados()  # (id, criado_em, finalizado_em)
-    if not finalizados:
+    if not INDICE_MEMORIA:
         return None
+    from services import indice
 
-    soma_total = 0
-    soma_etapas = {s: 0 for s in STATUS_ORDEM}
-    n = 0
-
-    for cid, criado_em, finalizado_em in finalizados:
-        try:
-            ini = parse_iso(criado_em)
-            fim = parse_iso(finalizado_em)
-        except Exception:
-            continue
-
-        total_sec = business_seconds(ini, fim)
-        soma_total += total_sec
-
-        etapas = sla_por_etapa(cid)
-        for etapa, sec in etapas.items():
-            if etapa in soma_etapas:
-                soma_etapas[etapa] += sec
-
-        n += 1
-
-    if n == 0:
+    if not indice.pronto():
         return None
+    if sincronizado:
+        indice.sincronizar_agora()
+    return indice
 
-    medias = {
-        "N": n,
-        "TOTAL_DIAS_UTEIS": sec_to_business_days(int(soma_total / n)),
-        "POR_ETAPA_DIAS_UTEIS": {
-            k: sec_to_business_days(int(v / n))
-            for k, v in soma_etapas.items()
-            if k != "FINALIZADO"
-        },
-    }
-    return medias
-
+def _contagem_com_seq(sincronizado: bool = False):
+    idx = _indice(sincronizado)
+    return idx.contar_por_status_com_seq() if idx else contar_por_status_com_seq()
 
-# -----------------------------
-# Init
-# -----------------------------
-criar_tabelas()
-admin_ok = garantir_admin_padrao()
 
 if "logado" not in st.session_state:
     st.session_state.logado = False
@@ -178,9 +84,11 @@ if "perfil" not in st.session_state:
 if "username" not in st.session_state:
     st.session_state.username = None
 if "view" not in st.session_state:
-    st.session_state.view = "RESUMO"  # RESUMO | LISTA | FORNECEDORES
+    st.session_state.view = "RESUMO"  # RESUMO | LISTA | FORNECEDORES | MODELOS
 if "filtro_status" not in st.session_state:
     st.session_state.filtro_status = "FILA_INICIO"
+# resultado de ações feitas dentro de um cartão (vale até o próximo rerun completo)
+st.session_state.cartoes_alterados = {}
 
 
 # -----------------------------
@@ -235,15 +143,51 @@ if st.sidebar.button("🏢 Fornecedores"):
     st.session_state.view = "FORNECEDORES"
     st.rerun()
 
+if perfil == "ADMIN" and st.sidebar.button("🧩 Modelos"):
+    st.session_state.view = "MODELOS"
+    st.rerun()
+
 if st.sidebar.button("Sair"):
     st.session_state.logado = False
     st.session_state.perfil = None
     st.session_state.username = None
     st.session_state.view = "RESUMO"
     st.session_state.filtro_status = "FILA_INICIO"
+    st.session_state.pop("feed_avisos", None)
     st.rerun()
 
 
+# -----------------------------
+# Avisos: contratos que entraram nas etapas do perfil
+# -----------------------------
+@st.fragment(run_every=INTERVALO_FEED)
+def avisos_etapa():
+    etapas = ETAPAS_POR_PERFIL.get(perfil, [])
+    if not etapas or INTERVALO_FEED is None:
+        return
+    if "feed_avisos" not in st.session_state:
+        st.session_state.feed_avisos = {"seq": ultimo_evento_seq(), "total": 0}
+    feed = st.session_state.feed_avisos
+
+    novos = eventos.ler(feed["seq"])
+    if novos is None:
+        feed["seq"] = ultimo_evento_seq()
+    elif novos:
+        feed["seq"] = novos[-1]["seq"]
+        entraram = eventos.entraram_nas_etapas(novos, etapas, exceto_por=username)
+        for ev in entraram[:3]:
+            st.toast(f"{ev['numero'] or '(sem número)'} · {ev['fornecedor_razao'] or ''} entrou em {STATUS_LABEL[ev['para']]}", icon="🔔")
+        if len(entraram) > 3:
+            st.toast(f"e mais {len(entraram) - 3} contrato(s) nas suas etapas", icon="🔔")
+        feed["total"] += len(entraram)
+
+    if feed["total"]:
+        st.caption(f"🔔 {feed['total']} contrato(s) entraram em {', '.join(STATUS_LABEL[e] for e in etapas)} desde o login")
+
+with st.sidebar:
+    avisos_etapa()
+
+
 # -----------------------------
 # Permissões
 # -----------------------------
@@ -257,22 +201,99 @@ def pode_mover_status():
 def pode_excluir():
     return perfil == "ADMIN"
 
+def pode_gerenciar_modelos():
+    return perfil == "ADMIN"
+
+
+# -----------------------------
+# Rerun parcial (st.fragment)
+# -----------------------------
+# Cartões, formulário de geração e bloco de SLA são fragments: interagir com
+# eles reexecuta só a função deles, não a página inteira (consultas da lista,
+# contadores, sidebar...). Navegação e ações em lote continuam com rerun completo.
+def rerun_fragmento():
+    try:
+        st.rerun(scope="fragment")
+    except StreamlitAPIException:
+        # fragment rodando dentro de um rerun completo: não há escopo parcial
+        st.rerun()
+
+def marcar_cartao(contrato_id: int, situacao: str):
+    # o cartão já desenhado passa a mostrar o resultado até o próximo rerun completo
+    st.session_state.cartoes_alterados[contrato_id] = situacao
+    rerun_fragmento()
+
 
 # -----------------------------
 # UI helpers
 # -----------------------------
-def download_docx(contrato_id: int, arquivo: str):
-    if arquivo and os.path.exists(arquivo):
-        with open(arquivo, "rb") as f:
-            st.download_button(
-                "⬇️ Baixar contrato (.docx)",
-                f.read(),
-                file_name=os.path.basename(arquivo),
-                mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document",
-                key=f"dl_{contrato_id}",
+def download_docx(contrato_id: int, arquivo: str, numero: str | None = None):
+    # o DOCX só é lido/renderizado quando o usuário clica (callable);
+    # se o arquivo sumiu (deploy), é reconstruído a partir do banco
+    st.download_button(
+        "⬇️ Baixar contrato (.docx)",
+        lambda: ler_docx_contrato(contrato_id, arquivo),
+        file_name=nome_download(numero, arquivo, contrato_id),
+        mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+        key=f"dl_{contrato_id}",
+        on_click="ignore",
+    )
+    st.download_button(
+        "⬇️ Baixar contrato (.pdf)",
+        lambda: _pdf_contrato(contrato_id, arquivo),
+        file_name=os.path.splitext(nome_download(numero, arquivo, contrato_id))[0] + ".pdf",
+        mime="application/pdf",
+        key=f"pdf_{contrato_id}",
+        on_click="ignore",
+    )
+
+def _pdf_contrato(contrato_id: int, arquivo: str) -> bytes:
+    from services.pdf import converter_para_pdf
+
+    return converter_para_pdf(ler_docx_contrato(contrato_id, arquivo))
+
+def exportar_etapa_pdf(contratos) -> bytes:
+    from services.pdf import exportar_lote_pdf
+
+    itens = []
+    for row in contratos:
+        contrato_id, numero, arquivo = row[0], row[1], row[4]
+        # id na frente: números diferentes podem virar o mesmo nome de arquivo
+        nome = f"{contrato_id}_{os.path.splitext(nome_download(numero, arquivo, contrato_id))[0]}.pdf"
+        itens.append((nome, ler_docx_contrato(contrato_id, arquivo)))
+    return exportar_lote_pdf(itens)
+
+def _ler_exportacao(tipo: str, formato: str, filtros: dict) -> bytes:
+    from services.exportacao import exportar_para_arquivo_temporario
+
+    caminho = exportar_para_arquivo_temporario(tipo, formato, **filtros)
+    try:
+        with open(caminho, "rb") as f:
+            return f.read()
+    finally:
+        os.remove(caminho)
+
+@st.fragment
+def exportar_ui(chave: str, nome_base: str, **filtros):
+    with st.expander("📤 Exportar (CSV/XLSX)", expanded=False):
+        e1, e2 = st.columns(2)
+        with e1:
+            tipo = st.radio(
+                "Conteúdo",
+                ["contratos", "historico"],
+                format_func=lambda t: "Contratos + SLA por etapa" if t == "contratos" else "Histórico de status",
+                key=f"exp_tipo_{chave}",
             )
-    else:
-        st.caption("Arquivo não encontrado (pode ter sido removido no deploy).")
+        with e2:
+            formato = st.radio("Formato", ["csv", "xlsx"], format_func=str.upper, key=f"exp_fmt_{chave}")
+        st.download_button(
+            "⬇️ Exportar",
+            lambda: _ler_exportacao(tipo, formato, filtros),
+            file_name=f"{nome_base}_{tipo}.{formato}",
+            mime="text/csv" if formato == "csv" else "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+            key=f"exp_btn_{chave}",
+            on_click="ignore",
+        )
 
 def mover_status_ui(contrato_id: int, atual: str):
     if not pode_mover_status():
@@ -286,9 +307,72 @@ def mover_status_ui(contrato_id: int, atual: str):
     )
     if novo != atual:
         atualizar_status(contrato_id, novo, username)
-        st.rerun()
+        marcar_cartao(contrato_id, novo)
 
-def excluir_contrato_ui(contrato_id: int, numero: str, arquivo: str):
+def mover_em_lote_ui(contratos, atual: str):
+    if not pode_mover_status() or not contratos:
+        return
+    with st.expander("🔀 Mover vários contratos", expanded=False):
+        rotulos = {row[0]: f"{row[1] or '(sem número)'} · {row[6] or '(sem razão social)'}" for row in contratos}
+        todos = st.checkbox("Selecionar todos da etapa", key=f"lote_todos_{atual}")
+        selecionados = st.multiselect(
+            "Contratos",
+            list(rotulos.keys()),
+            format_func=lambda cid: rotulos[cid],
+            disabled=todos,
+            key=f"lote_sel_{atual}",
+        )
+        ids = list(rotulos.keys()) if todos else selecionados
+        destino = st.selectbox(
+            "Mover para",
+            [s for s in STATUS_ORDEM if s != atual],
+            format_func=lambda s: STATUS_LABEL[s],
+            key=f"lote_dest_{atual}",
+        )
+        if st.button(f"Mover {len(ids)} contrato(s)", key=f"lote_btn_{atual}", disabled=not ids):
+            movidos = atualizar_status_em_lote(ids, destino, username)
+            st.success(f"{movidos} contrato(s) movido(s) para {STATUS_LABEL[destino]}.")
+            st.rerun()
+
+def _cartao_alterado(contrato_id: int) -> bool:
+    situacao = st.session_state.cartoes_alterados.get(contrato_id)
+    if situacao is None:
+        return False
+    if situacao == "EXCLUIDO":
+        st.caption("🗑️ Contrato excluído.")
+    else:
+        st.caption(f"✅ Movido para {STATUS_LABEL[situacao]}.")
+    return True
+
+@st.fragment
+def cartao_contrato(row):
+    # banco.py consolidado retorna:
+    # id, numero, razao_social, status, arquivo, fornecedor_cnpj, fornecedor_razao, versao, tipo_modelo, criado_em
+    contrato_id, numero, _razao, stt, arquivo, forn_cnpj, forn_razao, versao, tipo_modelo, criado_em = row
+
+    with st.container(border=True):
+        st.markdown(f"**{numero or '(sem número)'}** · `v{int(versao)}` · **{tipo_modelo or 'modelo?'}**")
+        st.write(forn_razao or "(sem razão social)")
+        st.caption(f"CNPJ: {forn_cnpj}")
+        if _cartao_alterado(contrato_id):
+            return
+
+        download_docx(contrato_id, arquivo, numero)
+        mover_status_ui(contrato_id, stt)
+        excluir_contrato_ui(contrato_id, numero or "(sem número)")
+
+@st.fragment
+def cartao_versao(cid: int, num: str, stt: str, arq: str, ver: int, tipo_modelo: str):
+    with st.container(border=True):
+        st.markdown(
+            f"**{num or '(sem número)'}** · `v{int(ver)}` · **{tipo_modelo or 'modelo?'}** · {STATUS_LABEL.get(stt, stt)}"
+        )
+        if _cartao_alterado(cid):
+            return
+        download_docx(cid, arq, num)
+        excluir_contrato_ui(cid, num or "(sem número)")
+
+def excluir_contrato_ui(contrato_id: int, numero: str):
     if not pode_excluir():
         return
     with st.expander("🗑️ Excluir contrato (com justificativa)", expanded=False):
@@ -296,20 +380,65 @@ def excluir_contrato_ui(contrato_id: int, numero: str, arquivo: str):
         justificativa = st.text_area("Justificativa (mínimo 15 caracteres)", key=f"just_{contrato_id}")
         ok = (justificativa or "").strip()
         if st.button("Excluir", key=f"exc_{contrato_id}", disabled=len(ok) < 15):
-            # tenta remover arquivo gerado (se existir)
-            if arquivo and os.path.exists(arquivo):
-                try:
-                    os.remove(arquivo)
-                except Exception:
-                    pass
+            # o arquivo gerado é removido pelo reconciliador (services/reconciliacao.py)
             afetadas = excluir_contrato(contrato_id, ok, username)
             if afetadas == 1:
-                st.success("Contrato excluído.")
-                st.rerun()
+                marcar_cartao(contrato_id, "EXCLUIDO")
             else:
                 st.error("Não foi possível excluir (ID não encontrado).")
 
 
+# -----------------------------
+# Contadores e lista ao vivo (feed de mudanças)
+# -----------------------------
+# O rerun completo carrega do banco junto com o seq do feed; a cada
+# INTERVALO_FEED o fragment aplica só os eventos novos (lidos da memória).
+@st.fragment(run_every=INTERVALO_FEED)
+def contadores_resumo():
+    feed = st.session_state.feed_contagem
+    novos = eventos.ler(feed["seq"])
+    if novos is None or time.monotonic() - feed["lido_em"] > RESSINCRONIZAR_S:
+        feed["contagem"], feed["seq"] = _contagem_com_seq()
+        feed["lido_em"] = time.monotonic()
+    elif novos:
+        eventos.aplicar_em_contagem(feed["contagem"], novos)
+        feed["seq"] = novos[-1]["seq"]
+
+    cols = st.columns(len(STATUS_ORDEM))
+    for i, status in enumerate(STATUS_ORDEM):
+        with cols[i]:
+            with st.container(border=True):
+                st.metric(label=STATUS_LABEL[status], value=feed["contagem"].get(status, 0))
+                if st.button("Acessar contratos", key=f"ac_{status}"):
+                    st.session_state.view = "LISTA"
+                    st.session_state.filtro_status = status
+                    st.rerun()
+
+@st.fragment(run_every=INTERVALO_FEED)
+def lista_etapa(status: str):
+    # só os cartões que entraram/saíram da etapa são buscados de novo
+    feed = st.session_state.feed_lista
+    novos = eventos.ler(feed["seq"])
+    if novos is None:
+        feed["seq"] = ultimo_evento_seq()
+        feed["rows"] = listar_contratos_por_status(status)
+    elif novos:
+        afetados = eventos.contratos_afetados(novos, status)
+        if afetados:
+            # cartão alterado nesta sessão continua à vista, com o resultado
+            por_id = {
+                r[0]: r for r in feed["rows"]
+                if r[0] not in afetados or r[0] in st.session_state.cartoes_alterados
+            }
+            por_id.update((r[0], r) for r in buscar_contratos_da_etapa(afetados, status))
+            feed["rows"] = sorted(por_id.values(), key=lambda r: r[0], reverse=True)
+        feed["seq"] = novos[-1]["seq"]
+
+    st.metric(f"Total em {STATUS_LABEL[status]}", len(feed["rows"]))
+    for row in feed["rows"]:
+        cartao_contrato(row)
+
+
 # -----------------------------
 # Página
 # -----------------------------
@@ -319,12 +448,14 @@ st.title("📄 Gestão de Contratos")
 # -----------------------------
 # Gerar contrato (NDA / API) + número manual obrigatório
 # -----------------------------
-if pode_criar_contrato():
+@st.fragment
+def form_gerar_contrato():
     st.subheader("➕ Gerar contrato (entra na Fila de Início)")
 
     c1, c2 = st.columns([1.1, 1])
     with c1:
-        tipo_modelo = st.selectbox("Tipo de contrato", list(MODELOS.keys()))
+        # lido do registro a cada execução: modelo publicado aparece sem reiniciar
+        tipo_modelo = st.selectbox("Tipo de contrato", nomes_modelos())
     with c2:
         numero_manual = st.text_input("Número do contrato (obrigatório)", placeholder="Ex: CT-2026-001")
 
@@ -340,69 +471,59 @@ if pode_criar_contrato():
                 st.error("Informe o CNPJ.")
                 st.stop()
 
-            template_path = MODELOS[tipo_modelo]
-            if not os.path.exists(template_path):
-                st.error(f"Modelo não encontrado: {template_path}")
-                st.stop()
+            from services.cnpj import consultar_cnpj
+            from services.geracao import criar_contrato
 
             dados = consultar_cnpj(cnpj)
 
-            fornecedor_cnpj = dados.get("cnpj", "")
-            fornecedor_razao = dados.get("razao_social", "")
-
-            contrato_id = inserir_contrato_fornecedor(
-                fornecedor_cnpj=fornecedor_cnpj,
-                fornecedor_razao=fornecedor_razao,
-                status="FILA_INICIO",
-                tipo_modelo=tipo_modelo,
-            )
-
-            numero_final = gerar_numero_contrato(numero_manual)
-
-            arquivo = gerar_contrato(
-                dados_fornecedor=dados,
-                numero_contrato=numero_final,
-                template_path=template_path,
-            )
-
-            atualizar_numero_arquivo(contrato_id, numero_final, arquivo)
+            contrato_id, numero_final, arquivo = criar_contrato(dados, numero_manual, tipo_modelo)
 
             st.success(f"{tipo_modelo} gerado com sucesso: {numero_final}")
-            download_docx(contrato_id, arquivo)
+            download_docx(contrato_id, arquivo, numero_final)
 
         except Exception as e:
             st.error(f"Erro ao gerar contrato: {e}")
 
+if pode_criar_contrato():
+    form_gerar_contrato()
+
 
 # -----------------------------
-# Views
+# SLA (fragment: filtros não reexecutam a página)
 # -----------------------------
-if st.session_state.view == "RESUMO":
-    st.divider()
-    st.header("📊 Resumo por etapa")
-
-    counts = contar_por_status()
-    cols = st.columns(len(STATUS_ORDEM))
-
-    for i, status in enumerate(STATUS_ORDEM):
-        with cols[i]:
-            with st.container(border=True):
-                st.metric(label=STATUS_LABEL[status], value=counts.get(status, 0))
-                if st.button("Acessar contratos", key=f"ac_{status}"):
-                    st.session_state.view = "LISTA"
-                    st.session_state.filtro_status = status
-                    st.rerun()
-
-    st.divider()
-    st.header("⏱️ SLA (média em dias úteis) – Finalizados")
-
-    medias = sla_medias_finalizados()
-    if not medias:
+@st.fragment
+def secao_sla():
+    from services.sla_analise import analisar_sla
+
+    st.header("⏱️ SLA (dias úteis) – Finalizados")
+
+    with st.expander("Filtros", expanded=False):
+        f1, f2, f3 = st.columns([1.4, 1, 0.8])
+        with f1:
+            periodo = st.date_input("Finalizados entre", value=(), format="DD/MM/YYYY", key="sla_periodo")
+        with f2:
+            modelo_sla = st.selectbox("Modelo", ["(todos)"] + nomes_modelos(), key="sla_modelo")
+        with f3:
+            por_mes = st.checkbox("Quebrar por mês", key="sla_mes")
+
+    inicio_sla = periodo[0].isoformat() if len(periodo) >= 1 else None
+    fim_sla = (periodo[1] + timedelta(days=1)).isoformat() if len(periodo) == 2 else None
+
+    analise = analisar_sla(
+        inicio=inicio_sla,
+        fim=fim_sla,
+        tipo_modelo=None if modelo_sla == "(todos)" else modelo_sla,
+        por_mes=por_mes,
+    )
+    if not analise:
         st.info("Ainda não há contratos finalizados suficientes para calcular SLA.")
     else:
+        def _pcts(e):
+            return f"p50 {e['p50']} · p90 {e['p90']} · p95 {e['p95']}"
+
         with st.container(border=True):
-            st.metric("SLA médio TOTAL (dias úteis)", medias["TOTAL_DIAS_UTEIS"])
-            st.caption(f"Base: {medias['N']} contrato(s) finalizado(s).")
+            st.metric("SLA médio TOTAL (dias úteis)", analise["TOTAL"]["media"])
+            st.caption(f"{_pcts(analise['TOTAL'])} — base: {analise['N']} contrato(s) finalizado(s).")
 
         # cards por etapa (principais)
         order = ["ANALISE_JURIDICA_LGPD", "ANALISE_DEMANDANTE", "ANALISE_FORNECEDOR"]
@@ -410,10 +531,62 @@ if st.session_state.view == "RESUMO":
         for idx, etapa in enumerate(order):
             with ecols[idx]:
                 with st.container(border=True):
-                    st.metric(
-                        f"SLA médio {STATUS_LABEL[etapa]} (dias úteis)",
-                        medias["POR_ETAPA_DIAS_UTEIS"].get(etapa, 0.0),
-                    )
+                    est = analise["POR_ETAPA"][etapa]
+                    st.metric(f"SLA médio {STATUS_LABEL[etapa]} (dias úteis)", est["media"])
+                    st.caption(_pcts(est))
+
+        if por_mes:
+            linhas = []
+            for mes, r in analise["POR_MES"].items():
+                linha = {"Mês": mes, "N": r["N"], "Total (média)": r["TOTAL"]["media"], "Total (p90)": r["TOTAL"]["p90"]}
+                for etapa in order:
+                    linha[f"{STATUS_LABEL[etapa]} (média)"] = r["POR_ETAPA"][etapa]["media"]
+                    linha[f"{STATUS_LABEL[etapa]} (p90)"] = r["POR_ETAPA"][etapa]["p90"]
+                linhas.append(linha)
+            st.dataframe(linhas, hide_index=True, width="stretch")
+
+
+# -----------------------------
+# Views
+# -----------------------------
+if st.session_state.view == "RESUMO":
+    st.divider()
+    st.header("📊 Resumo por etapa")
+
+    contagem, seq = _contagem_com_seq(sincronizado=True)
+    st.session_state.feed_contagem = {"contagem": contagem, "seq": seq, "lido_em": time.monotonic()}
+    contadores_resumo()
+
+    st.divider()
+    st.header("⏳ Parados há mais tempo (agora)")
+
+    # numpy só carrega aqui, depois que os contadores já foram desenhados
+    from services.sla_analise import contratos_parados
+
+    parados = contratos_parados(k=10)
+    abas = st.tabs([STATUS_LABEL[e] for e in parados])
+    for aba, (etapa, itens) in zip(abas, parados.items()):
+        with aba:
+            if not itens:
+                st.caption("Nenhum contrato nesta etapa.")
+                continue
+            st.dataframe(
+                [
+                    {
+                        "Número": i["numero"] or "(sem número)",
+                        "Fornecedor": i["fornecedor"] or "",
+                        "Modelo": i["tipo_modelo"],
+                        "Na etapa desde": (i["desde"] or "")[:16].replace("T", " "),
+                        "Dias úteis": i["dias_uteis"],
+                    }
+                    for i in itens
+                ],
+                hide_index=True,
+                width="stretch",
+            )
+
+    st.divider()
+    secao_sla()
 
 
 elif st.session_state.view == "LISTA":
@@ -430,48 +603,141 @@ elif st.session_state.view == "LISTA":
     )
     st.session_state.filtro_status = status_escolhido
 
+    # seq antes da lista: eventos no meio do caminho são reaplicados (idempotente)
+    seq = ultimo_evento_seq()
     contratos = listar_contratos_por_status(status_escolhido)
+    st.session_state.feed_lista = {"seq": seq, "rows": contratos}
 
     with st.container(border=True):
-        st.metric(f"Total em {STATUS_LABEL[status_escolhido]}", len(contratos))
+        if contratos:
+            st.download_button(
+                "📦 Exportar etapa em PDF (.zip)",
+                lambda: exportar_etapa_pdf(contratos),
+                file_name=f"{status_escolhido.lower()}_pdf.zip",
+                mime="application/zip",
+                key=f"pdf_lote_{status_escolhido}",
+                on_click="ignore",
+            )
         if st.button("⬅️ Voltar para Resumo"):
             st.session_state.view = "RESUMO"
             st.rerun()
 
-    for row in contratos:
-        # banco.py consolidado retorna:
-        # id, numero, razao_social, status, arquivo, fornecedor_cnpj, fornecedor_razao, versao, tipo_modelo, criado_em
-        contrato_id, numero, _razao, stt, arquivo, forn_cnpj, forn_razao, versao, tipo_modelo, criado_em = row
-
-        with st.container(border=True):
-            st.markdown(f"**{numero or '(sem número)'}** · `v{int(versao)}` · **{tipo_modelo or 'modelo?'}**")
-            st.write(forn_razao or "(sem razão social)")
-            st.caption(f"CNPJ: {forn_cnpj}")
+    mover_em_lote_ui(contratos, status_escolhido)
+    exportar_ui(f"lista_{status_escolhido}", status_escolhido.lower(), status=status_escolhido)
 
-            download_docx(contrato_id, arquivo)
-            mover_status_ui(contrato_id, stt)
-            excluir_contrato_ui(contrato_id, numero or "(sem número)", arquivo)
+    lista_etapa(status_escolhido)
 
 
 elif st.session_state.view == "FORNECEDORES":
     st.divider()
     st.header("🏢 Fornecedores (consolidado)")
 
-    fornecedores = listar_fornecedores_resumo()
+    idx = _indice(sincronizado=True)
+    fornecedores = idx.fornecedores_resumo() if idx else listar_fornecedores_resumo()
     if not fornecedores:
         st.info("Ainda não há fornecedores com contratos.")
     else:
         with st.container(border=True):
             st.metric("Fornecedores com contratos", len(fornecedores))
+        exportar_ui("fornecedores", "fornecedores")
 
         for forn_cnpj, forn_razao, total, max_versao in fornecedores:
             titulo = f"{forn_razao} | {forn_cnpj} — {int(total)} contrato(s), até v{int(max_versao)}"
             with st.expander(titulo, expanded=False):
                 versoes = listar_versoes_por_fornecedor(forn_cnpj)
-                for (cid, num, stt, arq, ver, tipo_modelo) in versoes:
-                    with st.container(border=True):
-                        st.markdown(
-                            f"**{num or '(sem número)'}** · `v{int(ver)}` · **{tipo_modelo or 'modelo?'}** · {STATUS_LABEL.get(stt, stt)}"
-                        )
-                        download_docx(cid, arq)
-                        excluir_contrato_ui(cid, num or "(sem número)", arq)
+                exportar_ui(f"forn_{forn_cnpj}", f"fornecedor_{forn_cnpj}", fornecedor_cnpj=forn_cnpj)
+                for versao in versoes:
+                    cartao_versao(*versao)
+
+
+elif st.session_state.view == "MODELOS" and pode_gerenciar_modelos():
+    from services.modelos import (
+        ModeloInvalido,
+        ativar_versao,
+        carregar_modelo,
+        modelo_ativo,
+        publicar_modelo,
+        versoes_modelo,
+    )
+
+    st.divider()
+    st.header("🧩 Modelos de contrato")
+
+    def _relatorio_modelo(manifesto: dict):
+        for e in manifesto["erros"]:
+            st.error(e["mensagem"])
+        for a in manifesto["avisos"]:
+            st.warning(a["mensagem"])
+        if manifesto["placeholders"]:
+            st.dataframe(
+                [{"Placeholder": k, "Ocorrências": len(v)} for k, v in sorted(manifesto["placeholders"].items())],
+                hide_index=True,
+                width="stretch",
+            )
+        st.caption(f"{manifesto['paragrafos']} parágrafo(s) · sha256 {manifesto['hash'][:12]}…")
+
+    for nome in nomes_modelos():
+        versao_ativa, hash_ativo = modelo_ativo(nome)
+        _conteudo, manifesto = carregar_modelo(hash_ativo)
+        versoes = versoes_modelo(nome)
+        atual = next(v for v in versoes if v["ativo"])
+        situacao = "❌" if manifesto["erros"] else ("⚠️" if manifesto["avisos"] else "✅")
+
+        with st.expander(f"{situacao} {nome} — v{versao_ativa}", expanded=False):
+            m1, m2, m3 = st.columns(3)
+            m1.metric("Renders", atual["renders"])
+            m2.metric("Média (ms)", atual["media_ms"])
+            m3.metric("p95 (ms)", atual["p95_ms"])
+            _relatorio_modelo(manifesto)
+
+            st.markdown("**Versões**")
+            st.dataframe(
+                [
+                    {
+                        "Versão": v["versao"],
+                        "Em uso": "✅" if v["ativo"] else "",
+                        "Publicada em": v["criado_em"][:16].replace("T", " "),
+                        "Por": v["criado_por"],
+                        "Renders": v["renders"],
+                        "Média (ms)": v["media_ms"],
+                        "p95 (ms)": v["p95_ms"],
+                    }
+                    for v in versoes
+                ],
+                hide_index=True,
+                width="stretch",
+            )
+            if len(versoes) > 1:
+                r1, r2 = st.columns([1, 1])
+                with r1:
+                    voltar = st.selectbox(
+                        "Reativar versão",
+                        [v["versao"] for v in versoes if not v["ativo"]],
+                        format_func=lambda n: f"v{n}",
+                        key=f"modelo_reativar_{nome}",
+                    )
+                with r2:
+                    if st.button("Reativar", key=f"modelo_reativar_btn_{nome}"):
+                        ativar_versao(nome, voltar)
+                        st.rerun()
+
+    st.subheader("⬆️ Publicar modelo / nova versão")
+    st.caption(
+        "O arquivo é validado antes de entrar em uso e passa a valer na hora, sem reiniciar. "
+        "Contratos já criados continuam com a versão com que foram gerados."
+    )
+    NOVO = "(novo modelo)"
+    destino = st.selectbox("Modelo", [NOVO] + nomes_modelos(), key="modelo_upload_tipo")
+    nome_novo = st.text_input("Nome do novo modelo", key="modelo_upload_nome") if destino == NOVO else destino
+    enviado = st.file_uploader("Arquivo .docx", type=["docx"], key="modelo_upload_arquivo")
+    if enviado is not None and st.button("Validar e publicar"):
+        try:
+            versao, manifesto = publicar_modelo(nome_novo, enviado.getvalue(), username)
+        except ModeloInvalido as e:
+            st.error("Modelo recusado: corrija os problemas abaixo no Word e envie de novo.")
+            _relatorio_modelo(e.manifesto)
+        except ValueError as e:
+            st.error(str(e))
+        else:
+            st.success(f"{nome_novo} v{versao} publicado e já em uso.")
+            _relatorio_modelo(manifesto)
@@ -0,0 +1,119 @@
+"""
+Benchmark da exportação em streaming (services/exportacao.py): monta um
+banco temporário com N contratos x L logs e exporta histórico e contratos
+em CSV e XLSX, cada um num subprocesso, reportando tempo e pico de RSS.
+Sai com código 1 se algum pico passar do limite.
+
+    python scripts/bench_exportacao.py --contratos 200000 --logs 5 --limite-mb 100
+"""
+import argparse
+import os
+import random
+import resource
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+STATUS = ["FILA_INICIO", "ANALISE_JURIDICA_LGPD", "ANALISE_DEMANDANTE", "ANALISE_FORNECEDOR", "FINALIZADO"]
+
+
+def _popular(n_contratos: int, n_logs: int):
+    from services.banco import criar_tabelas
+
+    criar_tabelas()
+    conn = sqlite3.connect("banco.db")
+    inicio = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    conn.execute("BEGIN")
+    for base in range(0, n_contratos, 10_000):
+        contratos, logs = [], []
+        for cid in range(base + 1, min(base + 10_000, n_contratos) + 1):
+            t = inicio + timedelta(minutes=cid)
+            cnpj = f"{cid % 5000:014d}"
+            ultimo = min(n_logs, len(STATUS)) - 1
+            contratos.append((
+                cid, f"EXP-{cid}", f"FORN {cid % 5000}", STATUS[ultimo], cnpj, f"FORN {cid % 5000}",
+                cid // 5000 + 1, "NDA", t.isoformat(), t.isoformat(),
+            ))
+            de = None
+            for k in range(n_logs):
+                para = STATUS[min(k, len(STATUS) - 1)]
+                t += timedelta(hours=random.randint(1, 72))
+                logs.append((cid, de, para, t.isoformat(), "bench"))
+                de = para
+        conn.executemany(
+            """
+            INSERT INTO contratos (id, numero, razao_social, status, fornecedor_cnpj, fornecedor_razao,
+                                   versao, tipo_modelo, criado_em, etapa_entrada_em)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            contratos,
+        )
+        conn.executemany(
+            "INSERT INTO status_log (contrato_id, de_status, para_status, alterado_em, alterado_por) VALUES (?, ?, ?, ?, ?)",
+            logs,
+        )
+    conn.commit()
+    conn.close()
+
+
+def _exportar_filho(tipo: str, formato: str):
+    from services.exportacao import exportar
+
+    t0 = time.perf_counter()
+    n = exportar(tipo, formato, f"saida_{tipo}.{formato}")
+    dur = time.perf_counter() - t0
+    pico_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(f"{n} {dur:.2f} {pico_kb} {os.path.getsize(f'saida_{tipo}.{formato}')}")
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--contratos", type=int, default=200_000)
+    ap.add_argument("--logs", type=int, default=5, help="logs de status por contrato")
+    ap.add_argument("--limite-mb", type=float, default=100)
+    ap.add_argument("--formatos", default="csv,xlsx")
+    ap.add_argument("--_filho", nargs=2, help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args._filho:
+        _exportar_filho(*args._filho)
+        return
+
+    tmp = tempfile.mkdtemp(prefix="bench_export_")
+    os.chdir(tmp)
+    try:
+        t0 = time.perf_counter()
+        _popular(args.contratos, args.logs)
+        print(f"Banco: {args.contratos} contratos x {args.logs} logs em {time.perf_counter() - t0:.1f}s")
+
+        estourou = False
+        for tipo in ("historico", "contratos"):
+            for formato in args.formatos.split(","):
+                saida = subprocess.run(
+                    [sys.executable, os.path.abspath(__file__), "--_filho", tipo, formato],
+                    capture_output=True, text=True, check=True,
+                    env=dict(os.environ, PYTHONPATH=RAIZ),
+                ).stdout.split()
+                n, dur, pico_kb, tamanho = int(saida[0]), float(saida[1]), int(saida[2]), int(saida[3])
+                pico_mb = pico_kb / 1024
+                ok = pico_mb <= args.limite_mb
+                estourou |= not ok
+                print(f"  {tipo:<9} {formato:<4}: {n:>9,} linhas em {dur:6.1f}s "
+                      f"({n / max(dur, 1e-9):,.0f} linhas/s), arquivo {tamanho / 2**20:6.1f} MiB, "
+                      f"pico RSS {pico_mb:6.1f} MiB {'ok' if ok else 'ACIMA DO LIMITE'}")
+    finally:
+        os.chdir(RAIZ)
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    sys.exit(1 if estourou else 0)
+
+
+if __name__ == "__main__":
+    main()
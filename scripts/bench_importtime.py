@@ -0,0 +1,101 @@
+"""
+Benchmark de cold start do app.py via `python -X importtime`: executa só os
+imports de topo do app.py (lidos do próprio arquivo) num processo novo e
+soma o tempo dos módulos do projeto, fora o Streamlit (que é fixo).
+
+Falha (código 1) se:
+  - a mediana passar do orçamento (--orcamento-ms), ou
+  - algum módulo pesado que deveria ser tardio aparecer no startup.
+
+    python scripts/bench_importtime.py --rodadas 5 --orcamento-ms 150
+"""
+import argparse
+import ast
+import os
+import statistics
+import subprocess
+import sys
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# devem carregar só quando usados (geração, PDF, SLA, exportação, login)
+PROIBIDOS = ("docx", "requests", "passlib", "numpy", "openpyxl", "httpx", "uno", "services.contrato", "services.cnpj")
+
+
+def _imports_de_topo(caminho: str) -> str:
+    with open(caminho, encoding="utf-8") as f:
+        arvore = ast.parse(f.read())
+    linhas = [ast.unparse(n) for n in arvore.body if isinstance(n, (ast.Import, ast.ImportFrom))]
+    return "\n".join(linhas)
+
+
+def _medir(codigo: str):
+    """
+    Retorna (ms dos imports de topo fora o streamlit, ms do streamlit, módulos carregados).
+    """
+    r = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", codigo],
+        cwd=RAIZ,
+        env=dict(os.environ, PYTHONPATH=RAIZ),
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    app_us = 0
+    streamlit_us = 0
+    modulos = set()
+    for linha in r.stderr.splitlines():
+        if not linha.startswith("import time:") or "cumulative" in linha:
+            continue
+        _, cumulativo, nome = linha[len("import time:"):].split("|")
+        modulo = nome.strip()
+        modulos.add(modulo)
+        if nome.startswith("   "):
+            continue  # aninhado: já conta no pai
+        if modulo == "streamlit":
+            streamlit_us = int(cumulativo)
+        else:
+            app_us += int(cumulativo)
+    return app_us / 1000, streamlit_us / 1000, modulos
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--app", default=os.path.join(RAIZ, "app.py"))
+    ap.add_argument("--rodadas", type=int, default=5)
+    ap.add_argument("--orcamento-ms", type=float, default=150)
+    args = ap.parse_args()
+
+    # streamlit primeiro: o custo dele fica separado do resto
+    codigo = "import streamlit\n" + _imports_de_topo(args.app)
+
+    tempos_app, tempos_st = [], []
+    carregados = set()
+    for _ in range(args.rodadas):
+        app_ms, st_ms, modulos = _medir(codigo)
+        tempos_app.append(app_ms)
+        tempos_st.append(st_ms)
+        carregados |= modulos
+
+    mediana = statistics.median(tempos_app)
+    print(f"imports do app.py (sem streamlit): mediana {mediana:.1f} ms "
+          f"(min {min(tempos_app):.1f}, max {max(tempos_app):.1f}) em {args.rodadas} rodada(s)")
+    print(f"streamlit: mediana {statistics.median(tempos_st):.1f} ms")
+
+    falhou = False
+    if mediana > args.orcamento_ms:
+        print(f"  ACIMA DO ORÇAMENTO ({args.orcamento_ms:.0f} ms)")
+        falhou = True
+
+    pesados = sorted({p for p in PROIBIDOS if p in carregados})
+    if pesados:
+        print(f"  módulos pesados carregados no startup: {', '.join(pesados)}")
+        falhou = True
+
+    if not falhou:
+        print("  ok")
+    sys.exit(1 if falhou else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""
+Benchmark do índice em memória (services/indice.py) x consultas SQL:
+tempo de carga, memória e latência de contagem, filtro, resumo por
+fornecedor e top-K dos parados, medidas nas funções públicas do módulo (as
+que o app chama: lock + número dos contratos do top-K). Roda num banco
+temporário populado direto por SQL (N contratos, por padrão 1 milhão).
+
+    python scripts/bench_indice.py --contratos 1000000 --fornecedores 20000
+"""
+import argparse
+import os
+import random
+import resource
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.banco import (  # noqa: E402
+    atualizar_status_em_lote,
+    conectar,
+    contar_por_status,
+    criar_tabelas,
+    listar_contratos_por_status,
+    listar_fornecedores_resumo,
+    listar_mais_antigos_por_etapa,
+)
+from services import indice  # noqa: E402
+from services.sla_analise import ETAPAS_SLA  # noqa: E402
+from services.status import STATUS_ORDEM  # noqa: E402
+
+BLOCO_INSERCAO = 50_000
+
+
+def _popular(n: int, n_fornecedores: int):
+    rnd = random.Random(42)
+    inicio = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    conn = conectar()
+    for base in range(0, n, BLOCO_INSERCAO):
+        linhas = []
+        for i in range(base, min(base + BLOCO_INSERCAO, n)):
+            f = i % n_fornecedores  # (fornecedor, versão) é único
+            criado = inicio + timedelta(seconds=rnd.randrange(2 * 365 * 86400))
+            entrada = criado + timedelta(seconds=rnd.randrange(30 * 86400))
+            linhas.append((
+                f"BENCH-{i}", rnd.choice(STATUS_ORDEM), f"{f:014d}", f"FORNECEDOR {f} LTDA",
+                i // n_fornecedores + 1, rnd.choice(("NDA", "API")), criado.isoformat(), entrada.isoformat(),
+            ))
+        conn.executemany(
+            """
+            INSERT INTO contratos (numero, status, fornecedor_cnpj, fornecedor_razao, versao,
+                                   tipo_modelo, criado_em, etapa_entrada_em)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            linhas,
+        )
+        conn.commit()
+    conn.close()
+
+
+def _ms(funcao, rodadas: int) -> float:
+    tempos = []
+    for _ in range(rodadas):
+        t0 = time.perf_counter()
+        funcao()
+        tempos.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(tempos)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--contratos", type=int, default=1_000_000)
+    ap.add_argument("--fornecedores", type=int, default=20_000)
+    ap.add_argument("--rodadas", type=int, default=5)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)  # banco.db é relativo ao diretório atual
+        criar_tabelas()
+
+        t0 = time.perf_counter()
+        _popular(args.contratos, args.fornecedores)
+        print(f"{args.contratos} contratos, {args.fornecedores} fornecedores (populado em {time.perf_counter() - t0:.1f} s)\n")
+
+        rss0 = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        t0 = time.perf_counter()
+        # mesma carga do app; a thread fica parada (sincronização só quando o bench pedir)
+        indice.iniciar_em_segundo_plano(recarregar_s=0, sincronizar_s=3600)
+        while not indice.pronto():
+            time.sleep(0.01)
+        carga = time.perf_counter() - t0
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+        mem = indice.memoria()
+        print(f"carga do índice: {carga:6.1f} s  (pico do processo +{(rss - rss0) / 1024:6.1f} MiB)")
+        print(
+            f"memória: arrays {mem['bytes_arrays'] / 2**20:6.1f} MiB (capacidade {mem['capacidade']}), "
+            f"textos {mem['bytes_textos'] / 2**20:6.1f} MiB, "
+            f"total {mem['bytes_total'] / 2**20:6.1f} MiB = {mem['bytes_total'] / max(mem['contratos'], 1):.1f} bytes/contrato\n"
+        )
+
+        etapa = STATUS_ORDEM[0]
+        casos = [
+            ("contagem por etapa", contar_por_status, indice.contar_por_status),
+            (f"ids da etapa {etapa}",
+             lambda: [r[0] for r in listar_contratos_por_status(etapa)],
+             lambda: indice.ids(status=etapa)),
+            ("resumo por fornecedor", listar_fornecedores_resumo, indice.fornecedores_resumo),
+            ("top-10 parados por etapa",
+             lambda: listar_mais_antigos_por_etapa(ETAPAS_SLA, 10),
+             lambda: indice.mais_antigos_por_etapa(ETAPAS_SLA, 10)),
+            ("top-10 parados, só NDA",
+             None,
+             lambda: indice.mais_antigos_por_etapa(ETAPAS_SLA, 10, tipo_modelo="NDA")),
+            ("contar NDA de 1 fornecedor",
+             None,
+             lambda: indice.contar(tipo_modelo="NDA", fornecedor_cnpj=f"{0:014d}")),
+        ]
+        print(f"{'consulta':<28} {'SQL':>10} {'índice':>10}")
+        for nome, sql, mem_ in casos:
+            t_sql = f"{_ms(sql, args.rodadas):8.1f}ms" if sql else f"{'-':>10}"
+            print(f"{nome:<28} {t_sql} {_ms(mem_, args.rodadas):8.3f}ms")
+
+        t_vazio = _ms(indice.sincronizar_agora, args.rodadas)
+        print(f"\nsincronizar sem eventos novos: {t_vazio:.2f} ms")
+
+        # manter em dia: mover 1.000 contratos e aplicar os eventos
+        ids = indice.ids(limite=1000, status=etapa)
+        atualizar_status_em_lote(ids, STATUS_ORDEM[1], "bench")
+        t0 = time.perf_counter()
+        indice.sincronizar_agora()
+        print(f"sincronizar {len(ids)} eventos: {(time.perf_counter() - t0) * 1000:.1f} ms")
+        assert indice.contar_por_status() == contar_por_status()
+
+
+if __name__ == "__main__":
+    main()
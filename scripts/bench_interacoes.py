@@ -0,0 +1,206 @@
+"""
+Mede o custo de cada tipo de interação do app.py: quantas consultas SQL e
+quantas leituras de arquivo (contratos/, templates/, caches) acontecem.
+
+Usa o AppTest do Streamlit num diretório temporário populado. O AppTest
+sempre reexecuta o script inteiro, então para cada interação são
+reportados dois números:
+  - página inteira: o que custaria um rerun completo (comportamento sem fragments);
+  - fragmento: o custo da chamada do st.fragment que trata a interação,
+    que é tudo o que roda num rerun parcial no servidor de verdade.
+
+    python scripts/bench_interacoes.py --contratos 50
+"""
+import argparse
+import functools
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from http.server import ThreadingHTTPServer
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+sys.path.insert(0, os.path.join(RAIZ, "scripts"))
+
+from carga_api import _BrasilApiFake, _porta_livre  # noqa: E402
+
+_contadores = {"sql": 0, "leituras": 0}
+_chamadas = []  # (fragment, sql, leituras, ms) por chamada
+_dir_trabalho = None
+
+
+# -----------------------------
+# Instrumentação
+# -----------------------------
+def _instrumentar_banco():
+    import services.banco as banco
+
+    original = banco._nova_conexao
+
+    def _nova_conexao():
+        conn = original()
+        conn.set_trace_callback(lambda _sql: _contadores.__setitem__("sql", _contadores["sql"] + 1))
+        return conn
+
+    banco._nova_conexao = _nova_conexao
+
+
+def _auditar_leituras(evento, args):
+    if evento != "open" or _dir_trabalho is None:
+        return
+    caminho, modo = args[0], args[1]
+    if not isinstance(caminho, str) or (modo and "r" not in modo):
+        return
+    completo = os.path.abspath(caminho)
+    if completo.startswith(_dir_trabalho) and not completo.endswith((".db", ".py", ".pyc")):
+        _contadores["leituras"] += 1
+
+
+def _instrumentar_fragments():
+    import streamlit as st
+
+    original = st.fragment
+
+    def _medido(func):
+        @functools.wraps(func)
+        def _wrapper(*args, **kwargs):
+            sql0, leit0 = _contadores["sql"], _contadores["leituras"]
+            t0 = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                ms = (time.perf_counter() - t0) * 1000
+                _chamadas.append((func.__name__, _contadores["sql"] - sql0, _contadores["leituras"] - leit0, ms))
+        return _wrapper
+
+    def fragment(func=None, **kwargs):
+        if func is None:
+            return lambda f: original(_medido(f), **kwargs)
+        return original(_medido(func), **kwargs)
+
+    st.fragment = fragment
+
+
+# -----------------------------
+# Cenário
+# -----------------------------
+def _popular(n: int):
+    from services.banco import atualizar_status_em_lote
+    from services.geracao import criar_contrato
+
+    ids = []
+    for i in range(n):
+        dados = {"cnpj": f"{i % 7:014d}", "razao_social": f"FORNECEDOR {i % 7} LTDA", "municipio": "São Paulo", "uf": "SP"}
+        cid, _numero, _arq = criar_contrato(dados, f"BENCH-{i}", "NDA")
+        ids.append(cid)
+    # metade finalizada (SLA), metade na Fila de Início (lista)
+    atualizar_status_em_lote(ids[: n // 2], "ANALISE_JURIDICA_LGPD", "bench")
+    atualizar_status_em_lote(ids[: n // 2], "FINALIZADO", "bench")
+    return ids[n // 2:]
+
+
+def _medir(nome: str, fragment: str | None, acao):
+    _contadores["sql"] = _contadores["leituras"] = 0
+    _chamadas.clear()
+    t0 = time.perf_counter()
+    at = acao()
+    dur = (time.perf_counter() - t0) * 1000
+    if at is not None and at.exception:
+        raise RuntimeError(f"{nome}: {at.exception}")
+
+    linha = f"{nome:<36} página inteira: {_contadores['sql']:>4} SQL {_contadores['leituras']:>3} leituras {dur:7.0f} ms"
+    if fragment:
+        # a chamada que tratou a interação é a mais cara daquele fragment
+        custos = [(s, l, ms) for f, s, l, ms in _chamadas if f == fragment]
+        sql, leit, ms = max(custos) if custos else (0, 0, 0.0)
+        linha += f" | fragmento {fragment}: {sql:>3} SQL {leit:>3} leituras {ms:6.0f} ms"
+    print(linha)
+
+
+def main():
+    global _dir_trabalho
+
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--contratos", type=int, default=50)
+    args = ap.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="bench_interacoes_")
+    shutil.copytree(os.path.join(RAIZ, "templates"), os.path.join(tmp, "templates"))
+    os.chdir(tmp)
+
+    fake = ThreadingHTTPServer(("127.0.0.1", _porta_livre()), _BrasilApiFake)
+    threading.Thread(target=fake.serve_forever, daemon=True).start()
+    os.environ.update(
+        ADMIN_USERNAME="admin",
+        ADMIN_PASSWORD="bench",
+        BRASILAPI_URL=f"http://127.0.0.1:{fake.server_address[1]}",
+        RECONCILIACAO_INTERVALO_S="0",  # as threads de fundo sujariam as contagens
+        EVENTOS_INTERVALO_S="0",
+    )
+
+    from streamlit.testing.v1 import AppTest
+
+    try:
+        from services.banco import criar_tabelas
+
+        criar_tabelas()
+        na_fila = _popular(args.contratos)
+
+        _instrumentar_banco()
+        _instrumentar_fragments()
+        sys.addaudithook(_auditar_leituras)
+        _dir_trabalho = os.path.abspath(tmp)
+
+        at = AppTest.from_file(os.path.join(RAIZ, "app.py"), default_timeout=120)
+        print(f"{args.contratos} contratos ({len(na_fila)} na Fila de Início)\n")
+
+        _medir("login (1º carregamento)", None, lambda: at.run())
+        _medir("login (rerun)", None, lambda: at.run())
+
+        def _logar():
+            at.session_state["logado"] = True
+            at.session_state["perfil"] = "ADMIN"
+            at.session_state["username"] = "admin"
+            return at.run()
+        _medir("resumo", None, _logar)
+        _medir("filtro do SLA (quebrar por mês)", "secao_sla", lambda: at.checkbox(key="sla_mes").check().run())
+        _medir("digitar no formulário de geração", "form_gerar_contrato", lambda: at.text_input[0].input("CT-BENCH-1").run())
+
+        def _gerar():
+            at.text_input[1].input("12345678000199")
+            return at.button[next(i for i, b in enumerate(at.button) if b.label == "Gerar contrato")].click().run()
+        _medir("gerar contrato", "form_gerar_contrato", _gerar)
+
+        def _lista():
+            at.session_state["view"] = "LISTA"
+            at.session_state["filtro_status"] = "FILA_INICIO"
+            return at.run()
+        _medir("abrir lista (Fila de Início)", None, _lista)
+
+        alvo = na_fila[0]
+        _medir("mover status de um cartão", "cartao_contrato",
+               lambda: at.selectbox(key=f"mv_{alvo}").set_value("ANALISE_JURIDICA_LGPD").run())
+
+        alvo = na_fila[1]
+
+        def _excluir():
+            at.text_area(key=f"just_{alvo}").input("justificativa do benchmark").run()
+            return at.button(key=f"exc_{alvo}").click().run()
+        _medir("excluir um cartão", "cartao_contrato", _excluir)
+
+        def _fornecedores():
+            at.session_state["view"] = "FORNECEDORES"
+            return at.run()
+        _medir("abrir fornecedores", None, _fornecedores)
+    finally:
+        _dir_trabalho = None
+        fake.shutdown()
+        os.chdir(RAIZ)
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
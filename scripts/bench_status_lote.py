@@ -0,0 +1,54 @@
+"""
+Benchmark: mover N contratos um a um (atualizar_status) x em lote
+(atualizar_status_em_lote). Roda num banco temporário.
+
+    python scripts/bench_status_lote.py [N]
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.banco import (  # noqa: E402
+    atualizar_status,
+    atualizar_status_em_lote,
+    criar_tabelas,
+    inserir_contrato_fornecedor,
+)
+
+
+def _criar(n: int):
+    return [
+        inserir_contrato_fornecedor(f"{i:014d}", f"Fornecedor {i}", "ANALISE_FORNECEDOR", "NDA")
+        for i in range(n)
+    ]
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)  # banco.db é relativo ao diretório atual
+        criar_tabelas()
+
+        ids = _criar(n)
+        t0 = time.perf_counter()
+        for cid in ids:
+            atualizar_status(cid, "FINALIZADO", "bench")
+        um_a_um = time.perf_counter() - t0
+
+        ids = _criar(n)
+        t0 = time.perf_counter()
+        atualizar_status_em_lote(ids, "FINALIZADO", "bench")
+        lote = time.perf_counter() - t0
+
+    print(f"{n} contratos")
+    print(f"  um a um : {um_a_um * 1000:9.1f} ms  ({n / um_a_um:10.0f} contratos/s)")
+    print(f"  em lote : {lote * 1000:9.1f} ms  ({n / lote:10.0f} contratos/s)")
+    print(f"  ganho   : {um_a_um / lote:9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,245 @@
+"""
+Teste de carga da API (api.py): N conexões keep-alive em paralelo por X
+segundos, misturando listagem, detalhe, SLA e (opcional) criação.
+Reporta requisições/s e latência p50/p90/p99.
+
+Modo --local: sobe tudo num diretório temporário — um stand-in da
+BrasilAPI (http.server) e o uvicorn com a API apontando para ele — e
+popula o banco antes de medir.
+
+    python scripts/carga_api.py --local --conexoes 32 --segundos 15
+    python scripts/carga_api.py --url http://127.0.0.1:8000 --token XYZ
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STATUS = ["FILA_INICIO", "ANALISE_JURIDICA_LGPD", "ANALISE_DEMANDANTE", "ANALISE_FORNECEDOR", "FINALIZADO"]
+
+
+# -----------------------------
+# Stand-in local da BrasilAPI
+# -----------------------------
+class _BrasilApiFake(BaseHTTPRequestHandler):
+    def do_GET(self):
+        cnpj = self.path.rstrip("/").rsplit("/", 1)[-1]
+        corpo = json.dumps({
+            "cnpj": cnpj,
+            "razao_social": f"FORNECEDOR {cnpj[-4:]} LTDA",
+            "nome_fantasia": "Fornecedor",
+            "natureza_juridica": "Sociedade Empresária Limitada",
+            "logradouro": "Rua Teste",
+            "numero": "100",
+            "cep": "01001000",
+            "municipio": "São Paulo",
+            "uf": "SP",
+        }).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(corpo)))
+        self.end_headers()
+        self.wfile.write(corpo)
+
+    def log_message(self, *args):
+        pass
+
+
+def _porta_livre() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _subir_local(token: str):
+    """
+    Retorna (url_api, finalizar()).
+    """
+    tmp = tempfile.mkdtemp(prefix="carga_api_")
+    shutil.copytree(os.path.join(RAIZ, "templates"), os.path.join(tmp, "templates"))
+
+    fake = ThreadingHTTPServer(("127.0.0.1", _porta_livre()), _BrasilApiFake)
+    threading.Thread(target=fake.serve_forever, daemon=True).start()
+
+    porta = _porta_livre()
+    env = dict(
+        os.environ,
+        API_TOKEN=token,
+        BRASILAPI_URL=f"http://127.0.0.1:{fake.server_address[1]}",
+        CONTRATOS_MATERIALIZACAO="lazy",
+        CNPJ_TAXA_POR_SEGUNDO="0",  # stand-in local: sem cota
+        PYTHONPATH=RAIZ,
+    )
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "api:app", "--port", str(porta), "--log-level", "warning"],
+        cwd=tmp,
+        env=env,
+    )
+
+    url = f"http://127.0.0.1:{porta}"
+    limite = time.monotonic() + 20
+    while True:
+        try:
+            with socket.create_connection(("127.0.0.1", porta), timeout=0.5):
+                break
+        except OSError:
+            if time.monotonic() > limite or proc.poll() is not None:
+                raise RuntimeError("API não subiu.")
+            time.sleep(0.2)
+
+    def finalizar():
+        proc.terminate()
+        proc.wait(timeout=10)
+        fake.shutdown()
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    return url, finalizar
+
+
+# -----------------------------
+# Cliente HTTP/1.1 keep-alive mínimo
+# -----------------------------
+class _Conexao:
+    def __init__(self, host: str, porta: int, token: str):
+        self.host = host
+        self.porta = porta
+        self.token = token
+        self.reader = None
+        self.writer = None
+
+    async def requisitar(self, metodo: str, caminho: str, corpo: dict | None = None) -> int:
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.porta)
+
+        dados = json.dumps(corpo).encode() if corpo is not None else b""
+        cab = (
+            f"{metodo} {caminho} HTTP/1.1\r\n"
+            f"Host: {self.host}\r\n"
+            f"Authorization: Bearer {self.token}\r\n"
+            f"Content-Type: application/json\r\n"
+            f"Content-Length: {len(dados)}\r\n\r\n"
+        )
+        self.writer.write(cab.encode() + dados)
+        await self.writer.drain()
+
+        linha = await self.reader.readline()
+        status = int(linha.split()[1])
+        tamanho = 0
+        while True:
+            h = await self.reader.readline()
+            if h in (b"\r\n", b""):
+                break
+            nome, _, valor = h.decode().partition(":")
+            if nome.strip().lower() == "content-length":
+                tamanho = int(valor.strip())
+        if tamanho:
+            await self.reader.readexactly(tamanho)
+        return status
+
+    def fechar(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+def _escolher_requisicao(pct_escrita: float, ids: list):
+    r = random.random()
+    if r < pct_escrita:
+        if random.random() < 0.5 or not ids:
+            cnpj = f"{random.randint(0, 10**14 - 1):014d}"
+            return "POST", "/contratos", {"cnpj": cnpj, "numero": f"CARGA-{random.getrandbits(40):x}", "tipo_modelo": "Contrato de API"}
+        return "POST", f"/contratos/{random.choice(ids)}/status", {"status": random.choice(STATUS), "por": "carga"}
+    if r < pct_escrita + 0.1:
+        return "GET", "/sla", None
+    if r < pct_escrita + 0.3 and ids:
+        return "GET", f"/contratos/{random.choice(ids)}", None
+    return "GET", f"/contratos?status={random.choice(STATUS)}&limite=50", None
+
+
+def _percentil(valores: list, p: float) -> float:
+    if not valores:
+        return 0.0
+    k = min(len(valores) - 1, int(round(p / 100 * (len(valores) - 1))))
+    return valores[k]
+
+
+async def _rodar(url: str, token: str, conexoes: int, segundos: float, pct_escrita: float, semear: int):
+    alvo = urlparse(url)
+    host, porta = alvo.hostname, alvo.port or 80
+
+    if semear:
+        c = _Conexao(host, porta, token)
+        for i in range(semear):
+            await c.requisitar("POST", "/contratos", {"cnpj": f"{i:014d}", "numero": f"SEED-{i}", "tipo_modelo": "NDA"})
+        c.fechar()
+    ids = list(range(1, semear + 1))
+
+    latencias = []
+    erros = 0
+    fim = time.monotonic() + segundos
+
+    async def trabalhador():
+        nonlocal erros
+        c = _Conexao(host, porta, token)
+        try:
+            while time.monotonic() < fim:
+                metodo, caminho, corpo = _escolher_requisicao(pct_escrita, ids)
+                t0 = time.perf_counter()
+                try:
+                    status = await c.requisitar(metodo, caminho, corpo)
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    c.fechar()
+                    c = _Conexao(host, porta, token)
+                    erros += 1
+                    continue
+                latencias.append(time.perf_counter() - t0)
+                if status >= 400:
+                    erros += 1
+        finally:
+            c.fechar()
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(trabalhador() for _ in range(conexoes)))
+    dur = time.perf_counter() - t0
+
+    latencias.sort()
+    print(f"{len(latencias)} requisições em {dur:.1f}s com {conexoes} conexões ({erros} erro(s))")
+    print(f"  throughput: {len(latencias) / dur:,.0f} req/s")
+    for p in (50, 90, 99):
+        print(f"  p{p}: {_percentil(latencias, p) * 1000:8.2f} ms")
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--url", default="http://127.0.0.1:8000")
+    ap.add_argument("--token", default=os.getenv("API_TOKEN", "carga"))
+    ap.add_argument("--local", action="store_true", help="sobe API + stand-in da BrasilAPI localmente")
+    ap.add_argument("--conexoes", type=int, default=16)
+    ap.add_argument("--segundos", type=float, default=10)
+    ap.add_argument("--escrita", type=float, default=0.05, help="fração de POSTs (criação/mudança de status)")
+    ap.add_argument("--semear", type=int, default=200, help="contratos criados antes da medição")
+    args = ap.parse_args()
+
+    finalizar = None
+    url = args.url
+    if args.local:
+        url, finalizar = _subir_local(args.token)
+    try:
+        asyncio.run(_rodar(url, args.token, args.conexoes, args.segundos, args.escrita, args.semear))
+    finally:
+        if finalizar:
+            finalizar()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Stress de versionamento: várias threads criando contratos para o MESMO
+fornecedor ao mesmo tempo. Falha (exit 1) se aparecer versão duplicada
+ou faltando.
+
+    python scripts/stress_versao.py [threads] [por_thread]
+"""
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.banco import criar_tabelas, inserir_contrato_fornecedor  # noqa: E402
+
+CNPJ = "00000000000191"
+
+
+def main():
+    n_threads = int(sys.argv[1]) if len(sys.argv) > 1 else 16
+    por_thread = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        criar_tabelas()
+
+        largada = threading.Barrier(n_threads)
+        erros = []
+
+        def trabalho():
+            largada.wait()
+            for _ in range(por_thread):
+                try:
+                    inserir_contrato_fornecedor(CNPJ, "Fornecedor Stress", "FILA_INICIO", "NDA")
+                except Exception as e:
+                    erros.append(e)
+
+        threads = [threading.Thread(target=trabalho) for _ in range(n_threads)]
+        t0 = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        dur = time.perf_counter() - t0
+
+        conn = sqlite3.connect("banco.db")
+        versoes = [r[0] for r in conn.execute("SELECT versao FROM contratos WHERE fornecedor_cnpj = ?", (CNPJ,))]
+        conn.close()
+
+    total = n_threads * por_thread
+    duplicadas = len(versoes) - len(set(versoes))
+    esperado = set(range(1, len(versoes) + 1))
+
+    print(f"{len(versoes)}/{total} inserts em {dur:.2f}s ({len(versoes) / dur:.0f}/s), {len(erros)} erro(s)")
+    print(f"versões duplicadas: {duplicadas}")
+    if erros:
+        print(f"primeiro erro: {erros[0]!r}")
+
+    if duplicadas or set(versoes) != esperado or erros:
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+"""
+Fluxo ponta a ponta da camada de banco (services/banco.py e quem a usa),
+para rodar igual nos dois backends: cria tabelas (2x, idempotente), modelos,
+usuários, contratos (com criação concorrente no mesmo fornecedor), mudanças
+de status, exclusão, feed de eventos, exportação, reconciliação e registro
+de modelos. Sai com código 1 se alguma verificação falhar.
+
+SQLite (padrão, banco.db num diretório temporário):
+
+    python scripts/verificar_backends.py
+
+PostgreSQL (precisa de um banco VAZIO; ex.: container descartável):
+
+    pip install "psycopg[binary,pool]"
+    docker run --rm -d --name contratos-pg -p 5432:5432 \\
+        -e POSTGRES_PASSWORD=pg -e POSTGRES_DB=contratos postgres:16
+    DATABASE_URL=postgresql://postgres:pg@localhost:5432/contratos \\
+        python scripts/verificar_backends.py
+    docker stop contratos-pg
+"""
+import os
+import shutil
+import sys
+import tempfile
+import threading
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+from services import banco  # noqa: E402
+from services.banco import (  # noqa: E402
+    atualizar_status,
+    atualizar_status_em_lote,
+    buscar_contrato_por_id,
+    buscar_fornecedor,
+    contar_arquivos_sinalizados,
+    contar_por_status,
+    criar_tabelas,
+    excluir_contrato,
+    geracao_dados,
+    listar_contratos_por_status,
+    listar_mais_antigos_por_etapa,
+    listar_versoes_por_fornecedor,
+    marcar_arquivos_contratos,
+    obter_status_logs,
+    salvar_fornecedores_lote,
+)
+
+CNPJ = "11222333000181"
+DADOS = {"cnpj": CNPJ, "razao_social": "FORNECEDOR TESTE LTDA", "municipio": "SAO PAULO", "uf": "SP"}
+THREADS = 4
+POR_THREAD = 5
+
+_falhas = []
+
+
+def _conferir(nome: str, ok: bool, detalhe=""):
+    print(f"  [{'ok' if ok else 'FALHOU'}] {nome}" + (f": {detalhe}" if not ok and detalhe != "" else ""))
+    if not ok:
+        _falhas.append(nome)
+
+
+def _fluxo():
+    from services.auth import autenticar, criar_ou_atualizar_usuario
+    from services.cache_docx import renderizar_do_banco
+    from services.eventos import desde
+    from services.exportacao import csv_em_pedacos
+    from services.geracao import criar_contrato
+    from services.modelos import ativar_versao, nomes_modelos, publicar_modelo, semear_modelos, versoes_modelo
+    from services.reconciliacao import reconciliar
+
+    criar_tabelas()
+    criar_tabelas()
+    conn = banco.conectar()
+    vazio = conn.execute("SELECT COUNT(*) FROM contratos").fetchone()[0] == 0
+    conn.close()
+    if not vazio:
+        sys.exit("O banco já tem contratos: rode contra um banco vazio.")
+
+    semear_modelos()
+    _conferir("modelos semeados", "NDA" in nomes_modelos(), nomes_modelos())
+
+    criar_ou_atualizar_usuario("verificacao", "s1", "ADMIN")
+    criar_ou_atualizar_usuario("verificacao", "s2", "ADMIN")
+    _conferir("usuário atualizado", autenticar("verificacao", "s2") is not None and autenticar("verificacao", "s1") is None)
+
+    ids = [criar_contrato(DADOS, f"VB-{i}", "NDA")[0] for i in range(5)]
+    _conferir("versões sequenciais", [buscar_contrato_por_id(i)[7] for i in ids] == [1, 2, 3, 4, 5])
+
+    erros = []
+
+    def _criar_varios():
+        for _ in range(POR_THREAD):
+            try:
+                criar_contrato(DADOS, "VB-C", "NDA")
+            except Exception as e:
+                erros.append(e)
+
+    threads = [threading.Thread(target=_criar_varios) for _ in range(THREADS)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    versoes = sorted(r[4] for r in listar_versoes_por_fornecedor(CNPJ))
+    total = 5 + THREADS * POR_THREAD
+    _conferir("criação concorrente sem versão repetida", not erros and versoes == list(range(1, total + 1)), erros[:1])
+
+    seq0 = desde(0, 1000)[1]
+    atualizar_status(ids[0], "ANALISE_JURIDICA_LGPD", "verificacao")
+    _conferir("status em lote", atualizar_status_em_lote(ids[1:3], "FINALIZADO", "verificacao") == 2)
+    _conferir("exclusão registrada uma vez", excluir_contrato(ids[4], "teste", "verificacao") == 1
+              and excluir_contrato(ids[4], "teste", "verificacao") == 0)
+    contagem = contar_por_status()
+    _conferir("contagem por status", contagem.get("FINALIZADO") == 2 and contagem.get("ANALISE_JURIDICA_LGPD") == 1
+              and sum(contagem.values()) == total - 1, contagem)
+    eventos, _proximo = desde(seq0, 1000)
+    _conferir("feed de eventos", len(eventos) == 4, len(eventos))
+    _conferir("log do contrato", [r[1] for r in obter_status_logs(ids[1])][-1] == "FINALIZADO")
+    _conferir("paginação por status", len(listar_contratos_por_status("FILA_INICIO", 3)) == 3)
+    _conferir("mais antigos por etapa", len(listar_mais_antigos_por_etapa(["FILA_INICIO"], 1)) == 1)
+    _conferir("geração dos dados", geracao_dados()[0] is not None)
+
+    linhas = sum(p.count(b"\n") for p in csv_em_pedacos("contratos"))
+    _conferir("exportação CSV", linhas == total, linhas)
+
+    _conferir("render sob demanda", len(renderizar_do_banco(ids[0])) > 1000)
+    with open("templates/nda.docx", "rb") as f:
+        versao = publicar_modelo("NDA", f.read(), "verificacao")[0]
+    _conferir("publicar modelo (mesmo conteúdo, mesma versão)", versao == 1 and len(versoes_modelo("NDA")) == 1)
+    _conferir("ativar versão", bool(ativar_versao("NDA", 1)))
+
+    salvar_fornecedores_lote([("1", {"razao_social": "A"}), ("1", {"razao_social": "B"})])
+    _conferir("upsert de fornecedor", (buscar_fornecedor("1") or {}).get("razao_social") == "B")
+
+    r = reconciliar(carencia_s=0)
+    _conferir("reconciliação", not r.get("outra_replica") and r["contratos"] >= 1, r)
+    marcar_arquivos_contratos([(ids[0], "AUSENTE", None, True)])
+    _conferir("sinalização de arquivo", contar_arquivos_sinalizados().get("AUSENTE") == 1)
+
+
+def main():
+    print(f"backend: {'PostgreSQL' if banco.POSTGRES else 'SQLite'}")
+    with tempfile.TemporaryDirectory() as tmp:
+        shutil.copytree(os.path.join(RAIZ, "templates"), os.path.join(tmp, "templates"))
+        os.chdir(tmp)  # banco.db, contratos/ e templates/ são relativos ao diretório atual
+        _fluxo()
+
+    if _falhas:
+        print(f"{len(_falhas)} verificação(ões) falharam")
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
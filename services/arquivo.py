@@ -0,0 +1,452 @@
+"""
+Arquivamento: move contratos FINALIZADOS antigos e contratos excluídos
+(com o status_log deles) do banco.db para o arquivo.db.
+
+Roda em lotes (1 transação por lote) e guarda checkpoint no próprio
+arquivo.db, então pode ser interrompido e retomado. Os DOCX dos contratos
+arquivados vão para contratos_arquivados/ (o arq.contratos aponta para lá):
+copiados antes da transação do lote (a cópia é idempotente, então a trava de
+escrita não fica presa durante o I/O) e apagados de contratos/ depois do
+commit, então uma interrupção deixa no máximo uma cópia a mais, nunca um
+contrato sem arquivo. Cada lote incrementa a geração "arquivamento" (geracao_dados), que
+invalida os caches montados sobre o banco. Pensado para cron:
+
+    python -m services.arquivo --dias 180 --lote 500 --vacuum
+"""
+import argparse
+import os
+import shutil
+from datetime import datetime, timedelta, timezone
+
+from services.banco import POSTGRES, agora_iso, conectar
+
+ARQUIVO_DB = os.getenv("ARQUIVO_DB", "arquivo.db")
+DIR_DOCX_ARQUIVADOS = os.getenv("ARQUIVO_DOCX_DIR", "contratos_arquivados")
+DIAS_RETENCAO = int(os.getenv("ARQUIVO_DIAS", "180"))
+TAMANHO_LOTE = 500
+
+TABELAS = ("contratos", "status_log")
+
+
+# -----------------------------
+# Estrutura do arquivo.db
+# -----------------------------
+def _anexar(conn):
+    if POSTGRES:
+        # arquivo.db depende de ATTACH; no PostgreSQL use partições/tabelas de histórico
+        raise RuntimeError("O arquivamento em arquivo.db só existe no backend SQLite (sem DATABASE_URL).")
+    conn.execute("ATTACH DATABASE ? AS arq", (ARQUIVO_DB,))
+
+def _colunas(conn, schema: str, tabela: str) -> list:
+    cur = conn.cursor()
+    cur.execute(f"PRAGMA {schema}.table_info({tabela})")
+    return [r[1] for r in cur.fetchall()]
+
+def _preparar_arquivo(conn):
+    """
+    Cria/atualiza as tabelas do arquivo.db espelhando as colunas do banco principal
+    (+ arquivado_em). Colunas novas no principal são adicionadas aqui também.
+    """
+    cur = conn.cursor()
+    for tabela in TABELAS:
+        cols_main = _colunas(conn, "main", tabela)
+        cols_arq = _colunas(conn, "arq", tabela)
+        if not cols_arq:
+            cur.execute(f"CREATE TABLE arq.{tabela} AS SELECT * FROM main.{tabela} WHERE 0")
+            cur.execute(f"ALTER TABLE arq.{tabela} ADD COLUMN arquivado_em TEXT")
+            cur.execute(f"CREATE UNIQUE INDEX arq.ux_{tabela}_id ON {tabela} (id)")
+        else:
+            for c in cols_main:
+                if c not in cols_arq:
+                    cur.execute(f"ALTER TABLE arq.{tabela} ADD COLUMN {c}")
+
+    cur.execute("CREATE INDEX IF NOT EXISTS arq.idx_status_log_contrato ON status_log (contrato_id)")
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS arq.arquivamento_execucao (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        iniciado_em TEXT,
+        concluido_em TEXT,
+        corte TEXT,
+        ultimo_id INTEGER,
+        contratos INTEGER,
+        logs INTEGER
+    )
+    """)
+    conn.commit()
+
+def _tamanho_banco(conn, schema: str = "main") -> int:
+    cur = conn.cursor()
+    cur.execute(f"PRAGMA {schema}.page_count")
+    paginas = cur.fetchone()[0]
+    cur.execute(f"PRAGMA {schema}.page_size")
+    return int(paginas * cur.fetchone()[0])
+
+def _bytes_livres(conn, schema: str = "main") -> int:
+    cur = conn.cursor()
+    cur.execute(f"PRAGMA {schema}.freelist_count")
+    livres = cur.fetchone()[0]
+    cur.execute(f"PRAGMA {schema}.page_size")
+    return int(livres * cur.fetchone()[0])
+
+
+# -----------------------------
+# DOCX dos contratos arquivados
+# -----------------------------
+def _copiar_docx(rows) -> dict:
+    """
+    Copia (tmp + os.replace) os DOCX de [(id, arquivo), ...] para
+    DIR_DOCX_ARQUIVADOS. Retorna {id: (origem, destino)} dos copiados;
+    arquivos que já não existem ficam de fora (o caminho antigo é mantido).
+    """
+    copiados = {}
+    for contrato_id, origem in rows:
+        if not origem or not os.path.isfile(origem):
+            continue
+        os.makedirs(DIR_DOCX_ARQUIVADOS, exist_ok=True)
+        destino = os.path.join(DIR_DOCX_ARQUIVADOS, f"{contrato_id}_{os.path.basename(origem)}")
+        tmp = f"{destino}.tmp"
+        shutil.copy2(origem, tmp)
+        os.replace(tmp, destino)
+        copiados[contrato_id] = (origem, destino)
+    return copiados
+
+def _apagar_originais(conn, copiados: dict) -> int:
+    """
+    Depois do commit: apaga de contratos/ as origens copiadas que nenhum
+    contrato usa mais, no principal ou no arquivo (o caminho pode ser
+    compartilhado, e um arquivado cujo arquivo mudou depois da cópia mantém
+    o caminho original).
+    """
+    origens = sorted({origem for origem, _destino in copiados.values()})
+    if not origens:
+        return 0
+    cur = conn.cursor()
+    marcas = ",".join("?" * len(origens))
+    cur.execute(
+        f"""
+        SELECT arquivo FROM main.contratos WHERE arquivo IN ({marcas})
+        UNION
+        SELECT arquivo FROM arq.contratos WHERE arquivo IN ({marcas})
+        """,
+        (*origens, *origens),
+    )
+    em_uso = {r[0] for r in cur.fetchall()}
+    apagados = 0
+    for origem in origens:
+        if origem in em_uso:
+            continue
+        try:
+            os.remove(origem)
+            apagados += 1
+        except FileNotFoundError:
+            pass
+    return apagados
+
+
+# -----------------------------
+# Execução (com checkpoint)
+# -----------------------------
+def _execucao_pendente(conn, dias: int):
+    """
+    Retoma uma execução interrompida (mesmo corte e último id) ou inicia outra.
+    Retorna (execucao_id, corte, ultimo_id).
+    """
+    cur = conn.cursor()
+    cur.execute(
+        """
+        SELECT id, corte, COALESCE(ultimo_id,0)
+        FROM arq.arquivamento_execucao
+        WHERE concluido_em IS NULL
+        ORDER BY id DESC
+        LIMIT 1
+        """
+    )
+    row = cur.fetchone()
+    if row:
+        return row
+
+    corte = (datetime.now(timezone.utc) - timedelta(days=dias)).isoformat()
+    cur.execute(
+        """
+        INSERT INTO arq.arquivamento_execucao (iniciado_em, corte, ultimo_id, contratos, logs)
+        VALUES (?, ?, 0, 0, 0)
+        """,
+        (agora_iso(), corte),
+    )
+    conn.commit()
+    return cur.lastrowid, corte, 0
+
+_SQL_ELEGIVEIS = """
+    SELECT id{extra}
+    FROM main.contratos
+    WHERE {filtro_id}
+      AND (
+        (status = 'FINALIZADO' AND COALESCE(finalizado_em,'') != '' AND finalizado_em < ?)
+        OR COALESCE(excluido_em,'') != ''
+      )
+    ORDER BY id
+"""
+
+def _arquivar_lote(conn, execucao_id: int, corte: str, ultimo_id: int, tamanho: int, cols: dict):
+    """
+    Move um lote numa única transação (principal + arquivo.db), com os DOCX.
+    Os DOCX são copiados antes do BEGIN IMMEDIATE; dentro da transação só
+    entram os candidatos que continuam elegíveis.
+    Retorna (novo_ultimo_id, contratos_movidos, logs_movidos, docx_movidos);
+    novo_ultimo_id == ultimo_id quando não há mais candidatos.
+    """
+    cur = conn.cursor()
+    cur.execute(
+        _SQL_ELEGIVEIS.format(extra=", arquivo", filtro_id="id > ?") + " LIMIT ?",
+        (ultimo_id, corte, tamanho),
+    )
+    candidatos = cur.fetchall()
+    conn.commit()  # encerra a leitura antes do I/O dos arquivos
+    if not candidatos:
+        return ultimo_id, 0, 0, 0
+    copiados = _copiar_docx(candidatos)
+    novo_ultimo = candidatos[-1][0]
+
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        marcas = ",".join("?" * len(candidatos))
+        cur.execute(
+            _SQL_ELEGIVEIS.format(extra="", filtro_id=f"id IN ({marcas})"),
+            (*(c[0] for c in candidatos), corte),
+        )
+        ids = [r[0] for r in cur.fetchall()]
+        n_contratos = n_logs = 0
+        if ids:
+            marcas = ",".join("?" * len(ids))
+            ts = agora_iso()
+
+            c_cols = ", ".join(cols["contratos"])
+            cur.execute(
+                f"""
+                INSERT INTO arq.contratos ({c_cols}, arquivado_em)
+                SELECT {c_cols}, ? FROM main.contratos WHERE id IN ({marcas})
+                """,
+                (ts, *ids),
+            )
+            n_contratos = cur.rowcount
+            # só aponta para a cópia se o arquivo não mudou desde que foi copiado
+            cur.executemany(
+                "UPDATE arq.contratos SET arquivo = ? WHERE id = ? AND arquivo = ?",
+                [(destino, cid, origem) for cid, (origem, destino) in copiados.items()],
+            )
+
+            l_cols = ", ".join(cols["status_log"])
+            cur.execute(
+                f"""
+                INSERT INTO arq.status_log ({l_cols}, arquivado_em)
+                SELECT {l_cols}, ? FROM main.status_log WHERE contrato_id IN ({marcas})
+                """,
+                (ts, *ids),
+            )
+            n_logs = cur.rowcount
+
+            cur.execute(f"DELETE FROM main.status_log WHERE contrato_id IN ({marcas})", ids)
+            cur.execute(f"DELETE FROM main.contratos WHERE id IN ({marcas})", ids)
+
+            cur.execute(
+                """
+                INSERT INTO main.geracao (chave, valor) VALUES ('arquivamento', 1)
+                ON CONFLICT (chave) DO UPDATE SET valor = valor + 1
+                """
+            )
+
+        cur.execute(
+            """
+            UPDATE arq.arquivamento_execucao
+            SET ultimo_id = ?, contratos = contratos + ?, logs = logs + ?
+            WHERE id = ?
+            """,
+            (novo_ultimo, n_contratos, n_logs, execucao_id),
+        )
+        usam_copia = set()
+        if copiados:
+            cur.execute(
+                f"SELECT id, arquivo FROM arq.contratos WHERE id IN ({','.join('?' * len(copiados))})",
+                list(copiados),
+            )
+            usam_copia = {cid for cid, arquivo in cur.fetchall() if arquivo == copiados[cid][1]}
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+    # cópias que não foram usadas (contrato deixou de ser elegível ou mudou de arquivo)
+    for cid, (_origem, destino) in copiados.items():
+        if cid not in usam_copia:
+            try:
+                os.remove(destino)
+            except FileNotFoundError:
+                pass
+    movidos = {cid: v for cid, v in copiados.items() if cid in usam_copia}
+    return novo_ultimo, n_contratos, n_logs, _apagar_originais(conn, movidos)
+
+def arquivar(
+    dias: int = DIAS_RETENCAO,
+    tamanho_lote: int = TAMANHO_LOTE,
+    max_lotes: int | None = None,
+    vacuum: bool = False,
+) -> dict:
+    """
+    Executa (ou retoma) o arquivamento. max_lotes limita o trabalho por chamada;
+    o restante fica para a próxima execução.
+    Retorna um relatório com contagens e espaço recuperado.
+    """
+    conn = conectar()
+    _anexar(conn)
+    _preparar_arquivo(conn)
+
+    cols = {t: _colunas(conn, "main", t) for t in TABELAS}
+    bytes_antes = _tamanho_banco(conn)
+
+    execucao_id, corte, ultimo_id = _execucao_pendente(conn, dias)
+
+    total_contratos = 0
+    total_logs = 0
+    total_docx = 0
+    lotes = 0
+    concluido = False
+    while max_lotes is None or lotes < max_lotes:
+        novo_ultimo, n_contratos, n_logs, n_docx = _arquivar_lote(conn, execucao_id, corte, ultimo_id, tamanho_lote, cols)
+        if novo_ultimo == ultimo_id:
+            concluido = True
+            break
+        ultimo_id = novo_ultimo
+        total_contratos += n_contratos
+        total_logs += n_logs
+        total_docx += n_docx
+        lotes += 1
+
+    if concluido:
+        conn.execute("UPDATE arq.arquivamento_execucao SET concluido_em = ? WHERE id = ?", (agora_iso(), execucao_id))
+        conn.commit()
+
+    livres = _bytes_livres(conn)
+    if vacuum and concluido:
+        conn.execute("VACUUM main")
+
+    bytes_depois = _tamanho_banco(conn)
+    conn.close()
+
+    return {
+        "execucao_id": execucao_id,
+        "corte": corte,
+        "concluido": concluido,
+        "lotes": lotes,
+        "contratos": total_contratos,
+        "logs": total_logs,
+        "docx": total_docx,
+        "bytes_antes": bytes_antes,
+        "bytes_depois": bytes_depois,
+        "bytes_recuperados": bytes_antes - bytes_depois,
+        "bytes_livres_reaproveitaveis": 0 if (vacuum and concluido) else livres,
+    }
+
+
+# -----------------------------
+# Leitura unificada (auditoria)
+# -----------------------------
+def conectar_auditoria():
+    """
+    Conexão com banco.db + arquivo.db e as views temporárias
+    contratos_todos / status_log_todos (quente + arquivado).
+    """
+    conn = conectar()
+    _anexar(conn)
+    _preparar_arquivo(conn)
+
+    cur = conn.cursor()
+    for tabela in TABELAS:
+        c = ", ".join(_colunas(conn, "main", tabela))
+        cur.execute(
+            f"""
+            CREATE TEMP VIEW IF NOT EXISTS {tabela}_todos AS
+            SELECT {c}, NULL AS arquivado_em FROM main.{tabela}
+            UNION ALL
+            SELECT {c}, arquivado_em FROM arq.{tabela}
+            """
+        )
+    return conn
+
+def arquivos_referenciados(caminhos) -> set:
+    """
+    Quais destes caminhos algum contrato arquivado (arq.contratos) ainda usa.
+    Vazio no PostgreSQL ou enquanto não existir arquivo.db.
+    """
+    caminhos = list(caminhos)
+    if POSTGRES or not caminhos or not os.path.exists(ARQUIVO_DB):
+        return set()
+    conn = conectar()
+    _anexar(conn)
+    if not _colunas(conn, "arq", "contratos"):
+        conn.close()
+        return set()
+    cur = conn.cursor()
+    usados = set()
+    for i in range(0, len(caminhos), TAMANHO_LOTE):
+        lote = caminhos[i:i + TAMANHO_LOTE]
+        cur.execute(f"SELECT DISTINCT arquivo FROM arq.contratos WHERE arquivo IN ({','.join('?' * len(lote))})", lote)
+        usados.update(r[0] for r in cur.fetchall())
+    conn.close()
+    return usados
+
+def buscar_contrato_auditoria(contrato_id: int):
+    conn = conectar_auditoria()
+    cur = conn.cursor()
+    cur.execute(
+        """
+        SELECT id, numero, razao_social, status, arquivo,
+               fornecedor_cnpj, fornecedor_razao, COALESCE(versao,0),
+               COALESCE(tipo_modelo,''), COALESCE(criado_em,''), COALESCE(finalizado_em,''),
+               COALESCE(excluido_em,''), COALESCE(arquivado_em,'')
+        FROM contratos_todos
+        WHERE id = ?
+        """,
+        (contrato_id,),
+    )
+    row = cur.fetchone()
+    conn.close()
+    return row
+
+def obter_status_logs_auditoria(contrato_id: int):
+    conn = conectar_auditoria()
+    cur = conn.cursor()
+    cur.execute(
+        """
+        SELECT de_status, para_status, alterado_em, alterado_por
+        FROM status_log_todos
+        WHERE contrato_id = ?
+        ORDER BY id ASC
+        """,
+        (contrato_id,),
+    )
+    rows = cur.fetchall()
+    conn.close()
+    return rows
+
+
+def _main():
+    ap = argparse.ArgumentParser(description="Arquiva contratos finalizados antigos e excluídos em arquivo.db")
+    ap.add_argument("--dias", type=int, default=DIAS_RETENCAO, help="finalizados há mais de N dias")
+    ap.add_argument("--lote", type=int, default=TAMANHO_LOTE)
+    ap.add_argument("--max-lotes", type=int, default=None)
+    ap.add_argument("--vacuum", action="store_true", help="compacta o banco.db ao final")
+    args = ap.parse_args()
+
+    r = arquivar(dias=args.dias, tamanho_lote=args.lote, max_lotes=args.max_lotes, vacuum=args.vacuum)
+    estado = "concluído" if r["concluido"] else "parcial (rode de novo para continuar)"
+    print(f"Execução #{r['execucao_id']} ({estado}), corte {r['corte']}")
+    print(f"  {r['contratos']} contrato(s) e {r['logs']} log(s) em {r['lotes']} lote(s)")
+    print(f"  {r['docx']} DOCX movido(s) para {DIR_DOCX_ARQUIVADOS}/")
+    print(f"  banco.db: {r['bytes_antes'] / 1024:.0f} KiB -> {r['bytes_depois'] / 1024:.0f} KiB "
+          f"({r['bytes_recuperados'] / 1024:.0f} KiB recuperados)")
+    if r["bytes_livres_reaproveitaveis"]:
+        print(f"  {r['bytes_livres_reaproveitaveis'] / 1024:.0f} KiB livres dentro do arquivo (use --vacuum para devolver ao disco)")
+
+
+if __name__ == "__main__":
+    _main()
@@ -1,5 +1,4 @@
 import os
-from passlib.context import CryptContext
 from services.banco import conectar
 
 try:
@@ -7,12 +6,22 @@ try:
 except Exception:
     st = None
 
-# ✅ seguro e 100% Python (não depende de bcrypt)
-pwd_context = CryptContext(schemes=["pbkdf2_sha256"], deprecated="auto")
+_pwd_context = None
+
+
+def pwd_context():
+    # passlib só é importado no primeiro login/cadastro (startup mais rápido)
+    global _pwd_context
+    if _pwd_context is None:
+        from passlib.context import CryptContext
+
+        # ✅ seguro e 100% Python (não depende de bcrypt)
+        _pwd_context = CryptContext(schemes=["pbkdf2_sha256"], deprecated="auto")
+    return _pwd_context
 
 
 def _hash_senha(senha: str) -> str:
-    return pwd_context.hash(senha)
+    return pwd_context().hash(senha)
 
 
 def criar_ou_atualizar_usuario(username: str, senha: str, perfil: str):
@@ -52,7 +61,7 @@ def autenticar(username: str, senha: str):
     senha_hash, perfil = row
 
     try:
-        if pwd_context.verify(senha, senha_hash):
+        if pwd_context().verify(senha, senha_hash):
             return perfil
     except Exception:
         return None
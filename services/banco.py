@@ -1,40 +1,329 @@
+import contextlib
+import json
+import os
+import queue
+import re
 import sqlite3
+import threading
 from datetime import datetime, timezone
+from functools import lru_cache
 
-def conectar():
+from services.status import EXCLUIDO
+
+# limite de parâmetros por statement (SQLite antigo: 999)
+_LOTE_SQL = 500
+
+# sem DATABASE_URL: banco.db local (SQLite). Com postgresql://...: PostgreSQL,
+# para rodar várias réplicas do app/API contra o mesmo banco
+# (requer: pip install "psycopg[binary,pool]"; importado só nesse caso).
+DATABASE_URL = os.getenv("DATABASE_URL", "").strip()
+POSTGRES = DATABASE_URL.startswith(("postgres://", "postgresql://"))
+POOL_POSTGRES = int(os.getenv("BANCO_POOL", "10"))
+# espera máxima por uma conexão livre do pool (API / PostgreSQL)
+POOL_TIMEOUT_S = float(os.getenv("BANCO_POOL_TIMEOUT_S", "30"))
+
+# tipos que mudam entre os dois bancos (o resto do DDL é igual)
+if POSTGRES:
+    _ID_AUTO = "BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY"
+    _BLOB = "BYTEA"
+    _REAL = "DOUBLE PRECISION"
+else:
+    _ID_AUTO = "INTEGER PRIMARY KEY AUTOINCREMENT"
+    _BLOB = "BLOB"
+    _REAL = "REAL"
+
+# -----------------------------
+# Conexões (pool opcional, usado pela API)
+# -----------------------------
+class PoolEsgotado(RuntimeError):
+    """Nenhuma conexão do pool ficou livre em POOL_TIMEOUT_S (a API responde 503)."""
+
+def _nova_conexao():
     return sqlite3.connect("banco.db", check_same_thread=False)
 
+class _ConexaoDoPool:
+    """
+    Embrulha a conexão real: close() devolve ao pool em vez de fechar.
+    """
+
+    def __init__(self, conn, pool):
+        self._conn = conn
+        self._pool = pool
+
+    def __getattr__(self, nome):
+        return getattr(self._conn, nome)
+
+    def close(self):
+        if self._conn is None:
+            return
+        if self._conn.in_transaction:
+            self._conn.rollback()
+        self._pool.devolver(self._conn)
+        self._conn = None
+
+class _PoolConexoes:
+    def __init__(self, tamanho: int):
+        self._livres = queue.LifoQueue()
+        self._tamanho = max(1, tamanho)
+        self._criadas = 0
+        self._lock = threading.Lock()
+
+    def obter(self):
+        try:
+            conn = self._livres.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                criar = self._criadas < self._tamanho
+                if criar:
+                    self._criadas += 1
+            if criar:
+                conn = _nova_conexao()
+            else:
+                try:
+                    conn = self._livres.get(timeout=POOL_TIMEOUT_S)
+                except queue.Empty:
+                    raise PoolEsgotado(
+                        f"Nenhuma das {self._tamanho} conexões do pool ficou livre em {POOL_TIMEOUT_S:g}s."
+                    ) from None
+        return _ConexaoDoPool(conn, self)
+
+    def devolver(self, conn):
+        self._livres.put(conn)
+
+# -----------------------------
+# PostgreSQL (psycopg 3 + psycopg_pool)
+# -----------------------------
+# mesmo código SQL dos dois lados: ? vira %s (e % literal vira %%)
+_TOKENS_SQL = re.compile(r"'(?:[^']|'')*'|\?|%")
+
+@lru_cache(maxsize=512)
+def _sql_postgres(sql: str) -> str:
+    def _trocar(m):
+        t = m.group(0)
+        if t == "?":
+            return "%s"
+        return t.replace("%", "%%")
+    return _TOKENS_SQL.sub(_trocar, sql)
+
+class _CursorPostgres:
+    """
+    Cursor psycopg com a interface do sqlite3 usada aqui (placeholders ?).
+    """
+
+    def __init__(self, cur):
+        self._cur = cur
+
+    def __getattr__(self, nome):
+        return getattr(self._cur, nome)
+
+    def __iter__(self):
+        return iter(self._cur)
+
+    def execute(self, sql, params=None):
+        if params is None:
+            self._cur.execute(sql)
+        else:
+            self._cur.execute(_sql_postgres(sql), params)
+        return self
+
+    def executemany(self, sql, seq):
+        self._cur.executemany(_sql_postgres(sql), seq)
+        return self
+
+class _ConexaoPostgres:
+    """
+    Conexão emprestada do pool; close() devolve (com rollback do que ficou aberto).
+    """
+
+    def __init__(self, conn, pool):
+        self._conn = conn
+        self._pool = pool
+
+    def __getattr__(self, nome):
+        return getattr(self._conn, nome)
+
+    @property
+    def in_transaction(self):
+        from psycopg.pq import TransactionStatus
+
+        return self._conn.info.transaction_status != TransactionStatus.IDLE
+
+    def cursor(self, nome: str | None = None):
+        return _CursorPostgres(self._conn.cursor(name=nome) if nome else self._conn.cursor())
+
+    def execute(self, sql, params=None):
+        return self.cursor().execute(sql, params)
+
+    def close(self):
+        if self._conn is None:
+            return
+        if self.in_transaction:
+            self._conn.rollback()
+        self._pool.putconn(self._conn)
+        self._conn = None
+
+def _pool_postgres(tamanho: int):
+    from psycopg_pool import ConnectionPool
+
+    return ConnectionPool(
+        DATABASE_URL, min_size=1, max_size=max(1, tamanho), timeout=POOL_TIMEOUT_S, open=True, name="contratos"
+    )
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def configurar_pool(tamanho: int):
+    """
+    Liga o pool de conexões para este processo (a UI continua sem pool no
+    SQLite; no PostgreSQL sempre há pool, e aqui só muda o tamanho).
+    """
+    global _pool
+    with _pool_lock:
+        if POSTGRES:
+            if _pool is not None:
+                _pool.close()
+            _pool = _pool_postgres(tamanho)
+        else:
+            _pool = _PoolConexoes(tamanho)
+
+def conectar():
+    global _pool
+    if POSTGRES:
+        if _pool is None:
+            with _pool_lock:
+                if _pool is None:
+                    _pool = _pool_postgres(POOL_POSTGRES)
+        from psycopg_pool import PoolTimeout
+
+        try:
+            return _ConexaoPostgres(_pool.getconn(), _pool)
+        except PoolTimeout:
+            raise PoolEsgotado(
+                f"Nenhuma das {_pool.max_size} conexões do pool ficou livre em {POOL_TIMEOUT_S:g}s."
+            ) from None
+    if _pool is not None:
+        return _pool.obter()
+    return _nova_conexao()
+
+def iniciar_escrita(conn, trava: str | None = None):
+    """
+    Abre a transação de escrita. SQLite: BEGIN IMMEDIATE (trava o banco todo).
+    PostgreSQL: a transação começa sozinha e as linhas são travadas pelo
+    próprio UPDATE/upsert; `trava` serializa quem disputa a mesma chave
+    sem linha para travar (ex.: próxima versão de um modelo novo).
+    Quem grava no status_log usa a trava "status_log": os ids passam a ficar
+    visíveis na ordem em que foram gerados (o feed de mudanças depende disso).
+    """
+    if not POSTGRES:
+        conn.execute("BEGIN IMMEDIATE")
+    elif trava:
+        conn.execute("SELECT pg_advisory_xact_lock(hashtext(?))", (trava,))
+
+@contextlib.contextmanager
+def trava_exclusiva(nome: str):
+    """
+    Para tarefas de fundo que devem rodar em uma réplica só por vez:
+    `with trava_exclusiva("x") as minha:` e, se minha for False, outra
+    réplica está rodando e a passada é pulada. PostgreSQL: advisory lock de
+    sessão numa conexão separada, segura até o fim do bloco (cai junto com a
+    conexão se o processo morrer). SQLite: um host só, sempre True.
+    """
+    if not POSTGRES:
+        yield True
+        return
+    conn = conectar()
+    try:
+        cur = conn.cursor()
+        cur.execute("SELECT pg_try_advisory_lock(hashtext(?))", (nome,))
+        minha = bool(cur.fetchone()[0])
+        conn.commit()
+        try:
+            yield minha
+        finally:
+            if minha:
+                cur.execute("SELECT pg_advisory_unlock(hashtext(?))", (nome,))
+                conn.commit()
+    finally:
+        conn.close()
+
+def _erros_integridade():
+    if POSTGRES:
+        import psycopg
+
+        return (sqlite3.IntegrityError, psycopg.IntegrityError)
+    return (sqlite3.IntegrityError,)
+
+def erros_de_banco() -> tuple:
+    """
+    (integridade, demais) do driver em uso, para quem traduz falhas do banco
+    em respostas (API): conflito de chave x banco travado/indisponível.
+    """
+    if POSTGRES:
+        import psycopg
+
+        return _erros_integridade(), (sqlite3.Error, psycopg.Error)
+    return _erros_integridade(), (sqlite3.Error,)
+
 def agora_iso():
     return datetime.now(timezone.utc).isoformat()
 
 def _coluna_existe(conn, tabela: str, coluna: str) -> bool:
     cur = conn.cursor()
+    if POSTGRES:
+        cur.execute(
+            """
+            SELECT 1 FROM information_schema.columns
+            WHERE table_schema = current_schema() AND table_name = ? AND column_name = ?
+            """,
+            (tabela, coluna),
+        )
+        return cur.fetchone() is not None
     cur.execute(f"PRAGMA table_info({tabela})")
     cols = [r[1] for r in cur.fetchall()]
     return coluna in cols
 
-def _garantir_coluna(conn, tabela: str, coluna: str, tipo_sql: str):
+def _tabela_existe(conn, tabela: str) -> bool:
+    cur = conn.cursor()
+    if POSTGRES:
+        cur.execute(
+            "SELECT 1 FROM information_schema.tables WHERE table_schema = current_schema() AND table_name = ?",
+            (tabela,),
+        )
+    else:
+        cur.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (tabela,))
+    return cur.fetchone() is not None
+
+def _garantir_coluna(conn, tabela: str, coluna: str, tipo_sql: str) -> bool:
+    """
+    Cria a coluna se ainda não existir. Retorna True se criou agora.
+    """
     if not _coluna_existe(conn, tabela, coluna):
         cur = conn.cursor()
         cur.execute(f"ALTER TABLE {tabela} ADD COLUMN {coluna} {tipo_sql}")
         conn.commit()
+        return True
+    return False
 
 def criar_tabelas():
     conn = conectar()
     cur = conn.cursor()
+    if POSTGRES:
+        # várias réplicas subindo juntas: uma migra, as outras esperam
+        cur.execute("SELECT pg_advisory_lock(hashtext('criar_tabelas'))")
 
-    cur.execute("""
+    cur.execute(f"""
     CREATE TABLE IF NOT EXISTS usuarios (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        id {_ID_AUTO},
         username TEXT UNIQUE,
         senha TEXT,
         perfil TEXT
     )
     """)
 
-    cur.execute("""
+    cur.execute(f"""
     CREATE TABLE IF NOT EXISTS contratos (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        id {_ID_AUTO},
         numero TEXT,
         cnpj TEXT,
         razao_social TEXT,
@@ -52,16 +341,59 @@ def criar_tabelas():
     _garantir_coluna(conn, "contratos", "criado_em", "TEXT")
     _garantir_coluna(conn, "contratos", "atualizado_em", "TEXT")
     _garantir_coluna(conn, "contratos", "finalizado_em", "TEXT")
+    _garantir_coluna(conn, "contratos", "status_anterior", "TEXT")
+    etapa_nova = _garantir_coluna(conn, "contratos", "etapa_entrada_em", "TEXT")
 
     # soft delete + auditoria
     _garantir_coluna(conn, "contratos", "excluido_em", "TEXT")
     _garantir_coluna(conn, "contratos", "excluido_por", "TEXT")
     _garantir_coluna(conn, "contratos", "excluido_justificativa", "TEXT")
 
-    # status_log para SLA
+    # render sob demanda: modelo + valores de substituição
+    _garantir_coluna(conn, "contratos", "modelo_id", "TEXT")
+    _garantir_coluna(conn, "contratos", "modelo_hash", "TEXT")
+    _garantir_coluna(conn, "contratos", "substituicoes", "TEXT")
+    # versão (número) do modelo em uso; o re-render em massa (services/rerender.py) atualiza
+    versao_modelo_nova = _garantir_coluna(conn, "contratos", "modelo_versao", "INTEGER")
+
+    # integridade do DOCX gravado (sha256) + sinalização do reconciliador (AUSENTE/COLISAO)
+    _garantir_coluna(conn, "contratos", "arquivo_hash", "TEXT")
+    _garantir_coluna(conn, "contratos", "arquivo_situacao", "TEXT")
+
+    # contador de versão por fornecedor (evita MAX(versao)+1 concorrente)
+    contador_novo = not _tabela_existe(conn, "fornecedor_versao")
     cur.execute("""
+    CREATE TABLE IF NOT EXISTS fornecedor_versao (
+        fornecedor_cnpj TEXT PRIMARY KEY,
+        ultima_versao INTEGER NOT NULL
+    )
+    """)
+    if contador_novo:
+        # semente a partir dos contratos existentes (inclui excluídos: versão não é reutilizada)
+        cur.execute("""
+        INSERT INTO fornecedor_versao (fornecedor_cnpj, ultima_versao)
+        SELECT fornecedor_cnpj, MAX(COALESCE(versao,0))
+        FROM contratos
+        WHERE fornecedor_cnpj IS NOT NULL
+        GROUP BY fornecedor_cnpj
+        """)
+    conn.commit()
+
+    try:
+        cur.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS ux_contratos_fornecedor_versao
+        ON contratos (fornecedor_cnpj, versao)
+        WHERE excluido_em IS NULL OR excluido_em = ''
+        """)
+        conn.commit()
+    except _erros_integridade():
+        # base antiga com versões duplicadas: fica sem o índice até corrigir os dados
+        conn.rollback()
+
+    # status_log para SLA
+    cur.execute(f"""
     CREATE TABLE IF NOT EXISTS status_log (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        id {_ID_AUTO},
         contrato_id INTEGER,
         de_status TEXT,
         para_status TEXT,
@@ -69,17 +401,110 @@ def criar_tabelas():
         alterado_por TEXT
     )
     """)
+    # cadastro do fornecedor (último retorno da BrasilAPI)
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS fornecedores (
+        cnpj TEXT PRIMARY KEY,
+        razao_social TEXT,
+        dados TEXT,
+        atualizado_em TEXT
+    )
+    """)
+
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_status_log_contrato ON status_log (contrato_id)")
+
+    # registro de modelos (DOCX) versionado + estatísticas de render
+    cur.execute(f"""
+    CREATE TABLE IF NOT EXISTS modelos (
+        id {_ID_AUTO},
+        nome TEXT NOT NULL,
+        versao INTEGER NOT NULL,
+        hash TEXT NOT NULL,
+        conteudo {_BLOB} NOT NULL,
+        manifesto TEXT,
+        ativo INTEGER NOT NULL DEFAULT 0,
+        criado_em TEXT,
+        criado_por TEXT,
+        renders INTEGER NOT NULL DEFAULT 0,
+        render_ms_total {_REAL} NOT NULL DEFAULT 0,
+        UNIQUE (nome, versao)
+    )
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_modelos_hash ON modelos (hash)")
+    cur.execute("CREATE UNIQUE INDEX IF NOT EXISTS ux_modelos_ativo ON modelos (nome) WHERE ativo = 1")
+    cur.execute(f"""
+    CREATE TABLE IF NOT EXISTS modelo_render (
+        id {_ID_AUTO},
+        modelo_hash TEXT,
+        ms {_REAL},
+        em TEXT
+    )
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_modelo_render_hash ON modelo_render (modelo_hash, id)")
+
+    # entrada na etapa atual (denormalizado do status_log; mantido por atualizar_status)
+    if etapa_nova:
+        cur.execute(
+            """
+            UPDATE contratos
+            SET etapa_entrada_em = COALESCE(
+                (SELECT MAX(l.alterado_em) FROM status_log l
+                 WHERE l.contrato_id = contratos.id AND l.para_status = contratos.status),
+                criado_em
+            )
+            """
+        )
+    if versao_modelo_nova:
+        cur.execute(
+            """
+            UPDATE contratos
+            SET modelo_versao = (
+                SELECT MAX(m.versao) FROM modelos m
+                WHERE m.hash = contratos.modelo_hash AND m.nome = contratos.modelo_id
+            )
+            WHERE modelo_hash IS NOT NULL
+            """
+        )
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_contratos_status_etapa ON contratos (status, etapa_entrada_em)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_contratos_status ON contratos (status, id)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_contratos_atualizado_em ON contratos (atualizado_em)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_contratos_arquivo ON contratos (arquivo)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_contratos_modelo ON contratos (tipo_modelo, id)")
+
+    # checkpoints do reconciliador de arquivos (services/reconciliacao.py)
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS reconciliacao_estado (
+        chave TEXT PRIMARY KEY,
+        valor TEXT
+    )
+    """)
+
+    # contadores que entram em geracao_dados() para mudanças que não passam
+    # por status_log/atualizado_em (ex.: arquivamento, que só apaga linhas)
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS geracao (
+        chave TEXT PRIMARY KEY,
+        valor INTEGER NOT NULL DEFAULT 0
+    )
+    """)
     conn.commit()
+    if POSTGRES:
+        cur.execute("SELECT pg_advisory_unlock(hashtext('criar_tabelas'))")
+        conn.commit()
     conn.close()
 
 def _proxima_versao_fornecedor(conn, fornecedor_cnpj: str) -> int:
+    """
+    Incrementa o contador do fornecedor de forma atômica (precisa estar dentro
+    de iniciar_escrita: o upsert trava a linha do contador até o commit).
+    """
     cur = conn.cursor()
     cur.execute(
         """
-        SELECT COALESCE(MAX(COALESCE(versao,0)), 0) + 1
-        FROM contratos
-        WHERE fornecedor_cnpj = ?
-          AND (excluido_em IS NULL OR excluido_em = '')
+        INSERT INTO fornecedor_versao (fornecedor_cnpj, ultima_versao)
+        VALUES (?, 1)
+        ON CONFLICT (fornecedor_cnpj) DO UPDATE SET ultima_versao = fornecedor_versao.ultima_versao + 1
+        RETURNING ultima_versao
         """,
         (fornecedor_cnpj,),
     )
@@ -87,7 +512,7 @@ def _proxima_versao_fornecedor(conn, fornecedor_cnpj: str) -> int:
 
 def inserir_contrato_fornecedor(fornecedor_cnpj: str, fornecedor_razao: str, status: str, tipo_modelo: str) -> int:
     conn = conectar()
-    conn.execute("BEGIN")
+    iniciar_escrita(conn, "status_log")
     try:
         versao = _proxima_versao_fornecedor(conn, fornecedor_cnpj)
         ts = agora_iso()
@@ -98,13 +523,14 @@ def inserir_contrato_fornecedor(fornecedor_cnpj: str, fornecedor_razao: str, sta
             INSERT INTO contratos (
                 cnpj, razao_social, status, arquivo,
                 fornecedor_cnpj, fornecedor_razao, versao, tipo_modelo,
-                criado_em, atualizado_em
+                criado_em, atualizado_em, etapa_entrada_em
             )
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            RETURNING id
             """,
-            (fornecedor_cnpj, fornecedor_razao, status, None, fornecedor_cnpj, fornecedor_razao, versao, tipo_modelo, ts, ts),
+            (fornecedor_cnpj, fornecedor_razao, status, None, fornecedor_cnpj, fornecedor_razao, versao, tipo_modelo, ts, ts, ts),
         )
-        contrato_id = cur.lastrowid
+        contrato_id = int(cur.fetchone()[0])
 
         # log inicial
         cur.execute(
@@ -123,27 +549,68 @@ def inserir_contrato_fornecedor(fornecedor_cnpj: str, fornecedor_razao: str, sta
         conn.close()
         raise
 
-def atualizar_numero_arquivo(contrato_id: int, numero: str, arquivo: str):
+def atualizar_numero_arquivo(contrato_id: int, numero: str, arquivo: str, arquivo_hash: str | None = None):
     conn = conectar()
     cur = conn.cursor()
     ts = agora_iso()
     cur.execute(
-        "UPDATE contratos SET numero = ?, arquivo = ?, atualizado_em = ? WHERE id = ?",
-        (numero, arquivo, ts, contrato_id),
+        "UPDATE contratos SET numero = ?, arquivo = ?, arquivo_hash = ?, atualizado_em = ? WHERE id = ?",
+        (numero, arquivo, arquivo_hash, ts, contrato_id),
+    )
+    conn.commit()
+    conn.close()
+
+def salvar_dados_render(
+    contrato_id: int, modelo_id: str, modelo_hash: str, substituicoes: dict, modelo_versao: int | None = None
+):
+    """
+    Guarda o necessário para renderizar o DOCX de novo, de forma determinística:
+    identificação/hash (e versão) do modelo e os valores de substituição.
+    """
+    conn = conectar()
+    cur = conn.cursor()
+    cur.execute(
+        "UPDATE contratos SET modelo_id = ?, modelo_hash = ?, modelo_versao = ?, substituicoes = ? WHERE id = ?",
+        (modelo_id, modelo_hash, modelo_versao, json.dumps(substituicoes, ensure_ascii=False, sort_keys=True), contrato_id),
     )
     conn.commit()
     conn.close()
 
-def buscar_contrato_por_id(contrato_id: int):
+def buscar_dados_render(contrato_id: int):
+    """
+    Retorna (numero, arquivo, modelo_id, modelo_hash, substituicoes: dict) ou None.
+    """
     conn = conectar()
     cur = conn.cursor()
     cur.execute(
         """
+        SELECT COALESCE(numero,''), arquivo, COALESCE(modelo_id,''), COALESCE(modelo_hash,''), substituicoes
+        FROM contratos
+        WHERE id = ?
+        """,
+        (contrato_id,),
+    )
+    row = cur.fetchone()
+    conn.close()
+    if not row:
+        return None
+    numero, arquivo, modelo_id, modelo_hash, subs = row
+    return numero, arquivo, modelo_id, modelo_hash, json.loads(subs) if subs else None
+
+def buscar_contrato_por_id(contrato_id: int, incluir_excluidos: bool = True):
+    """
+    incluir_excluidos=False: contrato excluído volta None (como inexistente).
+    """
+    conn = conectar()
+    cur = conn.cursor()
+    cur.execute(
+        f"""
         SELECT id, numero, razao_social, status, arquivo,
                fornecedor_cnpj, fornecedor_razao, COALESCE(versao,0),
                COALESCE(tipo_modelo,''), COALESCE(criado_em,''), COALESCE(atualizado_em,''), COALESCE(finalizado_em,'')
         FROM contratos
         WHERE id = ?
+        {"" if incluir_excluidos else "AND (excluido_em IS NULL OR excluido_em = '')"}
         """,
         (contrato_id,),
     )
@@ -152,41 +619,68 @@ def buscar_contrato_por_id(contrato_id: int):
     return row
 
 def atualizar_status(contrato_id: int, novo_status: str, alterado_por: str | None):
-    conn = conectar()
-    cur = conn.cursor()
+    atualizar_status_em_lote([contrato_id], novo_status, alterado_por)
+
+def atualizar_status_em_lote(ids, novo_status: str, alterado_por: str | None) -> int:
+    """
+    Move vários contratos numa única transação (1 commit/fsync).
+    O status anterior vem do próprio UPDATE (status_anterior = status ... RETURNING),
+    sem SELECT separado. Retorna quantos contratos foram movidos.
+    """
+    ids = list(dict.fromkeys(int(i) for i in ids))
+    if not ids:
+        return 0
+
     ts = agora_iso()
+    finalizado_em = ts if novo_status == "FINALIZADO" else None
 
-    cur.execute("SELECT status FROM contratos WHERE id = ?", (contrato_id,))
-    r = cur.fetchone()
-    de_status = r[0] if r else None
+    conn = conectar()
+    iniciar_escrita(conn, "status_log")
+    try:
+        cur = conn.cursor()
+        logs = []
+        for i in range(0, len(ids), _LOTE_SQL):
+            parte = ids[i:i + _LOTE_SQL]
+            marcas = ",".join("?" * len(parte))
+            cur.execute(
+                f"""
+                UPDATE contratos
+                SET status_anterior = status,
+                    status = ?,
+                    atualizado_em = ?,
+                    finalizado_em = COALESCE(?, finalizado_em),
+                    etapa_entrada_em = CASE WHEN status = ? THEN etapa_entrada_em ELSE ? END
+                WHERE id IN ({marcas})
+                RETURNING id, status_anterior
+                """,
+                (novo_status, ts, finalizado_em, novo_status, ts, *parte),
+            )
+            logs.extend((cid, de_status, novo_status, ts, alterado_por) for cid, de_status in cur.fetchall())
 
-    if novo_status == "FINALIZADO":
-        cur.execute(
-            "UPDATE contratos SET status = ?, atualizado_em = ?, finalizado_em = ? WHERE id = ?",
-            (novo_status, ts, ts, contrato_id),
-        )
-    else:
-        cur.execute(
-            "UPDATE contratos SET status = ?, atualizado_em = ? WHERE id = ?",
-            (novo_status, ts, contrato_id),
+        cur.executemany(
+            """
+            INSERT INTO status_log (contrato_id, de_status, para_status, alterado_em, alterado_por)
+            VALUES (?, ?, ?, ?, ?)
+            """,
+            logs,
         )
 
-    cur.execute(
-        """
-        INSERT INTO status_log (contrato_id, de_status, para_status, alterado_em, alterado_por)
-        VALUES (?, ?, ?, ?, ?)
-        """,
-        (contrato_id, de_status, novo_status, ts, alterado_por),
-    )
-
-    conn.commit()
-    conn.close()
+        conn.commit()
+        conn.close()
+        return len(logs)
+    except Exception:
+        conn.rollback()
+        conn.close()
+        raise
 
-def listar_contratos_por_status(status: str):
+def listar_contratos_por_status(status: str, limite: int | None = None, antes_de_id: int | None = None):
+    """
+    Lista os contratos da etapa (mais novos primeiro).
+    Paginação opcional por cursor: passe o menor id da página anterior em antes_de_id.
+    """
     conn = conectar()
     cur = conn.cursor()
-    cur.execute(
-        """
+    sql = """
         SELECT
             id, numero, razao_social, status, arquivo,
             fornecedor_cnpj, fornecedor_razao, COALESCE(versao,0),
@@ -194,10 +688,16 @@ def listar_contratos_por_status(status: str):
         FROM contratos
         WHERE status = ?
           AND (excluido_em IS NULL OR excluido_em = '')
-        ORDER BY id DESC
-        """,
-        (status,),
-    )
+    """
+    params = [status]
+    if antes_de_id is not None:
+        sql += " AND id < ?"
+        params.append(antes_de_id)
+    sql += " ORDER BY id DESC"
+    if limite is not None:
+        sql += " LIMIT ?"
+        params.append(limite)
+    cur.execute(sql, params)
     rows = cur.fetchall()
     conn.close()
     return rows
@@ -255,22 +755,97 @@ def listar_versoes_por_fornecedor(fornecedor_cnpj: str):
     conn.close()
     return rows
 
-def excluir_contrato(contrato_id: int, justificativa: str, excluido_por: str | None) -> int:
-    ts = agora_iso()
+def listar_cnpjs_fornecedores():
     conn = conectar()
     cur = conn.cursor()
     cur.execute(
         """
-        UPDATE contratos
-        SET excluido_em = ?, excluido_por = ?, excluido_justificativa = ?, atualizado_em = ?
-        WHERE id = ?
+        SELECT DISTINCT fornecedor_cnpj
+        FROM contratos
+        WHERE fornecedor_cnpj IS NOT NULL AND fornecedor_cnpj != ''
+          AND (excluido_em IS NULL OR excluido_em = '')
+        ORDER BY fornecedor_cnpj
+        """
+    )
+    rows = [r[0] for r in cur.fetchall()]
+    conn.close()
+    return rows
+
+def salvar_fornecedores_lote(cadastros):
+    """
+    Upsert de vários cadastros [(cnpj, dados: dict), ...] numa transação.
+    """
+    ts = agora_iso()
+    linhas = [
+        (cnpj, (dados or {}).get("razao_social", ""), json.dumps(dados, ensure_ascii=False), ts)
+        for cnpj, dados in cadastros
+    ]
+    if not linhas:
+        return 0
+    conn = conectar()
+    cur = conn.cursor()
+    cur.executemany(
+        """
+        INSERT INTO fornecedores (cnpj, razao_social, dados, atualizado_em)
+        VALUES (?, ?, ?, ?)
+        ON CONFLICT (cnpj) DO UPDATE SET
+            razao_social = excluded.razao_social,
+            dados = excluded.dados,
+            atualizado_em = excluded.atualizado_em
         """,
-        (ts, excluido_por, justificativa, ts, contrato_id),
+        linhas,
     )
-    afetadas = cur.rowcount
     conn.commit()
     conn.close()
-    return afetadas
+    return len(linhas)
+
+def buscar_fornecedor(cnpj: str):
+    """
+    Retorna o último cadastro salvo (dict) ou None.
+    """
+    conn = conectar()
+    cur = conn.cursor()
+    cur.execute("SELECT dados FROM fornecedores WHERE cnpj = ?", (cnpj,))
+    row = cur.fetchone()
+    conn.close()
+    return json.loads(row[0]) if row and row[0] else None
+
+def excluir_contrato(contrato_id: int, justificativa: str, excluido_por: str | None) -> int:
+    """
+    Soft delete. Também registra no status_log (para_status = EXCLUIDO), para
+    o feed de mudanças (services/eventos.py) enxergar a saída da etapa.
+    Contrato já excluído não é excluído de novo (retorna 0).
+    """
+    ts = agora_iso()
+    conn = conectar()
+    iniciar_escrita(conn, "status_log")
+    try:
+        cur = conn.cursor()
+        cur.execute(
+            """
+            UPDATE contratos
+            SET excluido_em = ?, excluido_por = ?, excluido_justificativa = ?, atualizado_em = ?
+            WHERE id = ? AND (excluido_em IS NULL OR excluido_em = '')
+            RETURNING status
+            """,
+            (ts, excluido_por, justificativa, ts, contrato_id),
+        )
+        row = cur.fetchone()
+        if row:
+            cur.execute(
+                """
+                INSERT INTO status_log (contrato_id, de_status, para_status, alterado_em, alterado_por)
+                VALUES (?, ?, ?, ?, ?)
+                """,
+                (contrato_id, row[0], EXCLUIDO, ts, excluido_por),
+            )
+        conn.commit()
+        conn.close()
+        return 1 if row else 0
+    except Exception:
+        conn.rollback()
+        conn.close()
+        raise
 
 def obter_status_logs(contrato_id: int):
     conn = conectar()
@@ -305,3 +880,660 @@ def listar_finalizados():
     rows = cur.fetchall()
     conn.close()
     return rows
+
+def listar_mais_antigos_por_etapa(etapas, k: int):
+    """
+    Top-K contratos há mais tempo na etapa atual, para cada etapa
+    (1 consulta; cada parte usa o índice (status, etapa_entrada_em); empate
+    no instante, ex. movidos em lote, sai por id).
+    Retorna (status, id, numero, fornecedor_razao, tipo_modelo, etapa_entrada_em).
+    """
+    etapas = list(etapas)
+    if not etapas:
+        return []
+    parte = """
+        SELECT * FROM (
+            SELECT status, id, numero, fornecedor_razao, COALESCE(tipo_modelo,''), etapa_entrada_em
+            FROM contratos
+            WHERE status = ?
+              AND etapa_entrada_em IS NOT NULL
+              AND (excluido_em IS NULL OR excluido_em = '')
+            ORDER BY etapa_entrada_em ASC, id ASC
+            LIMIT ?
+        ) AS etapa
+    """
+    sql = " UNION ALL ".join([parte] * len(etapas))
+    params = []
+    for e in etapas:
+        params.extend([e, k])
+
+    conn = conectar()
+    cur = conn.cursor()
+    cur.execute(sql, params)
+    rows = cur.fetchall()
+    conn.close()
+    return rows
+
+def geracao_dados():
+    """
+    "Versão" barata dos dados (3 buscas em índice): muda a cada mudança de
+    status, criação, exclusão ou lote arquivado. Usada como chave de cache.
+    """
+    conn = conectar()
+    cur = conn.cursor()
+    cur.execute(
+        """
+        SELECT (SELECT MAX(id) FROM status_log),
+               (SELECT MAX(atualizado_em) FROM contratos),
+               (SELECT valor FROM geracao WHERE chave = 'arquivamento')
+        """
+    )
+    row = cur.fetchone()
+    conn.close()
+    return row
+
+
+# -----------------------------
+# Modelos (registro versionado)
+# -----------------------------
+_AMOSTRAS_RENDER_MAX = 20000
+
+def contar_modelos() -> int:
+    conn = conectar()
+    cur = conn.cursor()
+    cur.execute("SELECT COUNT(*) FROM modelos")
+    n = cur.fetchone()[0]
+    conn.close()
+    return int(n)
+
+def inserir_versao_modelo(nome: str, hash_modelo: str, conteudo: bytes, manifesto: str | None, criado_por: str | None):
+    """
+    Nova versão do modelo `nome` (vira a ativa). Se o mesmo conteúdo já é uma
+    versão desse modelo, ela é reativada em vez de duplicada.
+    Retorna (versao, criada: bool).
+    """
+    conn = conectar()
+    iniciar_escrita(conn, f"modelo:{nome}")
+    try:
+        cur = conn.cursor()
+        cur.execute("SELECT versao FROM modelos WHERE nome = ? AND hash = ? ORDER BY versao DESC LIMIT 1", (nome, hash_modelo))
+        existente = cur.fetchone()
+
+        cur.execute("UPDATE modelos SET ativo = 0 WHERE nome = ? AND ativo = 1", (nome,))
+        if existente:
+            cur.execute("UPDATE modelos SET ativo = 1 WHERE nome = ? AND versao = ?", (nome, existente[0]))
+            conn.commit()
+            conn.close()
+            return int(existente[0]), False
+
+        cur.execute(
+            """
+            INSERT INTO modelos (nome, versao, hash, conteudo, manifesto, ativo, criado_em, criado_por)
+            VALUES (?, (SELECT COALESCE(MAX(versao), 0) + 1 FROM modelos WHERE nome = ?), ?, ?, ?, 1, ?, ?)
+            RETURNING versao
+            """,
+            (nome, nome, hash_modelo, conteudo, manifesto, agora_iso(), criado_por),
+        )
+        versao = int(cur.fetchone()[0])
+        conn.commit()
+        conn.close()
+        return versao, True
+    except Exception:
+        conn.rollback()
+        conn.close()
+        raise
+
+def ativar_versao_modelo(nome: str, versao: int) -> int:
+    conn = conectar()
+    iniciar_escrita(conn, f"modelo:{nome}")
+    try:
+        cur = conn.cursor()
+        cur.execute("SELECT 1 FROM modelos WHERE nome = ? AND versao = ?", (nome, versao))
+        if not cur.fetchone():
+            conn.rollback()
+            conn.close()
+            return 0
+        cur.execute("UPDATE modelos SET ativo = 0 WHERE nome = ? AND ativo = 1", (nome,))
+        cur.execute("UPDATE modelos SET ativo = 1 WHERE nome = ? AND versao = ?", (nome, versao))
+        conn.commit()
+        conn.close()
+        return 1
+    except Exception:
+        conn.rollback()
+        conn.close()
+        raise
+
+def listar_modelos_ativos():
+    """
+    (nome, versao, hash) da versão ativa de cada modelo, na ordem de cadastro.
+    """
+    conn = conectar()
+    cur = conn.cursor()
+    cur.execute(
+        """
+        SELECT m.nome, m.versao, m.hash
+        FROM modelos m
+        WHERE m.ativo = 1
+        ORDER BY (SELECT MIN(p.id) FROM modelos p WHERE p.nome = m.nome)
+        """
+    )
+    rows = cur.fetchall()
+    conn.close()
+    return rows
+
+def buscar_modelo_ativo(nome: str):
+    """
+    (versao, hash) da versão ativa ou None.
+    """
+    conn = conectar()
+    cur = conn.cursor()
+    cur.execute("SELECT versao, hash FROM modelos WHERE nome = ? AND ativo = 1", (nome,))
+    row = cur.fetchone()
+    conn.close()
+    return row
+
+def buscar_modelo_por_hash(hash_modelo: str):
+    """
+    (nome, versao, conteudo, manifesto_json|None) ou None.
+    """
+    conn = conectar()
+    cur = conn.cursor()
+    cur.execute(
+        "SELECT nome, versao, conteudo, manifesto FROM modelos WHERE hash = ? ORDER BY id DESC LIMIT 1",
+        (hash_modelo,),
+    )
+    row = cur.fetchone()
+    conn.close()
+    return row
+
+def salvar_manifesto_modelo(hash_modelo: str, manifesto: str):
+    conn = conectar()
+    cur = conn.cursor()
+    cur.execute("UPDATE modelos SET manifesto = ? WHERE hash = ? AND manifesto IS NULL", (manifesto, hash_modelo))
+    conn.commit()
+    conn.close()
+
+def listar_versoes_modelo(nome: str):
+    """
+    (versao, hash, ativo, criado_em, criado_por, renders, render_ms_total, manifesto), mais nova primeiro.
+    """
+    conn = conectar()
+    cur = conn.cursor()
+    cur.execute(
+        """
+        SELECT versao, hash, ativo, COALESCE(criado_em,''), COALESCE(criado_por,''),
+               renders, render_ms_total, manifesto
+        FROM modelos
+        WHERE nome = ?
+        ORDER BY versao DESC
+        """,
+        (nome,),
+    )
+    rows = cur.fetchall()
+    conn.close()
+    return rows
+
+def registrar_render_modelo(hash_modelo: str, ms: float, nome: str | None = None):
+    """
+    Soma o render no contador da versão e guarda a amostra (para p95).
+    `nome` desempata quando o mesmo conteúdo está cadastrado em mais de um modelo.
+    """
+    conn = conectar()
+    cur = conn.cursor()
+    cur.execute(
+        """
+        UPDATE modelos SET renders = renders + 1, render_ms_total = render_ms_total + ?
+        WHERE id = (
+            SELECT id FROM modelos WHERE hash = ?
+            ORDER BY (nome = ?) DESC, ativo DESC, id DESC
+            LIMIT 1
+        )
+        """,
+        (ms, hash_modelo, nome),
+    )
+    cur.execute(
+        "INSERT INTO modelo_render (modelo_hash, ms, em) VALUES (?, ?, ?) RETURNING id",
+        (hash_modelo, ms, agora_iso()),
+    )
+    amostra_id = int(cur.fetchone()[0])
+    # mantém só as amostras mais recentes (os contadores acima continuam exatos)
+    if amostra_id % 1000 == 0:
+        cur.execute("DELETE FROM modelo_render WHERE id <= ?", (amostra_id - _AMOSTRAS_RENDER_MAX,))
+    conn.commit()
+    conn.close()
+
+def amostras_render_modelo(hash_modelo: str, limite: int = 1000) -> list:
+    conn = conectar()
+    cur = conn.cursor()
+    cur.execute(
+        "SELECT ms FROM modelo_render WHERE modelo_hash = ? ORDER BY id DESC LIMIT ?",
+        (hash_modelo, limite),
+    )
+    rows = [r[0] for r in cur.fetchall()]
+    conn.close()
+    return rows
+
+
+# -----------------------------
+# Reconciliação de arquivos (contratos/ x banco)
+# -----------------------------
+def ler_estado_reconciliacao(chave: str) -> str | None:
+    conn = conectar()
+    cur = conn.cursor()
+    cur.execute("SELECT valor FROM reconciliacao_estado WHERE chave = ?", (chave,))
+    row = cur.fetchone()
+    conn.close()
+    return row[0] if row else None
+
+def gravar_estado_reconciliacao(chave: str, valor: str | None):
+    conn = conectar()
+    cur = conn.cursor()
+    if valor is None:
+        cur.execute("DELETE FROM reconciliacao_estado WHERE chave = ?", (chave,))
+    else:
+        cur.execute(
+            """
+            INSERT INTO reconciliacao_estado (chave, valor) VALUES (?, ?)
+            ON CONFLICT (chave) DO UPDATE SET valor = excluded.valor
+            """,
+            (chave, valor),
+        )
+    conn.commit()
+    conn.close()
+
+def contratos_por_arquivo(caminhos) -> dict:
+    """
+    caminho -> [(id, arquivo_hash, excluido, tem_dados_render), ...] dos contratos
+    que apontam para cada caminho (caminhos sem contrato ficam de fora).
+    """
+    caminhos = list(caminhos)
+    resultado = {}
+    conn = conectar()
+    cur = conn.cursor()
+    for i in range(0, len(caminhos), _LOTE_SQL):
+        lote = caminhos[i:i + _LOTE_SQL]
+        cur.execute(
+            f"""
+            SELECT arquivo, id, arquivo_hash,
+                   COALESCE(excluido_em,'') != '',
+                   COALESCE(modelo_hash,'') != '' AND COALESCE(substituicoes,'') != ''
+            FROM contratos
+            WHERE arquivo IN ({",".join("?" * len(lote))})
+            ORDER BY id
+            """,
+            lote,
+        )
+        for arquivo, cid, hash_arquivo, excluido, renderizavel in cur.fetchall():
+            resultado.setdefault(arquivo, []).append((cid, hash_arquivo, bool(excluido), bool(renderizavel)))
+    conn.close()
+    return resultado
+
+def listar_contratos_alterados(depois_de: tuple, limite: int):
+    """
+    Contratos com arquivo alterados depois de (atualizado_em, id), em ordem.
+    Retorna (id, arquivo, arquivo_situacao, excluido, atualizado_em).
+    """
+    ts, ultimo_id = depois_de
+    conn = conectar()
+    cur = conn.cursor()
+    cur.execute(
+        """
+        SELECT id, arquivo, COALESCE(arquivo_situacao,''), COALESCE(excluido_em,'') != '', COALESCE(atualizado_em,'')
+        FROM contratos
+        WHERE COALESCE(arquivo,'') != ''
+          AND (COALESCE(atualizado_em,'') > ? OR (COALESCE(atualizado_em,'') = ? AND id > ?))
+        ORDER BY COALESCE(atualizado_em,''), id
+        LIMIT ?
+        """,
+        (ts, ts, ultimo_id, limite),
+    )
+    rows = cur.fetchall()
+    conn.close()
+    return rows
+
+def listar_contratos_com_arquivo(depois_de_id: int, limite: int):
+    """
+    Mesmo formato de listar_contratos_alterados, em ordem de id (ronda completa).
+    """
+    conn = conectar()
+    cur = conn.cursor()
+    cur.execute(
+        """
+        SELECT id, arquivo, COALESCE(arquivo_situacao,''), COALESCE(excluido_em,'') != '', COALESCE(atualizado_em,'')
+        FROM contratos
+        WHERE id > ? AND COALESCE(arquivo,'') != ''
+        ORDER BY id
+        LIMIT ?
+        """,
+        (depois_de_id, limite),
+    )
+    rows = cur.fetchall()
+    conn.close()
+    return rows
+
+def marcar_arquivos_contratos(marcacoes):
+    """
+    marcacoes: [(contrato_id, situacao|None, arquivo_hash|None, desvincular: bool)].
+    desvincular zera `arquivo` (o download passa a renderizar do banco).
+    Não mexe em atualizado_em (senão o próprio reconciliador veria a mudança).
+    """
+    conn = conectar()
+    cur = conn.cursor()
+    cur.executemany(
+        """
+        UPDATE contratos
+        SET arquivo_situacao = ?,
+            arquivo_hash = COALESCE(?, arquivo_hash),
+            arquivo = CASE WHEN ? = 1 THEN NULL ELSE arquivo END
+        WHERE id = ?
+        """,
+        [(situacao, hash_arquivo, int(desvincular), cid) for cid, situacao, hash_arquivo, desvincular in marcacoes],
+    )
+    conn.commit()
+    conn.close()
+
+def contar_arquivos_sinalizados() -> dict:
+    conn = conectar()
+    cur = conn.cursor()
+    cur.execute(
+        """
+        SELECT arquivo_situacao, COUNT(*)
+        FROM contratos
+        WHERE COALESCE(arquivo_situacao,'') != '' AND (excluido_em IS NULL OR excluido_em = '')
+        GROUP BY arquivo_situacao
+        """
+    )
+    rows = cur.fetchall()
+    conn.close()
+    return dict(rows)
+
+
+# -----------------------------
+# Feed de mudanças (status_log.id é a sequência)
+# -----------------------------
+def listar_eventos_desde(seq: int, limite: int):
+    """
+    Logs com id > seq, em ordem, com o mínimo do contrato para avisos.
+    Retorna (seq, contrato_id, de_status, para_status, alterado_em, alterado_por,
+    numero, fornecedor_razao, tipo_modelo, excluido_em).
+    """
+    conn = conectar()
+    cur = conn.cursor()
+    cur.execute(
+        """
+        SELECT l.id, l.contrato_id, l.de_status, l.para_status, l.alterado_em, l.alterado_por,
+               c.numero, c.fornecedor_razao, COALESCE(c.tipo_modelo,''), COALESCE(c.excluido_em,'')
+        FROM status_log l
+        LEFT JOIN contratos c ON c.id = l.contrato_id
+        WHERE l.id > ?
+        ORDER BY l.id
+        LIMIT ?
+        """,
+        (seq, limite),
+    )
+    rows = cur.fetchall()
+    conn.close()
+    return rows
+
+def ultimo_evento_seq() -> int:
+    conn = conectar()
+    cur = conn.cursor()
+    cur.execute("SELECT COALESCE(MAX(id), 0) FROM status_log")
+    seq = int(cur.fetchone()[0])
+    conn.close()
+    return seq
+
+def contar_por_status_com_seq():
+    """
+    (contar_por_status(), seq) lidos na mesma consulta (mesmo snapshot):
+    aplicar os eventos > seq sobre a contagem não conta nada duas vezes.
+    """
+    conn = conectar()
+    cur = conn.cursor()
+    cur.execute(
+        """
+        SELECT NULL, (SELECT COALESCE(MAX(id), 0) FROM status_log)
+        UNION ALL
+        SELECT status, COUNT(*)
+        FROM contratos
+        WHERE (excluido_em IS NULL OR excluido_em = '')
+        GROUP BY status
+        """
+    )
+    rows = cur.fetchall()
+    conn.close()
+    seq = next(int(q) for s, q in rows if s is None)
+    return {s: int(q) for s, q in rows if s is not None}, seq
+
+def buscar_contratos_da_etapa(ids, status: str):
+    """
+    Mesmas colunas de listar_contratos_por_status, só dos `ids` que estão na etapa.
+    """
+    ids = list(ids)
+    rows = []
+    conn = conectar()
+    cur = conn.cursor()
+    for i in range(0, len(ids), _LOTE_SQL):
+        parte = ids[i:i + _LOTE_SQL]
+        cur.execute(
+            f"""
+            SELECT
+                id, numero, razao_social, status, arquivo,
+                fornecedor_cnpj, fornecedor_razao, COALESCE(versao,0),
+                COALESCE(tipo_modelo,''), COALESCE(criado_em,'')
+            FROM contratos
+            WHERE id IN ({",".join("?" * len(parte))})
+              AND status = ?
+              AND (excluido_em IS NULL OR excluido_em = '')
+            """,
+            (*parte, status),
+        )
+        rows.extend(cur.fetchall())
+    conn.close()
+    return rows
+
+
+# -----------------------------
+# Índice em memória (services/indice.py)
+# -----------------------------
+_COLUNAS_INDICE = """
+    id, status, COALESCE(fornecedor_cnpj,''), fornecedor_razao,
+    COALESCE(versao,0), COALESCE(tipo_modelo,''), COALESCE(criado_em,''), etapa_entrada_em
+"""
+
+def blocos_contratos_indice(tamanho: int):
+    """
+    Gera blocos (listas de linhas) com as colunas do índice de todos os
+    contratos não excluídos, em ordem de id. Cada bloco é uma consulta curta
+    por id (id > último, LIMIT tamanho) com a conexão devolvida antes do
+    yield: a carga inteira leva segundos e, no SQLite sem WAL, uma leitura
+    aberta esse tempo todo travaria as escritas.
+    Linha: (id, status, fornecedor_cnpj, fornecedor_razao, versao, tipo_modelo,
+    criado_em, etapa_entrada_em).
+    """
+    ultimo_id = 0
+    while True:
+        conn = conectar()
+        cur = conn.cursor()
+        cur.execute(
+            f"""
+            SELECT {_COLUNAS_INDICE}
+            FROM contratos
+            WHERE (excluido_em IS NULL OR excluido_em = '')
+              AND id > ?
+            ORDER BY id
+            LIMIT ?
+            """,
+            (ultimo_id, tamanho),
+        )
+        bloco = cur.fetchall()
+        conn.close()
+        if not bloco:
+            return
+        yield bloco
+        ultimo_id = bloco[-1][0]
+
+def buscar_contratos_indice(ids):
+    """
+    Colunas do índice dos `ids` que ainda não foram excluídos (os que
+    faltarem no retorno saíram: exclusão ou arquivamento).
+    """
+    ids = list(ids)
+    rows = []
+    conn = conectar()
+    cur = conn.cursor()
+    for i in range(0, len(ids), _LOTE_SQL):
+        parte = ids[i:i + _LOTE_SQL]
+        cur.execute(
+            f"""
+            SELECT {_COLUNAS_INDICE}
+            FROM contratos
+            WHERE id IN ({",".join("?" * len(parte))})
+              AND (excluido_em IS NULL OR excluido_em = '')
+            """,
+            parte,
+        )
+        rows.extend(cur.fetchall())
+    conn.close()
+    return rows
+
+def numeros_contratos(ids) -> dict:
+    """
+    {id: numero} dos `ids` (detalhe para listas montadas a partir do índice).
+    """
+    ids = list(ids)
+    numeros = {}
+    conn = conectar()
+    cur = conn.cursor()
+    for i in range(0, len(ids), _LOTE_SQL):
+        parte = ids[i:i + _LOTE_SQL]
+        cur.execute(f"SELECT id, numero FROM contratos WHERE id IN ({','.join('?' * len(parte))})", parte)
+        numeros.update(cur.fetchall())
+    conn.close()
+    return numeros
+
+
+# -----------------------------
+# Re-render em massa (services/rerender.py)
+# -----------------------------
+_FILTRO_RERENDER = """
+    WHERE c.tipo_modelo = ?
+      AND c.status != ?
+      AND (c.excluido_em IS NULL OR c.excluido_em = '')
+      AND COALESCE(c.modelo_hash,'') != ?
+"""
+
+def contar_contratos_para_rerender(tipo_modelo: str, modelo_hash: str, exceto_status: str) -> int:
+    conn = conectar()
+    cur = conn.cursor()
+    cur.execute(f"SELECT COUNT(*) FROM contratos c {_FILTRO_RERENDER}", (tipo_modelo, exceto_status, modelo_hash))
+    total = int(cur.fetchone()[0])
+    conn.close()
+    return total
+
+def listar_contratos_para_rerender(tipo_modelo: str, modelo_hash: str, exceto_status: str, depois_de_id: int, limite: int):
+    """
+    Contratos do modelo que ainda não estão na versão `modelo_hash`, em ordem de id.
+    Retorna (id, numero, arquivo, substituicoes: json, cadastro do fornecedor: json).
+    """
+    conn = conectar()
+    cur = conn.cursor()
+    cur.execute(
+        f"""
+        SELECT c.id, COALESCE(c.numero,''), c.arquivo, c.substituicoes, f.dados
+        FROM contratos c
+        LEFT JOIN fornecedores f ON f.cnpj = c.fornecedor_cnpj
+        {_FILTRO_RERENDER}
+          AND c.id > ?
+        ORDER BY c.id
+        LIMIT ?
+        """,
+        (tipo_modelo, exceto_status, modelo_hash, depois_de_id, limite),
+    )
+    rows = cur.fetchall()
+    conn.close()
+    return rows
+
+def filtrar_contratos_para_rerender(ids, tipo_modelo: str, modelo_hash: str, exceto_status: str) -> set:
+    """
+    Quais destes ids ainda precisam do re-render (mesmo filtro da listagem):
+    conferido de novo logo antes de renderizar.
+    """
+    ids = list(ids)
+    pendentes = set()
+    conn = conectar()
+    cur = conn.cursor()
+    for i in range(0, len(ids), _LOTE_SQL):
+        lote = ids[i:i + _LOTE_SQL]
+        cur.execute(
+            f"SELECT c.id FROM contratos c {_FILTRO_RERENDER} AND c.id IN ({','.join('?' * len(lote))})",
+            (tipo_modelo, exceto_status, modelo_hash, *lote),
+        )
+        pendentes.update(r[0] for r in cur.fetchall())
+    conn.close()
+    return pendentes
+
+def registrar_rerender_lote(
+    modelo_id: str, modelo_hash: str, modelo_versao: int, linhas, exceto_status: str, colocar_arquivos=None
+) -> set:
+    """
+    Grava o resultado de um lote [(contrato_id, substituicoes: dict, arquivo_hash|None), ...]
+    numa transação: versão do modelo, valores usados e sha256 do arquivo regravado.
+    Só entram os contratos que, já dentro da transação, continuam fora de
+    `exceto_status` e não excluídos; as linhas ficam travadas até o commit
+    (SQLite: BEGIN IMMEDIATE; PostgreSQL: FOR UPDATE) e colocar_arquivos(ids)
+    é chamado antes dele, para pôr no lugar só os arquivos desses ids. Quem
+    foi finalizado no meio do caminho fica com arquivo e versão intactos.
+    Retorna os ids gravados.
+    """
+    por_id = {cid: (subs, arquivo_hash) for cid, subs, arquivo_hash in linhas}
+    if not por_id:
+        return set()
+    ids = list(por_id)
+    ts = agora_iso()
+
+    conn = conectar()
+    iniciar_escrita(conn)
+    try:
+        cur = conn.cursor()
+        validos = set()
+        for i in range(0, len(ids), _LOTE_SQL):
+            lote = ids[i:i + _LOTE_SQL]
+            cur.execute(
+                f"""
+                SELECT id FROM contratos
+                WHERE id IN ({",".join("?" * len(lote))})
+                  AND status != ?
+                  AND (excluido_em IS NULL OR excluido_em = '')
+                {"FOR UPDATE" if POSTGRES else ""}
+                """,
+                (*lote, exceto_status),
+            )
+            validos.update(r[0] for r in cur.fetchall())
+
+        if colocar_arquivos is not None:
+            colocar_arquivos(validos)
+
+        if validos:
+            cur.executemany(
+                """
+                UPDATE contratos
+                SET modelo_id = ?, modelo_hash = ?, modelo_versao = ?, substituicoes = ?,
+                    arquivo_hash = ?, atualizado_em = ?
+                WHERE id = ?
+                  AND status != ?
+                  AND (excluido_em IS NULL OR excluido_em = '')
+                """,
+                [
+                    (modelo_id, modelo_hash, modelo_versao, json.dumps(por_id[cid][0], ensure_ascii=False, sort_keys=True),
+                     por_id[cid][1], ts, cid, exceto_status)
+                    for cid in sorted(validos)
+                ],
+            )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    return validos
@@ -0,0 +1,138 @@
+import hashlib
+import json
+import os
+import threading
+
+from services.banco import buscar_dados_render
+
+
+# -----------------------------
+# Config
+# -----------------------------
+# eager: grava o DOCX em /contratos na criação (comportamento antigo)
+# lazy: só grava no banco (modelo + substituições) e renderiza no primeiro download
+MODO_MATERIALIZACAO = os.getenv("CONTRATOS_MATERIALIZACAO", "eager").strip().lower()
+
+DIR_CACHE = os.getenv("CACHE_DOCX_DIR", "cache_docx")
+LIMITE_BYTES = int(float(os.getenv("CACHE_DOCX_MAX_MB", "200")) * 1024 * 1024)
+
+_lock = threading.Lock()
+
+
+def materializacao_lazy() -> bool:
+    return MODO_MATERIALIZACAO == "lazy"
+
+
+# -----------------------------
+# Cache LRU em disco (limitado por tamanho)
+# -----------------------------
+def chave_render(modelo_hash: str, subs: dict) -> str:
+    """
+    Mesmo modelo (hash) + mesmas substituições => mesma chave => mesmo arquivo.
+    """
+    base = json.dumps({"modelo": modelo_hash, "subs": subs}, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(base.encode("utf-8")).hexdigest()
+
+
+def _podar_cache(diretorio: str, extensao: str, limite: int):
+    """
+    Remove os arquivos menos usados (mtime mais antigo) até caber no limite.
+    O mtime é "tocado" a cada leitura, então funciona como LRU.
+    """
+    entradas = []
+    total = 0
+    with os.scandir(diretorio) as it:
+        for e in it:
+            if not e.is_file() or not e.name.endswith(extensao):
+                continue
+            st_ = e.stat()
+            entradas.append((st_.st_mtime, st_.st_size, e.path))
+            total += st_.st_size
+
+    if total <= limite:
+        return
+
+    entradas.sort()
+    for _mtime, tamanho, caminho in entradas:
+        try:
+            os.remove(caminho)
+        except FileNotFoundError:
+            pass
+        total -= tamanho
+        if total <= limite:
+            break
+
+
+def obter_do_cache(
+    chave: str,
+    renderizar,
+    diretorio: str = DIR_CACHE,
+    extensao: str = ".docx",
+    limite: int = LIMITE_BYTES,
+) -> bytes:
+    """
+    Devolve os bytes do cache; se não existir, chama renderizar() e grava.
+    """
+    caminho = os.path.join(diretorio, f"{chave}{extensao}")
+
+    try:
+        with open(caminho, "rb") as f:
+            blob = f.read()
+        os.utime(caminho)  # marca como usado recentemente
+        return blob
+    except FileNotFoundError:
+        pass
+
+    blob = renderizar()
+
+    with _lock:
+        os.makedirs(diretorio, exist_ok=True)
+        tmp = f"{caminho}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(blob)
+        os.replace(tmp, caminho)
+        _podar_cache(diretorio, extensao, limite)
+
+    return blob
+
+
+# -----------------------------
+# API pública
+# -----------------------------
+def renderizar_do_banco(contrato_id: int) -> bytes:
+    """
+    Reconstrói o DOCX só com o que está no banco: a versão do modelo (hash)
+    usada na criação + substituições. Falha se essa versão não existir mais.
+    """
+    # import tardio: python-docx só carrega quando há render de fato
+    from services.modelos import renderizar_modelo
+
+    dados = buscar_dados_render(contrato_id)
+    if not dados or not dados[4] or not dados[3]:
+        raise FileNotFoundError("Contrato sem dados para renderização.")
+
+    _numero, _arquivo, modelo_id, modelo_hash, subs = dados
+    # modelo_id: nome do modelo; contratos anteriores ao registro guardam ali o caminho do arquivo
+    return obter_do_cache(
+        chave_render(modelo_hash, subs),
+        lambda: renderizar_modelo(modelo_hash, subs, nome=modelo_id, caminho_legado=modelo_id),
+    )
+
+
+def ler_docx_contrato(contrato_id: int, arquivo: str | None) -> bytes:
+    """
+    Usa o arquivo gerado (se ainda existir); senão renderiza a partir do banco.
+    """
+    if arquivo and os.path.exists(arquivo):
+        with open(arquivo, "rb") as f:
+            return f.read()
+    return renderizar_do_banco(contrato_id)
+
+
+def nome_download(numero: str | None, arquivo: str | None, contrato_id: int) -> str:
+    if arquivo:
+        return os.path.basename(arquivo)
+    if numero:
+        from services.contrato import nome_arquivo_contrato
+        return nome_arquivo_contrato(numero)
+    return f"contrato_{contrato_id}.docx"
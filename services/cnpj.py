@@ -1,9 +1,159 @@
+import asyncio
+import os
+import re
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
 import requests
 
+# permite apontar para um stand-in local (testes de carga)
+BRASILAPI_URL = os.getenv("BRASILAPI_URL", "https://brasilapi.com.br").rstrip("/")
+
+# limites do cliente assíncrono (cota da BrasilAPI é por IP; ajuste via env)
+CNPJ_CONCORRENCIA = int(os.getenv("CNPJ_CONCORRENCIA", "8"))
+CNPJ_TAXA_POR_SEGUNDO = float(os.getenv("CNPJ_TAXA_POR_SEGUNDO", "3"))
+CNPJ_TIMEOUT = float(os.getenv("CNPJ_TIMEOUT", "15"))
+
 def consultar_cnpj(cnpj: str) -> dict:
     cnpj = cnpj.replace(".", "").replace("/", "").replace("-", "")
-    url = f"https://brasilapi.com.br/api/cnpj/v1/{cnpj}"
+    url = f"{BRASILAPI_URL}/api/cnpj/v1/{cnpj}"
 
     r = requests.get(url, timeout=15)
     r.raise_for_status()
     return r.json()
+
+
+# -----------------------------
+# Cliente assíncrono (lotes / jobs de atualização)
+# -----------------------------
+def _segundos_retry_after(valor: str | None) -> float | None:
+    """
+    Retry-After em segundos: "120" ou data HTTP ("Wed, 21 Oct 2015 07:28:00 GMT").
+    None se ausente ou ilegível (quem chama usa o backoff exponencial).
+    """
+    if not valor:
+        return None
+    valor = valor.strip()
+    try:
+        return max(0.0, float(valor))
+    except ValueError:
+        pass
+    try:
+        quando = parsedate_to_datetime(valor)
+    except (TypeError, ValueError):
+        return None
+    if quando.tzinfo is None:
+        quando = quando.replace(tzinfo=timezone.utc)
+    return max(0.0, (quando - datetime.now(timezone.utc)).total_seconds())
+
+class _LimiteTaxa:
+    """
+    Token bucket global: no máximo `por_segundo` requisições/s (com rajada curta).
+    """
+
+    def __init__(self, por_segundo: float, rajada: int = 1):
+        self.intervalo = 1.0 / por_segundo if por_segundo > 0 else 0.0
+        self.rajada = max(1, rajada)
+        self.fichas = float(self.rajada)
+        self.ultimo = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def aguardar(self):
+        if not self.intervalo:
+            return
+        async with self.lock:
+            while True:
+                agora = time.monotonic()
+                self.fichas = min(self.rajada, self.fichas + (agora - self.ultimo) / self.intervalo)
+                self.ultimo = agora
+                if self.fichas >= 1:
+                    self.fichas -= 1
+                    return
+                await asyncio.sleep((1 - self.fichas) * self.intervalo)
+
+    def pausar(self, segundos: float):
+        # resposta 429: ninguém sai antes do Retry-After
+        self.fichas = min(self.fichas, 0.0) - segundos / self.intervalo if self.intervalo else 0.0
+
+
+class ClienteCNPJAsync:
+    """
+    Consulta CNPJs em paralelo respeitando:
+      - limite de concorrência (requisições simultâneas)
+      - limite global de taxa (req/s)
+      - coalescência: o mesmo CNPJ pedido várias vezes ao mesmo tempo vira 1 requisição
+
+        async with ClienteCNPJAsync() as cli:
+            dados = await cli.consultar("00.000.000/0001-91")
+    """
+
+    def __init__(
+        self,
+        concorrencia: int = CNPJ_CONCORRENCIA,
+        por_segundo: float = CNPJ_TAXA_POR_SEGUNDO,
+        timeout: float = CNPJ_TIMEOUT,
+        tentativas: int = 3,
+    ):
+        if tentativas < 1:
+            raise ValueError("tentativas deve ser >= 1.")
+        self.concorrencia = concorrencia
+        self.por_segundo = por_segundo
+        self.timeout = timeout
+        self.tentativas = tentativas
+        self._http = None
+        self._sem = None
+        self._taxa = None
+        self._em_voo = {}
+
+    async def __aenter__(self):
+        import httpx
+
+        self._http = httpx.AsyncClient(
+            base_url=BRASILAPI_URL,
+            timeout=self.timeout,
+            limits=httpx.Limits(max_connections=self.concorrencia),
+        )
+        self._sem = asyncio.Semaphore(self.concorrencia)
+        self._taxa = _LimiteTaxa(self.por_segundo, rajada=self.concorrencia)
+        return self
+
+    async def __aexit__(self, *exc):
+        await self._http.aclose()
+
+    async def _buscar(self, cnpj: str) -> dict:
+        async with self._sem:
+            for tentativa in range(self.tentativas):
+                await self._taxa.aguardar()
+                r = await self._http.get(f"/api/cnpj/v1/{cnpj}")
+                if r.status_code == 429 and tentativa + 1 < self.tentativas:
+                    espera = _segundos_retry_after(r.headers.get("retry-after"))
+                    if espera is None:
+                        espera = 2 ** tentativa
+                    self._taxa.pausar(espera)
+                    await asyncio.sleep(espera)
+                    continue
+                r.raise_for_status()
+                return r.json()
+
+    async def consultar(self, cnpj: str) -> dict:
+        cnpj = re.sub(r"\D", "", cnpj or "")
+        tarefa = self._em_voo.get(cnpj)
+        if tarefa is None:
+            tarefa = asyncio.ensure_future(self._buscar(cnpj))
+            self._em_voo[cnpj] = tarefa
+            tarefa.add_done_callback(lambda _t, c=cnpj: self._em_voo.pop(c, None))
+        return await asyncio.shield(tarefa)
+
+    async def consultar_varios(self, cnpjs):
+        """
+        Gera (cnpj, dados, erro) conforme as respostas chegam (ordem de conclusão).
+        """
+        async def _um(c):
+            try:
+                return c, await self.consultar(c), None
+            except Exception as e:
+                return c, None, e
+
+        for fut in asyncio.as_completed([_um(c) for c in cnpjs]):
+            yield await fut
@@ -1,5 +1,8 @@
+import hashlib
+import io
 import os
 import re
+import zipfile
 from docx import Document
 
 
@@ -97,6 +100,7 @@ def _replace_in_paragraph(paragraph, subs: dict):
     """
     Substitui placeholders em um parágrafo.
     Funciona melhor quando o placeholder NÃO está quebrado em múltiplos runs.
+    (O render usa o manifesto de services/modelos.py, que aponta esses casos.)
     """
     if not paragraph.runs:
         return
@@ -164,31 +168,27 @@ def gerar_numero_contrato(numero_manual: str) -> str:
     return n
 
 
-def gerar_contrato(dados_fornecedor: dict, numero_contrato: str, template_path: str) -> str:
+def hash_arquivo(caminho: str) -> str:
     """
-    Gera contrato a partir de um modelo (docx) e salva em /contratos.
+    sha256 do conteúdo do arquivo (usado para identificar a versão exata do modelo).
+    """
+    h = hashlib.sha256()
+    with open(caminho, "rb") as f:
+        for bloco in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(bloco)
+    return h.hexdigest()
 
-    Placeholders esperados no Word:
-      <<NUMERO_CONTRATO>>
-      <<RAZAO_SOCIAL>>
-      <<NOME_FANTASIA>>
-      <<NATUREZA_JURIDICA>>
-      <<CNPJ_FORMATADO>>
-      <<LOGRADOURO>>
-      <<NUMERO>>
-      <<COMPLEMENTO>>
-      <<CEP>>
-      <<CIDADE>>
-      <<UF>>
-      <<FORMA_REPRESENTACAO>>
 
-    (Opcional) <<ENDERECO_COMPLETO>>
-    """
-    if not os.path.exists(template_path):
-        raise FileNotFoundError(f"Modelo não encontrado: {template_path}")
+def nome_arquivo_contrato(numero_contrato: str) -> str:
+    safe_num = re.sub(r"[^A-Za-z0-9._-]+", "_", (numero_contrato or "").strip())
+    return f"{safe_num}.docx"
 
-    doc = Document(template_path)
 
+def montar_substituicoes(dados_fornecedor: dict, numero_contrato: str) -> dict:
+    """
+    Monta o dicionário placeholder -> valor a partir dos dados da BrasilAPI.
+    É o que fica gravado no banco para renderizar o contrato sob demanda.
+    """
     # Campos principais (BrasilAPI)
     razao_social = limpar_none(dados_fornecedor.get("razao_social"))
     nome_fantasia = limpar_none(dados_fornecedor.get("nome_fantasia"))
@@ -199,7 +199,7 @@ def gerar_contrato(dados_fornecedor: dict, numero_contrato: str, template_path:
     forma_rep = forma_representacao_por_natureza(natureza)
     end = montar_endereco(dados_fornecedor)
 
-    subs = {
+    return {
         "<<NUMERO_CONTRATO>>": limpar_none(numero_contrato),
         "<<RAZAO_SOCIAL>>": razao_social,
         "<<NOME_FANTASIA>>": nome_fantasia,
@@ -217,10 +217,82 @@ def gerar_contrato(dados_fornecedor: dict, numero_contrato: str, template_path:
         "<<FORMA_REPRESENTACAO>>": forma_rep,
     }
 
-    _replace_everywhere(doc, subs)
 
+def _zip_deterministico(blob: bytes) -> bytes:
+    """
+    Regrava o .docx (zip) com datas fixas, para que o mesmo modelo + mesmos
+    valores gerem sempre os mesmos bytes.
+    """
+    origem = zipfile.ZipFile(io.BytesIO(blob))
+    saida = io.BytesIO()
+    with zipfile.ZipFile(saida, "w", zipfile.ZIP_DEFLATED) as destino:
+        for info in origem.infolist():
+            novo = zipfile.ZipInfo(info.filename, date_time=(1980, 1, 1, 0, 0, 0))
+            novo.compress_type = zipfile.ZIP_DEFLATED
+            novo.external_attr = info.external_attr
+            destino.writestr(novo, origem.read(info.filename))
+    return saida.getvalue()
+
+
+def renderizar_docx(modelo: bytes, manifesto: dict, subs: dict) -> bytes:
+    """
+    Renderiza o DOCX (bytes do modelo + manifesto de services/modelos.py):
+    substitui só nos runs já mapeados e devolve os bytes, sem gravar em disco.
+    """
+    from services.modelos import aplicar_substituicoes
+
+    doc = Document(io.BytesIO(modelo))
+    aplicar_substituicoes(doc, manifesto, subs)
+
+    buf = io.BytesIO()
+    doc.save(buf)
+    return _zip_deterministico(buf.getvalue())
+
+
+def renderizar_contrato(template_path: str, subs: dict) -> bytes:
+    """
+    Renderiza um modelo a partir de um arquivo (o fluxo normal usa o registro:
+    services.modelos.renderizar_modelo).
+    """
+    from services.modelos import ler_modelo, manifesto_por_blob
+
+    if not os.path.exists(template_path):
+        raise FileNotFoundError(f"Modelo não encontrado: {template_path}")
+
+    blob, hash_modelo = ler_modelo(template_path)
+    return renderizar_docx(blob, manifesto_por_blob(blob, hash_modelo), subs)
+
+
+def gravar_contrato(numero_contrato: str, blob: bytes) -> str:
+    """
+    Grava o DOCX renderizado em /contratos e devolve o caminho.
+    """
     os.makedirs("contratos", exist_ok=True)
-    safe_num = re.sub(r"[^A-Za-z0-9._-]+", "_", numero_contrato.strip())
-    output_path = os.path.join("contratos", f"{safe_num}.docx")
-    doc.save(output_path)
+    output_path = os.path.join("contratos", nome_arquivo_contrato(numero_contrato))
+    with open(output_path, "wb") as f:
+        f.write(blob)
     return output_path
+
+
+def gerar_contrato(dados_fornecedor: dict, numero_contrato: str, template_path: str) -> str:
+    """
+    Gera contrato a partir de um modelo (docx) e salva em /contratos.
+
+    Placeholders esperados no Word:
+      <<NUMERO_CONTRATO>>
+      <<RAZAO_SOCIAL>>
+      <<NOME_FANTASIA>>
+      <<NATUREZA_JURIDICA>>
+      <<CNPJ_FORMATADO>>
+      <<LOGRADOURO>>
+      <<NUMERO>>
+      <<COMPLEMENTO>>
+      <<CEP>>
+      <<CIDADE>>
+      <<UF>>
+      <<FORMA_REPRESENTACAO>>
+
+    (Opcional) <<ENDERECO_COMPLETO>>
+    """
+    subs = montar_substituicoes(dados_fornecedor, numero_contrato)
+    return gravar_contrato(numero_contrato, renderizar_contrato(template_path, subs))
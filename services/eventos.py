@@ -0,0 +1,155 @@
+"""
+Feed de mudanças sobre o status_log: o id do log é a sequência (monotônica,
+nunca reaproveitada) e cada linha é um evento — criação (de_status vazio),
+mudança de etapa ou exclusão (para_status = EXCLUIDO).
+
+    eventos, proximo = desde(seq)      # consulta direta (API, integrações)
+
+Dentro do app, uma thread por processo consulta o feed a cada INTERVALO_S
+e publica num barramento em memória; as sessões leem dele com ler(seq),
+sem SQL. Quem ficou para trás do buffer recebe None e recarrega do banco.
+"""
+import os
+import threading
+import time
+from collections import deque
+
+from services.banco import listar_eventos_desde, ultimo_evento_seq
+from services.status import EXCLUIDO
+
+INTERVALO_S = float(os.getenv("EVENTOS_INTERVALO_S", "2"))
+TAMANHO_BUFFER = 5000
+LIMITE_CONSULTA = 500
+
+
+def _evento(row) -> dict:
+    seq, contrato_id, de, para, em, por, numero, razao, tipo_modelo, excluido_em = row
+    return {
+        "seq": int(seq),
+        "contrato_id": int(contrato_id),
+        "de": de,
+        "para": para,
+        "em": em,
+        "por": por,
+        "numero": numero,
+        "fornecedor_razao": razao,
+        "tipo_modelo": tipo_modelo,
+        "excluido_em": excluido_em,
+    }
+
+def desde(seq: int, limite: int = LIMITE_CONSULTA) -> tuple:
+    """
+    (eventos com seq > `seq`, em ordem; próximo seq a pedir).
+    """
+    eventos = [_evento(r) for r in listar_eventos_desde(seq, limite)]
+    return eventos, (eventos[-1]["seq"] if eventos else seq)
+
+def seq_atual() -> int:
+    return ultimo_evento_seq()
+
+
+# -----------------------------
+# Aplicação incremental
+# -----------------------------
+def _visivel(ev: dict) -> bool:
+    # mudança gravada depois da exclusão (a API recusa excluídos, mas a exclusão pode
+    # chegar entre a conferência e o UPDATE): o contrato já saiu das contagens
+    return ev["para"] == EXCLUIDO or not ev["excluido_em"] or ev["em"] < ev["excluido_em"]
+
+def aplicar_em_contagem(contagem: dict, eventos) -> dict:
+    """
+    Atualiza {status: quantidade} (contar_por_status) com os eventos.
+    """
+    for ev in eventos:
+        if not _visivel(ev):
+            continue
+        if ev["de"]:
+            contagem[ev["de"]] = contagem.get(ev["de"], 0) - 1
+        if ev["para"] != EXCLUIDO:
+            contagem[ev["para"]] = contagem.get(ev["para"], 0) + 1
+    return contagem
+
+def entraram_nas_etapas(eventos, etapas, exceto_por: str | None = None) -> list:
+    """
+    Eventos de contratos que entraram numa das `etapas` (para avisos por perfil),
+    fora os feitos pelo próprio usuário.
+    """
+    return [
+        ev for ev in eventos
+        if ev["para"] in etapas and ev["de"] != ev["para"] and _visivel(ev)
+        and (exceto_por is None or ev["por"] != exceto_por)
+    ]
+
+def contratos_afetados(eventos, status: str) -> set:
+    """
+    Ids que entraram na etapa ou saíram dela.
+    """
+    return {ev["contrato_id"] for ev in eventos if status in (ev["de"], ev["para"])}
+
+
+# -----------------------------
+# Barramento local (1 consulta por processo, não por sessão)
+# -----------------------------
+_lock = threading.Lock()
+_buffer = deque()
+_estado = {"seq": None, "base": None}  # base: seq logo antes do 1º evento do buffer
+_thread = None
+
+
+def ativo() -> bool:
+    return _thread is not None and _thread.is_alive()
+
+def ler(depois_de: int):
+    """
+    Eventos já publicados com seq > depois_de. None se o buffer não cobre
+    mais esse ponto (a sessão deve recarregar do banco).
+    """
+    with _lock:
+        if _estado["seq"] is None or depois_de >= _estado["seq"]:
+            return []
+        if depois_de < _estado["base"]:
+            return None
+        novos = []
+        for ev in reversed(_buffer):
+            if ev["seq"] <= depois_de:
+                break
+            novos.append(ev)
+        novos.reverse()
+        return novos
+
+def _publicar(eventos, seq: int):
+    with _lock:
+        if _estado["base"] is None:
+            _estado["base"] = seq
+        _buffer.extend(eventos)
+        while len(_buffer) > TAMANHO_BUFFER:
+            _estado["base"] = _buffer.popleft()["seq"]
+        _estado["seq"] = seq
+
+def iniciar_em_segundo_plano(intervalo_s: float = INTERVALO_S):
+    """
+    Sobe (uma vez por processo) a thread que alimenta o barramento.
+    intervalo_s <= 0 desliga (as telas voltam a atualizar só no rerun).
+    """
+    global _thread
+    if intervalo_s <= 0 or ativo():
+        return
+
+    def _loop():
+        seq = None
+        while True:
+            try:
+                if seq is None:
+                    seq = seq_atual()
+                    _publicar([], seq)
+                eventos, seq = desde(seq)
+                if eventos:
+                    _publicar(eventos, seq)
+                if len(eventos) == LIMITE_CONSULTA:
+                    continue  # ainda há eventos: emenda sem esperar
+            except Exception:
+                pass  # banco indisponível: tenta de novo no próximo ciclo
+            time.sleep(intervalo_s)
+
+    _thread = threading.Thread(target=_loop, name="eventos", daemon=True)
+    _thread.start()
@@ -0,0 +1,226 @@
+"""
+Exportação (CSV/XLSX) de contratos e histórico de status em streaming:
+os contratos são lidos em páginas por id (keyset: id > último, LIMIT n),
+cada página numa consulta curta com a conexão devolvida em seguida, e cada
+linha é escrita assim que fica pronta. A memória não cresce com o tamanho
+da exportação e nenhuma leitura fica aberta enquanto o cliente baixa (no
+SQLite sem WAL, uma leitura aberta trava todas as escritas). Cada página
+reflete o banco no momento em que foi lida.
+
+    linhas = linhas_contratos(status="FINALIZADO")
+    with open("saida.csv", "w", newline="", encoding="utf-8-sig") as f:
+        escrever_csv(linhas, f, COLUNAS_CONTRATOS)
+"""
+import csv
+import os
+import tempfile
+
+from services.banco import conectar
+from services.sla import business_seconds, parse_iso
+from services.status import STATUS_ORDEM
+
+TAMANHO_BLOCO = 1000  # contratos por página (com todos os logs de cada um)
+SEG_DIA_UTIL = 9 * 3600
+ETAPAS_SLA = [s for s in STATUS_ORDEM if s != "FINALIZADO"]
+
+COLUNAS_CONTRATOS = [
+    "id", "numero", "status", "fornecedor_cnpj", "fornecedor_razao", "versao", "tipo_modelo",
+    "criado_em", "finalizado_em", "etapa_entrada_em",
+] + [f"sla_{e.lower()}_dias_uteis" for e in ETAPAS_SLA]
+
+COLUNAS_HISTORICO = [
+    "contrato_id", "numero", "fornecedor_cnpj", "fornecedor_razao", "tipo_modelo",
+    "de_status", "para_status", "alterado_em", "alterado_por", "dias_uteis_na_etapa",
+]
+
+
+# -----------------------------
+# Leitura em páginas
+# -----------------------------
+def _pagina(sql: str, params) -> list:
+    conn = conectar()
+    try:
+        cur = conn.cursor()
+        cur.execute(sql, params)
+        return cur.fetchall()
+    finally:
+        conn.close()
+
+def _contratos_com_logs(status: str | None, fornecedor_cnpj: str | None, tamanho: int = TAMANHO_BLOCO):
+    """
+    Gera (contrato, [logs]) em ordem de id. Cada página traz `tamanho`
+    contratos inteiros (com todos os logs), então nenhum contrato fica
+    dividido entre páginas.
+    """
+    filtro = "(excluido_em IS NULL OR excluido_em = '') AND id > ?"
+    params = []
+    if status:
+        filtro += " AND status = ?"
+        params.append(status)
+    if fornecedor_cnpj:
+        filtro += " AND fornecedor_cnpj = ?"
+        params.append(fornecedor_cnpj)
+    sql = f"""
+        SELECT c.id, COALESCE(c.numero,''), c.status, COALESCE(c.fornecedor_cnpj,''),
+               COALESCE(c.fornecedor_razao,''), COALESCE(c.versao,0), COALESCE(c.tipo_modelo,''),
+               COALESCE(c.criado_em,''), COALESCE(c.finalizado_em,''), COALESCE(c.etapa_entrada_em,''),
+               l.de_status, l.para_status, l.alterado_em, l.alterado_por
+        FROM contratos c
+        LEFT JOIN status_log l ON l.contrato_id = c.id
+        WHERE c.id IN (SELECT id FROM contratos WHERE {filtro} ORDER BY id LIMIT ?)
+        ORDER BY c.id, l.id
+    """
+
+    ultimo_id = 0
+    while True:
+        rows = _pagina(sql, (ultimo_id, *params, tamanho))
+        if not rows:
+            return
+        atual = None
+        logs = []
+        for row in rows:
+            contrato, log = row[:10], row[10:]
+            if atual is not None and contrato[0] != atual[0]:
+                yield atual, logs
+                logs = []
+            atual = contrato
+            if log[1] is not None:
+                logs.append(log)
+        yield atual, logs
+        ultimo_id = atual[0]
+
+def _duracoes(logs) -> list:
+    """
+    Segundos úteis em cada entrada do log (até a próxima mudança), com a
+    mesma regra de sla_por_etapa: para no FINALIZADO. None = etapa em aberto.
+    """
+    duracoes = [None] * len(logs)
+    for i in range(len(logs) - 1):
+        para, ts = logs[i][1], logs[i][2]
+        if para == "FINALIZADO":
+            break
+        prox_para, prox_ts = logs[i + 1][1], logs[i + 1][2]
+        if ts and prox_ts:
+            duracoes[i] = business_seconds(parse_iso(ts), parse_iso(prox_ts))
+        if prox_para == "FINALIZADO":
+            break
+    return duracoes
+
+def _dias(seg) -> float | str:
+    return "" if seg is None else round(seg / SEG_DIA_UTIL, 2)
+
+
+# -----------------------------
+# Linhas (geradores)
+# -----------------------------
+def linhas_contratos(status: str | None = None, fornecedor_cnpj: str | None = None):
+    """
+    1 linha por contrato + SLA (dias úteis) de cada etapa já concluída.
+    """
+    for contrato, logs in _contratos_com_logs(status, fornecedor_cnpj):
+        por_etapa = {}
+        for log, seg in zip(logs, _duracoes(logs)):
+            if seg is not None:
+                por_etapa[log[1]] = por_etapa.get(log[1], 0) + seg
+        yield list(contrato) + [_dias(por_etapa.get(e)) for e in ETAPAS_SLA]
+
+def linhas_historico(status: str | None = None, fornecedor_cnpj: str | None = None):
+    """
+    1 linha por mudança de status (status_log), com o tempo útil passado na etapa.
+    """
+    for contrato, logs in _contratos_com_logs(status, fornecedor_cnpj):
+        cid, numero, _st, forn_cnpj, forn_razao, _ver, tipo = contrato[:7]
+        for (de, para, ts, por), seg in zip(logs, _duracoes(logs)):
+            yield [cid, numero, forn_cnpj, forn_razao, tipo, de or "", para or "", ts or "", por or "", _dias(seg)]
+
+
+# -----------------------------
+# Escrita
+# -----------------------------
+def escrever_csv(linhas, destino, colunas) -> int:
+    """
+    destino: arquivo texto aberto (newline=""). Retorna quantas linhas escreveu.
+    """
+    w = csv.writer(destino, delimiter=";")
+    w.writerow(colunas)
+    n = 0
+    for linha in linhas:
+        w.writerow(linha)
+        n += 1
+    return n
+
+def escrever_xlsx(linhas, caminho: str, colunas, titulo: str = "Exportação") -> int:
+    """
+    Usa o modo write_only do openpyxl (linhas vão direto para o arquivo).
+    """
+    try:
+        from openpyxl import Workbook
+    except Exception:
+        raise RuntimeError("Exportação XLSX requer o pacote openpyxl.")
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(titulo[:31])
+    ws.append(colunas)
+    n = 0
+    for linha in linhas:
+        ws.append(linha)
+        n += 1
+    wb.save(caminho)
+    return n
+
+def exportar(tipo: str, formato: str, caminho: str, status: str | None = None, fornecedor_cnpj: str | None = None) -> int:
+    """
+    tipo: "contratos" | "historico"; formato: "csv" | "xlsx".
+    Grava em `caminho` e retorna o número de linhas.
+    """
+    if tipo == "contratos":
+        linhas, colunas = linhas_contratos(status, fornecedor_cnpj), COLUNAS_CONTRATOS
+    elif tipo == "historico":
+        linhas, colunas = linhas_historico(status, fornecedor_cnpj), COLUNAS_HISTORICO
+    else:
+        raise ValueError(f"Tipo de exportação inválido: {tipo}")
+
+    if formato == "csv":
+        with open(caminho, "w", newline="", encoding="utf-8-sig") as f:
+            return escrever_csv(linhas, f, colunas)
+    if formato == "xlsx":
+        return escrever_xlsx(linhas, caminho, colunas, titulo=tipo)
+    raise ValueError(f"Formato inválido: {formato}")
+
+def exportar_para_arquivo_temporario(tipo: str, formato: str, **filtros) -> str:
+    """
+    Exporta para um arquivo temporário e devolve o caminho (quem chama apaga).
+    """
+    fd, caminho = tempfile.mkstemp(prefix=f"export_{tipo}_", suffix=f".{formato}")
+    os.close(fd)
+    exportar(tipo, formato, caminho, **filtros)
+    return caminho
+
+
+class _LinhaCsv:
+    # "arquivo" de uma linha só, para o csv.writer devolver texto
+    def write(self, texto):
+        self.texto = texto
+
+def csv_em_pedacos(tipo: str, status: str | None = None, fornecedor_cnpj: str | None = None):
+    """
+    Gera o CSV como pedaços de bytes (para respostas HTTP em streaming).
+    """
+    if tipo == "contratos":
+        linhas, colunas = linhas_contratos(status, fornecedor_cnpj), COLUNAS_CONTRATOS
+    else:
+        linhas, colunas = linhas_historico(status, fornecedor_cnpj), COLUNAS_HISTORICO
+
+    buf = _LinhaCsv()
+    w = csv.writer(buf, delimiter=";")
+    w.writerow(colunas)
+    yield ("\ufeff" + buf.texto).encode("utf-8")
+
+    pedaco = []
+    for linha in linhas:
+        w.writerow(linha)
+        pedaco.append(buf.texto)
+        if len(pedaco) >= 500:
+            yield "".join(pedaco).encode("utf-8")
+            pedaco = []
+    if pedaco:
+        yield "".join(pedaco).encode("utf-8")
@@ -0,0 +1,86 @@
+"""
+Atualização em massa do cadastro dos fornecedores (BrasilAPI), por exemplo
+depois de mudanças de endereço:
+
+    python -m services.fornecedores --concorrencia 8 --taxa 3 --lote 50
+"""
+import argparse
+import asyncio
+import time
+
+from services.banco import listar_cnpjs_fornecedores, salvar_fornecedores_lote
+from services.cnpj import CNPJ_CONCORRENCIA, CNPJ_TAXA_POR_SEGUNDO, ClienteCNPJAsync
+
+TAMANHO_LOTE = 50
+
+
+async def refresh_fornecedores_async(
+    cnpjs=None,
+    concorrencia: int = CNPJ_CONCORRENCIA,
+    por_segundo: float = CNPJ_TAXA_POR_SEGUNDO,
+    tamanho_lote: int = TAMANHO_LOTE,
+    ao_progredir=None,
+) -> dict:
+    """
+    Consulta todos os fornecedores em paralelo e grava no banco em lotes,
+    conforme as respostas chegam (não espera terminar tudo para gravar).
+    """
+    if cnpjs is None:
+        cnpjs = await asyncio.to_thread(listar_cnpjs_fornecedores)
+
+    t0 = time.perf_counter()
+    buffer = []
+    ok = 0
+    falhas = {}
+
+    async with ClienteCNPJAsync(concorrencia=concorrencia, por_segundo=por_segundo) as cli:
+        async for cnpj, dados, erro in cli.consultar_varios(cnpjs):
+            if erro is not None:
+                falhas[cnpj] = str(erro)
+            else:
+                buffer.append((cnpj, dados))
+
+            if len(buffer) >= tamanho_lote:
+                ok += await asyncio.to_thread(salvar_fornecedores_lote, buffer)
+                buffer = []
+                if ao_progredir:
+                    ao_progredir(ok + len(falhas), len(cnpjs))
+
+    if buffer:
+        ok += await asyncio.to_thread(salvar_fornecedores_lote, buffer)
+
+    if ao_progredir:
+        ao_progredir(ok + len(falhas), len(cnpjs))
+
+    return {
+        "total": len(cnpjs),
+        "atualizados": ok,
+        "falhas": falhas,
+        "segundos": round(time.perf_counter() - t0, 2),
+    }
+
+
+def refresh_fornecedores(**kwargs) -> dict:
+    return asyncio.run(refresh_fornecedores_async(**kwargs))
+
+
+def _main():
+    ap = argparse.ArgumentParser(description="Atualiza o cadastro (BrasilAPI) de todos os fornecedores")
+    ap.add_argument("--concorrencia", type=int, default=CNPJ_CONCORRENCIA)
+    ap.add_argument("--taxa", type=float, default=CNPJ_TAXA_POR_SEGUNDO, help="requisições por segundo")
+    ap.add_argument("--lote", type=int, default=TAMANHO_LOTE)
+    args = ap.parse_args()
+
+    r = refresh_fornecedores(
+        concorrencia=args.concorrencia,
+        por_segundo=args.taxa,
+        tamanho_lote=args.lote,
+        ao_progredir=lambda feitos, total: print(f"  {feitos}/{total}", flush=True),
+    )
+    print(f"{r['atualizados']}/{r['total']} fornecedor(es) atualizado(s) em {r['segundos']}s")
+    for cnpj, erro in r["falhas"].items():
+        print(f"  falha {cnpj}: {erro}")
+
+
+if __name__ == "__main__":
+    _main()
@@ -0,0 +1,47 @@
+import hashlib
+
+from services.banco import (
+    atualizar_numero_arquivo,
+    inserir_contrato_fornecedor,
+    salvar_dados_render,
+    salvar_fornecedores_lote,
+)
+from services.cache_docx import materializacao_lazy
+from services.modelos import modelo_ativo, renderizar_modelo
+
+
+def criar_contrato(dados: dict, numero_manual: str, tipo_modelo: str):
+    """
+    Fluxo completo de criação (usado pela UI e pela API):
+    registra no banco (Fila de Início), guarda a versão do modelo em uso
+    + substituições e, no modo eager, já grava o DOCX.
+    Retorna (contrato_id, numero, arquivo|None).
+    """
+    from services.contrato import gravar_contrato, gerar_numero_contrato, montar_substituicoes
+
+    numero_final = gerar_numero_contrato(numero_manual)
+    versao_modelo, modelo_hash = modelo_ativo(tipo_modelo)
+    subs = montar_substituicoes(dados, numero_final)
+
+    contrato_id = inserir_contrato_fornecedor(
+        fornecedor_cnpj=dados.get("cnpj", ""),
+        fornecedor_razao=dados.get("razao_social", ""),
+        status="FILA_INICIO",
+        tipo_modelo=tipo_modelo,
+    )
+
+    # sempre guarda modelo + substituições (permite re-render sob demanda)
+    salvar_dados_render(contrato_id, tipo_modelo, modelo_hash, subs, versao_modelo)
+
+    arquivo = arquivo_hash = None
+    if not materializacao_lazy():
+        blob = renderizar_modelo(modelo_hash, subs, nome=tipo_modelo)
+        arquivo = gravar_contrato(numero_final, blob)
+        # o reconciliador compara com o disco (detecta sobrescrita por outro número)
+        arquivo_hash = hashlib.sha256(blob).hexdigest()
+
+    atualizar_numero_arquivo(contrato_id, numero_final, arquivo, arquivo_hash)
+
+    if dados.get("cnpj"):
+        salvar_fornecedores_lote([(dados["cnpj"], dados)])
+    return contrato_id, numero_final, arquivo
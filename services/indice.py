@@ -0,0 +1,428 @@
+"""
+Índice em memória dos contratos (o app usa com INDICE_MEMORIA=1): colunas numpy
+(id, status, fornecedor, versão, modelo, criado_em, etapa_entrada_em) para
+contagens, filtros, resumo por fornecedor e top-K dos parados (com filtros)
+sem varrer a tabela no banco.
+
+Carregado 1x por processo em segundo plano e mantido em dia pelo feed de
+mudanças (services/eventos) pela mesma thread, a cada INDICE_SINCRONIZAR_S:
+lê os eventos > seq (do barramento em memória quando ele está ativo; senão,
+ou se ele ficou para trás, do feed no banco) e os contratos afetados são
+relidos do banco e sobrescritos no índice. As consultas só seguram o lock
+enquanto leem os arrays (nenhum SQL); quem precisa ver a própria escrita
+chama sincronizar_agora(). Como a releitura traz o estado atual
+(idempotente), carregar e depois aplicar os eventos > seq nunca conta nada
+duas vezes. O arquivamento apaga linhas sem gerar evento: o índice é
+recarregado inteiro a cada INDICE_RECARREGAR_S.
+
+Textos (status, fornecedor, modelo) viram códigos inteiros; datas viram epoch.
+Memória: 35 bytes por contrato (+1/8 de folga para crescer) + textos
+distintos; medido em scripts/bench_indice.py.
+"""
+import os
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+from services import eventos
+from services.banco import (
+    blocos_contratos_indice,
+    buscar_contratos_indice,
+    numeros_contratos,
+    ultimo_evento_seq,
+)
+from services.sla_analise import iso_para_epoch
+from services.status import STATUS_ORDEM
+
+RECARREGAR_S = float(os.getenv("INDICE_RECARREGAR_S", "3600"))
+SINCRONIZAR_S = float(os.getenv("INDICE_SINCRONIZAR_S", "1"))
+TAMANHO_BLOCO = 50_000
+
+FORA = -1  # status de contrato que saiu (excluído/arquivado): a linha fica, mas não conta
+_MAX_STATUS = 128  # códigos de status cabem em int8
+
+COLUNAS = {
+    "id": np.int64,
+    "status": np.int8,
+    "fornecedor": np.int32,  # código de (cnpj, razão)
+    "versao": np.int32,
+    "modelo": np.int16,
+    "criado_em": np.float64,  # epoch (s); NaN se vazio
+    "etapa_entrada_em": np.float64,
+}
+
+
+def _epoch(valores) -> np.ndarray:
+    saida = np.full(len(valores), np.nan)
+    cheios = [i for i, v in enumerate(valores) if v]
+    if cheios:
+        saida[cheios] = iso_para_epoch([valores[i] for i in cheios])
+    return saida
+
+def _iso(epoch: float) -> str:
+    return datetime.fromtimestamp(epoch, timezone.utc).isoformat()
+
+
+class _Dicionario:
+    """
+    Texto <-> código inteiro (colunas categóricas).
+    """
+    def __init__(self, valores=()):
+        self.valores = []
+        self.codigos = {}
+        for v in valores:
+            self.codigo(v)
+
+    def codigo(self, valor) -> int:
+        c = self.codigos.get(valor)
+        if c is None:
+            c = self.codigos[valor] = len(self.valores)
+            self.valores.append(valor)
+        return c
+
+    def codificar(self, valores, dtype) -> np.ndarray:
+        # textos novos primeiro (laço só nos distintos), depois lookup em C
+        for v in dict.fromkeys(valores):
+            if v not in self.codigos:
+                self.codigo(v)
+        return np.fromiter(map(self.codigos.__getitem__, valores), dtype=dtype, count=len(valores))
+
+    def bytes(self) -> int:
+        return sys.getsizeof(self.codigos) + sys.getsizeof(self.valores) + sum(
+            sum(sys.getsizeof(p) for p in v) if isinstance(v, tuple) else sys.getsizeof(v)
+            for v in self.valores
+        )
+
+
+class IndiceContratos:
+    """
+    Colunas em arrays com folga (crescem dobrando), ordenadas por id, e a
+    contagem por status mantida a cada escrita (leitura O(1)).
+    Não é thread-safe: o módulo serializa o acesso com _lock.
+    """
+    def __init__(self, capacidade: int = 1024):
+        self.n = 0
+        self.seq = 0
+        self.col = {k: np.empty(capacidade, dtype=t) for k, t in COLUNAS.items()}
+        self.por_status = np.zeros(_MAX_STATUS, dtype=np.int64)
+        self.status = _Dicionario(STATUS_ORDEM)
+        self.fornecedores = _Dicionario()
+        self.modelos = _Dicionario()
+
+    # ---- escrita
+    def _colunas(self, rows) -> dict:
+        ids, status, cnpj, razao, versao, modelo, criado, entrada = zip(*rows)
+        return {
+            "id": np.array(ids, dtype=np.int64),
+            "status": self.status.codificar(status, np.int8),
+            "fornecedor": self.fornecedores.codificar(list(zip(cnpj, razao)), np.int32),
+            "versao": np.array(versao, dtype=np.int32),
+            "modelo": self.modelos.codificar(modelo, np.int16),
+            "criado_em": _epoch(criado),
+            "etapa_entrada_em": _epoch(entrada),
+        }
+
+    def _reservar(self, capacidade: int):
+        if capacidade <= self.col["id"].size:
+            return
+        nova = max(capacidade, 2 * self.col["id"].size)
+        for k, v in self.col.items():
+            maior = np.empty(nova, dtype=v.dtype)
+            maior[:self.n] = v[:self.n]
+            self.col[k] = maior
+
+    def _contar(self, codigos: np.ndarray, sinal: int):
+        self.por_status += sinal * np.bincount(codigos[codigos != FORA], minlength=_MAX_STATUS)
+
+    def compactar(self):
+        """
+        Reduz a folga para ~1/8 (depois da carga inicial).
+        """
+        nova = self.n + self.n // 8 + 1024
+        if nova < self.col["id"].size:
+            self.col = {k: v[:nova].copy() for k, v in self.col.items()}
+
+    def anexar(self, rows):
+        """
+        Linhas com ids maiores que os já presentes (carga em ordem de id).
+        """
+        if not rows:
+            return
+        novos = self._colunas(rows)
+        m = len(rows)
+        self._reservar(self.n + m)
+        for k, v in novos.items():
+            self.col[k][self.n:self.n + m] = v
+        self.n += m
+        self._contar(novos["status"], +1)
+
+    def _posicoes(self, ids: np.ndarray):
+        atuais = self.col["id"][:self.n]
+        pos = np.searchsorted(atuais, ids)
+        achou = pos < self.n
+        achou[achou] = atuais[pos[achou]] == ids[achou]
+        return pos, achou
+
+    def sobrescrever(self, ids_afetados, rows):
+        """
+        Aplica o estado atual (buscar_contratos_indice) dos contratos afetados:
+        atualiza os presentes, insere os novos e tira os que não vieram.
+        """
+        vieram = set()
+        if rows:
+            novos = self._colunas(rows)
+            vieram = set(novos["id"].tolist())
+            pos, achou = self._posicoes(novos["id"])
+            self._contar(self.col["status"][pos[achou]], -1)
+            self._contar(novos["status"], +1)
+            for k, v in novos.items():
+                self.col[k][pos[achou]] = v[achou]
+
+            if not achou.all():
+                resto = {k: v[~achou] for k, v in novos.items()}
+                ordem = np.argsort(resto["id"], kind="stable")
+                resto = {k: v[ordem] for k, v in resto.items()}
+                m = resto["id"].size
+                self._reservar(self.n + m)
+                for k, v in resto.items():
+                    self.col[k][self.n:self.n + m] = v
+                if self.n and resto["id"][0] < self.col["id"][self.n - 1]:
+                    # raro (ids chegam em ordem): reordena tudo
+                    ordem = np.argsort(self.col["id"][:self.n + m], kind="stable")
+                    for k, v in self.col.items():
+                        v[:self.n + m] = v[:self.n + m][ordem]
+                self.n += m
+
+        sairam = np.array([i for i in ids_afetados if i not in vieram], dtype=np.int64)
+        if sairam.size:
+            pos, achou = self._posicoes(sairam)
+            self._contar(self.col["status"][pos[achou]], -1)
+            self.col["status"][pos[achou]] = FORA
+
+    # ---- leitura
+    def _mascara(self, status=None, tipo_modelo=None, fornecedor_cnpj=None, criado_de=None, criado_ate=None):
+        cod = self.col["status"][:self.n]
+        if status is not None:
+            mascara = cod == self.status.codigos.get(status, FORA - 1)
+        else:
+            mascara = cod != FORA
+        if tipo_modelo is not None:
+            mascara &= self.col["modelo"][:self.n] == self.modelos.codigos.get(tipo_modelo, -1)
+        if fornecedor_cnpj is not None:
+            codigos = [c for (cnpj, _r), c in self.fornecedores.codigos.items() if cnpj == fornecedor_cnpj]
+            mascara &= np.isin(self.col["fornecedor"][:self.n], codigos)
+        if criado_de is not None:
+            mascara &= self.col["criado_em"][:self.n] >= iso_para_epoch([criado_de])[0]
+        if criado_ate is not None:
+            mascara &= self.col["criado_em"][:self.n] < iso_para_epoch([criado_ate])[0]
+        return mascara
+
+    def contar_por_status(self) -> dict:
+        q = self.por_status
+        return {self.status.valores[c]: int(q[c]) for c in np.flatnonzero(q)}
+
+    def contar(self, **filtros) -> int:
+        return int(np.count_nonzero(self._mascara(**filtros)))
+
+    def ids(self, limite: int | None = None, **filtros) -> list:
+        # mais novos primeiro, como listar_contratos_por_status
+        return self.col["id"][:self.n][self._mascara(**filtros)][::-1][:limite].tolist()
+
+    def fornecedores_resumo(self) -> list:
+        vivos = self.col["status"][:self.n] != FORA
+        forn = self.col["fornecedor"][:self.n][vivos]
+        total = np.bincount(forn, minlength=len(self.fornecedores.valores))
+        max_versao = np.zeros(total.size, dtype=np.int64)
+        np.maximum.at(max_versao, forn, self.col["versao"][:self.n][vivos])
+        rows = [
+            (cnpj, razao, int(total[c]), int(max_versao[c]))
+            for c, (cnpj, razao) in enumerate(self.fornecedores.valores)
+            if total[c] and cnpj
+        ]
+        rows.sort(key=lambda r: (r[1] or "", r[0]))
+        return rows
+
+    def mais_antigos_por_etapa(self, etapas, k: int, **filtros) -> list:
+        """
+        (status, id, fornecedor_razao, tipo_modelo, etapa_entrada_em epoch), K por etapa.
+        """
+        cod = self.col["status"][:self.n]
+        entrada = self.col["etapa_entrada_em"][:self.n]
+        ids = self.col["id"][:self.n]
+        base = self._mascara(**filtros) & ~np.isnan(entrada)
+        rows = []
+        for etapa in etapas:
+            c = self.status.codigos.get(etapa)
+            if c is None or k <= 0:
+                continue
+            idx = np.flatnonzero(base & (cod == c))
+            if idx.size > k:
+                # empates no K-ésimo (lote move vários com o mesmo instante) entram todos
+                limiar = entrada[idx][np.argpartition(entrada[idx], k - 1)[k - 1]]
+                idx = idx[entrada[idx] <= limiar]
+            idx = idx[np.lexsort((ids[idx], entrada[idx]))][:k]  # desempate por id
+            for i in idx.tolist():
+                rows.append((
+                    etapa,
+                    int(ids[i]),
+                    self.fornecedores.valores[self.col["fornecedor"][i]][1],
+                    self.modelos.valores[self.col["modelo"][i]],
+                    float(entrada[i]),
+                ))
+        return rows
+
+    def memoria(self) -> dict:
+        arrays = sum(v.nbytes for v in self.col.values())
+        textos = self.status.bytes() + self.fornecedores.bytes() + self.modelos.bytes()
+        return {
+            "contratos": self.n,
+            "capacidade": int(self.col["id"].size),
+            "bytes_arrays": arrays,
+            "bytes_textos": textos,
+            "bytes_total": arrays + textos,
+        }
+
+
+# -----------------------------
+# Carga e sincronização
+# -----------------------------
+def carregar() -> IndiceContratos:
+    """
+    Lê todos os contratos do banco num índice novo. O seq é lido antes:
+    o que mudar durante a carga é reaplicado na próxima sincronização.
+    """
+    indice = IndiceContratos()
+    indice.seq = ultimo_evento_seq()
+    for bloco in blocos_contratos_indice(TAMANHO_BLOCO):
+        indice.anexar(bloco)
+    indice.compactar()
+    return indice
+
+def _eventos_novos(seq: int, direto: bool) -> list:
+    if not direto and eventos.ativo():
+        novos = eventos.ler(seq)
+        if novos is not None:
+            return novos
+    novos = []
+    while True:
+        pagina, seq = eventos.desde(seq)
+        novos.extend(pagina)
+        if len(pagina) < eventos.LIMITE_CONSULTA:
+            return novos
+
+def sincronizar(indice: IndiceContratos, direto: bool = False):
+    """
+    Aplica os eventos > indice.seq. Eventos e contratos afetados são lidos
+    sem segurar _lock (as consultas seguem enquanto isso); só a escrita nos
+    arrays o segura. direto=True lê o feed no banco em vez do barramento,
+    que pode estar até um ciclo atrás: quem acabou de gravar já vê a mudança.
+    """
+    with _lock_sincronizacao:
+        novos = _eventos_novos(indice.seq, direto)
+        if not novos:
+            return
+        afetados = {ev["contrato_id"] for ev in novos}
+        linhas = buscar_contratos_indice(afetados)
+        with _lock:
+            indice.sobrescrever(afetados, linhas)
+            indice.seq = novos[-1]["seq"]
+
+
+# -----------------------------
+# Índice do processo
+# -----------------------------
+_lock = threading.Lock()  # leitura/escrita dos arrays
+_lock_sincronizacao = threading.Lock()  # uma sincronização por vez (em ordem de seq)
+_atual = {"indice": None}
+_thread = None
+
+
+def pronto() -> bool:
+    """
+    True quando o índice já foi carregado (antes disso, use o banco).
+    """
+    return _atual["indice"] is not None
+
+def sincronizar_agora():
+    """
+    Traz o índice até o último evento gravado (ex.: no rerun completo, para
+    quem acabou de mudar um status ver a mudança nas contagens).
+    """
+    indice = _atual["indice"]
+    if indice is not None:
+        sincronizar(indice, direto=True)
+
+def _consultar(funcao):
+    with _lock:
+        indice = _atual["indice"]
+        if indice is None:
+            raise RuntimeError("Índice em memória não carregado (chame iniciar_em_segundo_plano()).")
+        return funcao(indice)
+
+def contar_por_status() -> dict:
+    return _consultar(lambda i: i.contar_por_status())
+
+def contar_por_status_com_seq():
+    """
+    Mesmo formato de banco.contar_por_status_com_seq (o seq é o do índice).
+    """
+    return _consultar(lambda i: (i.contar_por_status(), i.seq))
+
+def contar(**filtros) -> int:
+    """
+    Filtros: status, tipo_modelo, fornecedor_cnpj, criado_de/criado_ate (ISO, fim exclusivo).
+    """
+    return _consultar(lambda i: i.contar(**filtros))
+
+def ids(limite: int | None = None, **filtros) -> list:
+    return _consultar(lambda i: i.ids(limite, **filtros))
+
+def fornecedores_resumo() -> list:
+    """
+    Mesmas linhas de banco.listar_fornecedores_resumo.
+    """
+    return _consultar(lambda i: i.fornecedores_resumo())
+
+def mais_antigos_por_etapa(etapas, k: int, **filtros) -> list:
+    """
+    Mesmas linhas de banco.listar_mais_antigos_por_etapa, com os filtros de
+    contar() (sem filtro, a consulta no banco já usa índice e é mais rápida).
+    O número vem do banco, por id, só para os K de cada etapa.
+    """
+    rows = _consultar(lambda i: i.mais_antigos_por_etapa(etapas, k, **filtros))
+    numeros = numeros_contratos(r[1] for r in rows)
+    return [(s, cid, numeros.get(cid), razao, modelo, _iso(t)) for s, cid, razao, modelo, t in rows]
+
+def memoria() -> dict:
+    return _consultar(lambda i: i.memoria())
+
+def iniciar_em_segundo_plano(recarregar_s: float = RECARREGAR_S, sincronizar_s: float = SINCRONIZAR_S):
+    """
+    Sobe (uma vez por processo) a thread que carrega o índice, aplica os
+    eventos novos a cada sincronizar_s e o recarrega inteiro a cada
+    recarregar_s (<= 0: só a carga inicial).
+    """
+    global _thread
+    if _thread is not None and _thread.is_alive():
+        return
+
+    def _loop():
+        carregado_em = None
+        while True:
+            try:
+                if carregado_em is None or 0 < recarregar_s <= time.monotonic() - carregado_em:
+                    novo = carregar()
+                    with _lock_sincronizacao, _lock:
+                        _atual["indice"] = novo
+                    carregado_em = time.monotonic()
+                else:
+                    sincronizar(_atual["indice"])
+            except Exception:
+                pass  # banco indisponível: tenta de novo no próximo ciclo
+            time.sleep(max(sincronizar_s, 0.1) if carregado_em is not None else 5)
+
+    _thread = threading.Thread(target=_loop, name="indice", daemon=True)
+    _thread.start()
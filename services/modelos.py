@@ -0,0 +1,390 @@
+"""
+Registro de modelos (DOCX), guardado no banco com versões.
+
+- Cada upload vira uma nova versão (conteúdo + sha256 + manifesto) e passa a
+  ser a ativa na hora, sem reiniciar o processo: o render e os caches são
+  chaveados pelo hash, então a versão nova simplesmente tem outra chave.
+  Contratos já criados continuam com a versão (hash) com que nasceram.
+- Cada versão é escaneada UMA vez e vira um manifesto com a posição exata de
+  cada placeholder (parágrafo + run) e os problemas encontrados:
+    placeholder quebrado em vários runs (o Word faz isso ao editar/formatar
+    parte do texto) -> erro: a substituição não o encontraria;
+    placeholder desconhecido ou malformado -> erro: sairia literal no contrato;
+    placeholder principal ausente -> aviso.
+  Uploads com erro são recusados. O render substitui só nos runs do manifesto.
+- Cada render soma contagem/tempo no modelo e guarda a amostra (média e p95).
+
+Na primeira execução os modelos de templates/ são importados (MODELOS_INICIAIS).
+
+    python -m services.modelos templates/*.docx
+"""
+import glob
+import hashlib
+import io
+import json
+import os
+import re
+import sys
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+
+from services.banco import (
+    amostras_render_modelo,
+    ativar_versao_modelo,
+    buscar_modelo_ativo,
+    buscar_modelo_por_hash,
+    contar_modelos,
+    inserir_versao_modelo,
+    listar_modelos_ativos,
+    listar_versoes_modelo,
+    registrar_render_modelo,
+    salvar_manifesto_modelo,
+)
+
+DIR_MODELOS = "templates"
+VERSAO_MANIFESTO = 1
+
+# importados para o banco na primeira execução (antes ficavam fixos no código)
+MODELOS_INICIAIS = {
+    "NDA": "templates/nda.docx",
+    "Contrato de API": "templates/contrato_api.docx",
+}
+
+PLACEHOLDERS_PRINCIPAIS = ("<<NUMERO_CONTRATO>>", "<<RAZAO_SOCIAL>>", "<<CNPJ_FORMATADO>>")
+
+_PADRAO = re.compile(r"<<[^<>]*>>")
+
+_lock = threading.Lock()
+_carregados = OrderedDict()  # hash -> (conteudo, manifesto), LRU
+_CARREGADOS_MAX = 32
+_hash_por_arquivo = {}  # caminho -> (mtime_ns, tamanho, hash)
+
+
+class ModeloInvalido(ValueError):
+    def __init__(self, manifesto: dict):
+        self.manifesto = manifesto
+        super().__init__("Modelo com problemas: " + "; ".join(e["mensagem"] for e in manifesto["erros"]))
+
+
+@lru_cache(maxsize=1)
+def placeholders_conhecidos() -> tuple:
+    from services.contrato import montar_substituicoes
+
+    return tuple(montar_substituicoes({}, "").keys())
+
+
+# -----------------------------
+# Percurso do documento
+# -----------------------------
+def _paragrafos_tabela(table, prefixo: str):
+    for r, row in enumerate(table.rows):
+        for c, cell in enumerate(row.cells):
+            for i, p in enumerate(cell.paragraphs):
+                yield f"{prefixo} (l{r + 1}, c{c + 1}) §{i + 1}", p
+
+def iterar_paragrafos(doc):
+    """
+    (rótulo, parágrafo) na mesma ordem e com o mesmo alcance da substituição
+    completa (_replace_everywhere): corpo, tabelas, cabeçalhos e rodapés.
+    A posição na sequência é o índice usado no manifesto.
+    """
+    for i, p in enumerate(doc.paragraphs):
+        yield f"corpo §{i + 1}", p
+    for t, table in enumerate(doc.tables):
+        yield from _paragrafos_tabela(table, f"tabela {t + 1}")
+
+    for s, section in enumerate(doc.sections):
+        for nome, parte in (("cabeçalho", section.header), ("rodapé", section.footer)):
+            base = f"{nome} seção {s + 1}"
+            for i, p in enumerate(parte.paragraphs):
+                yield f"{base} §{i + 1}", p
+            for t, table in enumerate(parte.tables):
+                yield from _paragrafos_tabela(table, f"{base} tabela {t + 1}")
+
+
+# -----------------------------
+# Inspeção
+# -----------------------------
+def _problema(local: str, mensagem: str, trecho: str = "") -> dict:
+    return {"local": local, "mensagem": f"{local}: {mensagem}", "trecho": trecho[:120]}
+
+def inspecionar_modelo(blob: bytes) -> dict:
+    """
+    Escaneia o DOCX (bytes) e devolve o manifesto:
+    {hash, versao, paragrafos, placeholders: {chave: [[paragrafo, run], ...]}, erros, avisos}.
+    """
+    from docx import Document
+
+    conhecidos = placeholders_conhecidos()
+    manifesto = {
+        "hash": hashlib.sha256(blob).hexdigest(),
+        "versao": VERSAO_MANIFESTO,
+        "paragrafos": 0,
+        "placeholders": {},
+        "erros": [],
+        "avisos": [],
+    }
+    try:
+        doc = Document(io.BytesIO(blob))
+    except Exception as e:
+        manifesto["erros"].append(_problema("arquivo", f"não é um DOCX válido ({e})"))
+        return manifesto
+
+    posicoes = manifesto["placeholders"]
+    for ordem, (local, p) in enumerate(iterar_paragrafos(doc)):
+        manifesto["paragrafos"] = ordem + 1
+        texto = p.text
+        if "<<" not in texto and ">>" not in texto:
+            continue
+
+        nos_runs = {}
+        for r, run in enumerate(p.runs):
+            for m in _PADRAO.finditer(run.text):
+                chave = m.group(0)
+                nos_runs[chave] = nos_runs.get(chave, 0) + 1
+                lista = posicoes.setdefault(chave, [])
+                if [ordem, r] not in lista:
+                    lista.append([ordem, r])
+
+        no_texto = {}
+        for m in _PADRAO.finditer(texto):
+            no_texto[m.group(0)] = no_texto.get(m.group(0), 0) + 1
+
+        for chave, n in no_texto.items():
+            if chave not in conhecidos:
+                manifesto["erros"].append(_problema(local, f"placeholder desconhecido {chave}", texto))
+            elif n > nos_runs.get(chave, 0):
+                manifesto["erros"].append(
+                    _problema(local, f"{chave} está quebrado em vários trechos de formatação (runs); redigite-o de uma vez no Word", texto)
+                )
+
+        resto = _PADRAO.sub("", texto)
+        if "<<" in resto or ">>" in resto:
+            manifesto["erros"].append(_problema(local, "placeholder malformado (<< ou >> sem par)", texto))
+
+    for chave in PLACEHOLDERS_PRINCIPAIS:
+        if chave not in posicoes:
+            manifesto["avisos"].append(_problema("modelo", f"{chave} não aparece no modelo"))
+
+    for chave in [c for c in posicoes if c not in conhecidos]:
+        del posicoes[chave]
+    return manifesto
+
+
+def validar_modelo(blob: bytes) -> dict:
+    """
+    Inspeciona e levanta ModeloInvalido se houver erros. Retorna o manifesto.
+    """
+    manifesto = inspecionar_modelo(blob)
+    if manifesto["erros"]:
+        raise ModeloInvalido(manifesto)
+    return manifesto
+
+
+# -----------------------------
+# Registro (banco + cache em memória por hash)
+# -----------------------------
+def semear_modelos():
+    """
+    Importa os modelos de templates/ se o registro ainda estiver vazio.
+    Não escaneia nada (o manifesto é gerado no primeiro uso).
+    """
+    if contar_modelos():
+        return
+    for nome, caminho in MODELOS_INICIAIS.items():
+        if os.path.exists(caminho):
+            blob, hash_modelo = ler_modelo(caminho)
+            inserir_versao_modelo(nome, hash_modelo, blob, None, "sistema")
+
+def nomes_modelos() -> list:
+    ativos = listar_modelos_ativos()
+    if not ativos:
+        semear_modelos()
+        ativos = listar_modelos_ativos()
+    return [nome for nome, _versao, _hash in ativos]
+
+def modelo_ativo(nome: str) -> tuple:
+    """
+    (versao, hash) da versão em uso. ValueError se o modelo não existir.
+    """
+    row = buscar_modelo_ativo(nome)
+    if row is None:
+        semear_modelos()
+        row = buscar_modelo_ativo(nome)
+    if row is None:
+        raise ValueError(f"Modelo não cadastrado: {nome}")
+    return int(row[0]), row[1]
+
+def _guardar(hash_modelo: str, conteudo: bytes, manifesto: dict):
+    with _lock:
+        _carregados[hash_modelo] = (conteudo, manifesto)
+        _carregados.move_to_end(hash_modelo)
+        while len(_carregados) > _CARREGADOS_MAX:
+            _carregados.popitem(last=False)
+
+def carregar_modelo(hash_modelo: str):
+    """
+    (conteudo, manifesto) da versão com esse hash, ou None se não estiver no registro.
+    O manifesto é gerado e gravado no banco na primeira vez.
+    """
+    with _lock:
+        if hash_modelo in _carregados:
+            _carregados.move_to_end(hash_modelo)
+            return _carregados[hash_modelo]
+
+    row = buscar_modelo_por_hash(hash_modelo)
+    if row is None:
+        return None
+    _nome, _versao, conteudo, manifesto_json = row
+
+    manifesto = json.loads(manifesto_json) if manifesto_json else None
+    if manifesto is None or manifesto.get("versao") != VERSAO_MANIFESTO:
+        manifesto = inspecionar_modelo(conteudo)
+        salvar_manifesto_modelo(hash_modelo, json.dumps(manifesto, ensure_ascii=False))
+
+    _guardar(hash_modelo, conteudo, manifesto)
+    return conteudo, manifesto
+
+def manifesto_por_blob(blob: bytes, hash_modelo: str | None = None) -> dict:
+    """
+    Manifesto de um conteúdo qualquer: do registro se for uma versão cadastrada,
+    senão escaneado (e mantido só em memória).
+    """
+    hash_modelo = hash_modelo or hashlib.sha256(blob).hexdigest()
+    carregado = carregar_modelo(hash_modelo)
+    if carregado is not None:
+        return carregado[1]
+    manifesto = inspecionar_modelo(blob)
+    _guardar(hash_modelo, blob, manifesto)
+    return manifesto
+
+def ler_modelo(caminho: str) -> tuple[bytes, str]:
+    """
+    (bytes, sha256) de um arquivo; o hash é reaproveitado enquanto mtime/tamanho não mudam.
+    """
+    with open(caminho, "rb") as f:
+        blob = f.read()
+        st = os.fstat(f.fileno())
+    chave = (st.st_mtime_ns, st.st_size)
+    with _lock:
+        anterior = _hash_por_arquivo.get(caminho)
+    if anterior and anterior[:2] == chave:
+        return blob, anterior[2]
+
+    hash_modelo = hashlib.sha256(blob).hexdigest()
+    with _lock:
+        _hash_por_arquivo[caminho] = (*chave, hash_modelo)
+    return blob, hash_modelo
+
+
+# -----------------------------
+# Render
+# -----------------------------
+def aplicar_substituicoes(doc, manifesto: dict, subs: dict) -> int:
+    """
+    Substitui só nos runs listados no manifesto. Retorna quantos runs mudaram.
+    """
+    paragrafos = None
+    alterados = 0
+    for chave, locais in manifesto["placeholders"].items():
+        valor = subs.get(chave)
+        if valor is None:
+            continue
+        if paragrafos is None:
+            paragrafos = [p for _local, p in iterar_paragrafos(doc)]
+        for ordem, r in locais:
+            run = paragrafos[ordem].runs[r]
+            if chave in run.text:  # células mescladas repetem o mesmo parágrafo
+                run.text = run.text.replace(chave, valor)
+                alterados += 1
+    return alterados
+
+def renderizar_modelo(hash_modelo: str, subs: dict, nome: str | None = None, caminho_legado: str | None = None) -> bytes:
+    """
+    Renderiza a versão `hash_modelo` do registro e registra o tempo do render.
+    caminho_legado: arquivo usado por contratos antigos, aceito se o conteúdo bater.
+    """
+    from services.contrato import renderizar_docx
+
+    carregado = carregar_modelo(hash_modelo)
+    if carregado is None and caminho_legado and os.path.exists(caminho_legado):
+        blob, hash_arquivo = ler_modelo(caminho_legado)
+        if hash_arquivo == hash_modelo:
+            carregado = blob, manifesto_por_blob(blob, hash_modelo)
+    if carregado is None:
+        raise ValueError("A versão do modelo usada neste contrato não está mais disponível.")
+
+    conteudo, manifesto = carregado
+    t0 = time.perf_counter()
+    blob = renderizar_docx(conteudo, manifesto, subs)
+    registrar_render_modelo(hash_modelo, (time.perf_counter() - t0) * 1000, nome)
+    return blob
+
+
+# -----------------------------
+# Administração (upload, versões, estatísticas)
+# -----------------------------
+def publicar_modelo(nome: str, blob: bytes, por: str | None = None) -> tuple[int, dict]:
+    """
+    Valida e publica como nova versão ativa de `nome` (cria o modelo se não existir).
+    Levanta ModeloInvalido se tiver erros. Retorna (versao, manifesto).
+    """
+    nome = (nome or "").strip()
+    if not nome:
+        raise ValueError("Informe o nome do modelo.")
+    manifesto = validar_modelo(blob)
+    versao, _criada = inserir_versao_modelo(
+        nome, manifesto["hash"], blob, json.dumps(manifesto, ensure_ascii=False), por
+    )
+    _guardar(manifesto["hash"], blob, manifesto)
+    return versao, manifesto
+
+def ativar_versao(nome: str, versao: int) -> bool:
+    return ativar_versao_modelo(nome, versao) == 1
+
+def _p95(amostras: list) -> float:
+    if not amostras:
+        return 0.0
+    ordenadas = sorted(amostras)
+    return ordenadas[max(0, -(-95 * len(ordenadas) // 100) - 1)]
+
+def versoes_modelo(nome: str) -> list:
+    """
+    Versões (mais nova primeiro) com estatísticas de render:
+    [{versao, hash, ativo, criado_em, criado_por, renders, media_ms, p95_ms}, ...].
+    """
+    resultado = []
+    for versao, hash_modelo, ativo, criado_em, criado_por, renders, total_ms, _manifesto in listar_versoes_modelo(nome):
+        resultado.append({
+            "versao": int(versao),
+            "hash": hash_modelo,
+            "ativo": bool(ativo),
+            "criado_em": criado_em,
+            "criado_por": criado_por,
+            "renders": int(renders),
+            "media_ms": round(total_ms / renders, 1) if renders else 0.0,
+            "p95_ms": round(_p95(amostras_render_modelo(hash_modelo)), 1) if renders else 0.0,
+        })
+    return resultado
+
+
+def _main():
+    arquivos = sys.argv[1:] or sorted(glob.glob(os.path.join(DIR_MODELOS, "*.docx")))
+    falhou = False
+    for caminho in arquivos:
+        with open(caminho, "rb") as f:
+            m = inspecionar_modelo(f.read())
+        n = sum(len(v) for v in m["placeholders"].values())
+        print(f"{caminho}: {len(m['placeholders'])} placeholder(s), {n} ocorrência(s) em {m['paragrafos']} parágrafo(s)")
+        for e in m["erros"]:
+            print(f"  ERRO  {e['mensagem']}")
+        for a in m["avisos"]:
+            print(f"  aviso {a['mensagem']}")
+        falhou |= bool(m["erros"])
+    sys.exit(1 if falhou else 0)
+
+
+if __name__ == "__main__":
+    _main()
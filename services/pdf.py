@@ -0,0 +1,292 @@
+import atexit
+import hashlib
+import io
+import os
+import queue
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+import uuid
+import zipfile
+from concurrent.futures import Future
+
+from services.cache_docx import obter_do_cache
+
+
+# -----------------------------
+# Config
+# -----------------------------
+SOFFICE_BIN = os.getenv("SOFFICE_BIN", "soffice")
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", "2"))
+PDF_TIMEOUT = float(os.getenv("PDF_TIMEOUT", "120"))
+
+DIR_CACHE_PDF = os.getenv("CACHE_PDF_DIR", "cache_pdf")
+LIMITE_BYTES_PDF = int(float(os.getenv("CACHE_PDF_MAX_MB", "300")) * 1024 * 1024)
+
+try:
+    import uno  # vem com o LibreOffice (python3-uno)
+    from com.sun.star.beans import PropertyValue
+except Exception:
+    uno = None
+    PropertyValue = None
+
+
+def _prop(nome: str, valor):
+    p = PropertyValue()
+    p.Name = nome
+    p.Value = valor
+    return p
+
+
+# -----------------------------
+# Conversores (1 processo LibreOffice cada)
+# -----------------------------
+class _ConversorUno:
+    """
+    Mantém um soffice --headless escutando num pipe nomeado e converte via UNO,
+    sem pagar o startup do LibreOffice a cada arquivo. O nome do pipe é único
+    por conversor (pid + uuid): vários processos do app na mesma máquina não
+    disputam porta nem falam com o soffice um do outro.
+    """
+
+    def __init__(self, indice: int):
+        self.pipe = f"contratos_pdf_{os.getpid()}_{indice}_{uuid.uuid4().hex[:8]}"
+        self.dir_trabalho = tempfile.mkdtemp(prefix=f"pdf_worker_{indice}_")
+        self.perfil = os.path.join(self.dir_trabalho, "perfil")
+        self.proc = None
+        self.desktop = None
+
+    def iniciar(self):
+        self.proc = subprocess.Popen(
+            [
+                SOFFICE_BIN,
+                "--headless", "--invisible", "--nologo", "--norestore", "--nodefault",
+                f"-env:UserInstallation=file://{self.perfil}",
+                f"--accept=pipe,name={self.pipe};urp;StarOffice.ComponentContext",
+            ],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+
+        local = uno.getComponentContext()
+        resolver = local.ServiceManager.createInstanceWithContext("com.sun.star.bridge.UnoUrlResolver", local)
+        url = f"uno:pipe,name={self.pipe};urp;StarOffice.ComponentContext"
+
+        limite = time.monotonic() + 30
+        while True:
+            try:
+                ctx = resolver.resolve(url)
+                break
+            except Exception:
+                if self.proc.poll() is not None or time.monotonic() > limite:
+                    raise RuntimeError("Não foi possível iniciar o LibreOffice headless.")
+                time.sleep(0.25)
+
+        self.desktop = ctx.ServiceManager.createInstanceWithContext("com.sun.star.frame.Desktop", ctx)
+
+    def converter(self, docx: bytes) -> bytes:
+        if self.desktop is None:
+            self.iniciar()
+
+        entrada = os.path.join(self.dir_trabalho, "entrada.docx")
+        saida = os.path.join(self.dir_trabalho, "saida.pdf")
+        with open(entrada, "wb") as f:
+            f.write(docx)
+
+        doc = self.desktop.loadComponentFromURL(uno.systemPathToFileUrl(entrada), "_blank", 0, (_prop("Hidden", True),))
+        try:
+            doc.storeToURL(uno.systemPathToFileUrl(saida), (_prop("FilterName", "writer_pdf_Export"),))
+        finally:
+            doc.close(True)
+
+        with open(saida, "rb") as f:
+            return f.read()
+
+    def matar(self):
+        """Chamado pelo watchdog: derruba o soffice travado (a chamada UNO em curso falha)."""
+        if self.proc is not None and self.proc.poll() is None:
+            self.proc.kill()
+
+    def encerrar(self):
+        if self.desktop is not None:
+            try:
+                self.desktop.terminate()
+            except Exception:
+                pass
+            self.desktop = None
+        if self.proc is not None:
+            try:
+                self.proc.wait(timeout=5)
+            except Exception:
+                self.proc.kill()
+            self.proc = None
+        shutil.rmtree(self.dir_trabalho, ignore_errors=True)
+
+
+class _ConversorCli:
+    """
+    Fallback quando o módulo uno não está disponível: um `soffice --convert-to`
+    por arquivo (mais lento), mas ainda com perfil próprio por worker.
+    """
+
+    def __init__(self, indice: int):
+        self.dir_trabalho = tempfile.mkdtemp(prefix=f"pdf_worker_{indice}_")
+        self.perfil = os.path.join(self.dir_trabalho, "perfil")
+
+    def converter(self, docx: bytes) -> bytes:
+        entrada = os.path.join(self.dir_trabalho, "entrada.docx")
+        with open(entrada, "wb") as f:
+            f.write(docx)
+
+        subprocess.run(
+            [
+                SOFFICE_BIN, "--headless", "--norestore",
+                f"-env:UserInstallation=file://{self.perfil}",
+                "--convert-to", "pdf", "--outdir", self.dir_trabalho, entrada,
+            ],
+            check=True,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            timeout=PDF_TIMEOUT,
+        )
+
+        with open(os.path.join(self.dir_trabalho, "entrada.pdf"), "rb") as f:
+            return f.read()
+
+    def matar(self):
+        pass  # subprocess.run(timeout=...) já mata o soffice travado
+
+    def encerrar(self):
+        shutil.rmtree(self.dir_trabalho, ignore_errors=True)
+
+
+# -----------------------------
+# Pool + fila
+# -----------------------------
+class PoolPDF:
+    """
+    N workers, cada um dono de um conversor de vida longa, consumindo uma fila.
+    Se um conversor falhar, ele é recriado e o próximo arquivo segue normalmente.
+    Cada conversão tem um watchdog de PDF_TIMEOUT: passou disso, o soffice é
+    morto (a conversão falha) e o worker volta a atender a fila com um novo.
+    """
+
+    def __init__(self, workers: int = PDF_WORKERS):
+        self.fila = queue.Queue()
+        self.threads = []
+        for i in range(max(1, workers)):
+            t = threading.Thread(target=self._loop, args=(i,), name=f"pdf-worker-{i}", daemon=True)
+            t.start()
+            self.threads.append(t)
+
+    def _novo_conversor(self, indice: int):
+        return _ConversorUno(indice) if uno is not None else _ConversorCli(indice)
+
+    def _loop(self, indice: int):
+        conv = self._novo_conversor(indice)
+        while True:
+            item = self.fila.get()
+            if item is None:
+                conv.encerrar()
+                return
+
+            docx, fut = item
+            if not fut.set_running_or_notify_cancel():
+                continue
+            watchdog = threading.Timer(PDF_TIMEOUT, conv.matar)
+            watchdog.daemon = True
+            watchdog.start()
+            try:
+                fut.set_result(conv.converter(docx))
+            except Exception as e:
+                if not watchdog.is_alive():
+                    e = TimeoutError(f"Conversão para PDF passou de {PDF_TIMEOUT:g}s; LibreOffice reiniciado.")
+                conv.encerrar()
+                conv = self._novo_conversor(indice)
+                fut.set_exception(e)
+            finally:
+                watchdog.cancel()
+
+    def enviar(self, docx: bytes) -> Future:
+        fut = Future()
+        self.fila.put((docx, fut))
+        return fut
+
+    def encerrar(self):
+        for _ in self.threads:
+            self.fila.put(None)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def obter_pool() -> PoolPDF:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = PoolPDF()
+            atexit.register(_pool.encerrar)
+        return _pool
+
+
+# -----------------------------
+# API pública
+# -----------------------------
+def converter_para_pdf(docx: bytes) -> bytes:
+    """
+    DOCX -> PDF, com cache pelo hash do conteúdo do DOCX.
+    """
+    chave = hashlib.sha256(docx).hexdigest()
+    return obter_do_cache(
+        chave,
+        # sem timeout aqui: a espera na fila (atrás de um lote) não conta; a
+        # conversão em si é limitada pelo watchdog do worker (PDF_TIMEOUT)
+        lambda: obter_pool().enviar(docx).result(),
+        diretorio=DIR_CACHE_PDF,
+        extensao=".pdf",
+        limite=LIMITE_BYTES_PDF,
+    )
+
+
+def exportar_lote_pdf(itens) -> bytes:
+    """
+    Recebe [(nome_pdf, docx_bytes), ...] e devolve um .zip com todos os PDFs.
+    Todos os arquivos entram na fila de uma vez (os workers convertem em paralelo).
+    Nomes repetidos ganham sufixo (_2, _3...) em vez de duplicar a entrada no zip.
+    """
+    pendentes = []
+    for nome, docx in itens:
+        chave = hashlib.sha256(docx).hexdigest()
+        caminho = os.path.join(DIR_CACHE_PDF, f"{chave}.pdf")
+        if os.path.exists(caminho):
+            pendentes.append((nome, None, docx))
+        else:
+            pendentes.append((nome, obter_pool().enviar(docx), docx))
+
+    buf = io.BytesIO()
+    usados = set()
+    with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as z:
+        for nome, fut, docx in pendentes:
+            base, ext = os.path.splitext(nome)
+            n = 1
+            while nome in usados:
+                n += 1
+                nome = f"{base}_{n}{ext}"
+            usados.add(nome)
+            if fut is None:
+                pdf = converter_para_pdf(docx)
+            else:
+                pdf = fut.result()  # cada conversão já tem o watchdog do worker
+                # grava no cache (não reconverte: o valor já está pronto)
+                pdf = obter_do_cache(
+                    hashlib.sha256(docx).hexdigest(),
+                    lambda pdf=pdf: pdf,
+                    diretorio=DIR_CACHE_PDF,
+                    extensao=".pdf",
+                    limite=LIMITE_BYTES_PDF,
+                )
+            z.writestr(nome, pdf)
+    return buf.getvalue()
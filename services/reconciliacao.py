@@ -0,0 +1,381 @@
+"""
+Reconciliação entre contratos/ e o banco, em segundo plano.
+
+Duas varreduras incrementais, cada uma com checkpoint no banco
+(reconciliacao_estado), então o custo por execução fica limitado mesmo com
+centenas de milhares de arquivos:
+
+- disco -> banco: os arquivos de contratos/ com mtime depois do checkpoint
+  (ordem: mtime, nome). Para cada arquivo:
+    sem contrato (ex.: falha entre gravar o DOCX e atualizar o banco)
+      -> órfão: vai para a quarentena (ou é removido com --remover-orfaos);
+    só de contratos excluídos -> removido;
+    um contrato ativo com sha256 diferente do gravado (arquivo editado ou
+      regravado por fora) -> o hash gravado é atualizado, nada é desvinculado;
+    mais de um contrato ativo no mesmo caminho (números que viram o mesmo
+      nome de arquivo) -> COLISAO: fica com o arquivo o mais recente cujo
+      hash bate (sem nenhum, o mais recente); os outros são desvinculados e
+      o download deles passa a renderizar do banco.
+  Arquivos mais novos que a carência ficam para a próxima execução (a
+  criação grava o arquivo antes de registrar o caminho).
+- banco -> disco: contratos alterados depois do checkpoint (atualizado_em, id),
+  mais uma ronda de RONDA_POR_EXECUCAO contratos por id (pega arquivos
+  apagados por fora, que não deixam rastro nem no banco nem no diretório):
+    excluído -> remove o arquivo (antes era feito na UI, no clique);
+    ativo sem o arquivo -> AUSENTE (volta ao normal se o arquivo reaparecer).
+
+Caminhos ainda usados por contratos arquivados (arq.contratos, no
+arquivo.db) nunca contam como órfãos nem são removidos.
+
+Com várias réplicas no PostgreSQL, cada passada roda em uma só
+(trava_exclusiva); as outras pulam a vez.
+
+A quarentena (contratos/_quarentena) é esvaziada QUARENTENA_DIAS depois de o
+arquivo entrar nela (o mtime é carimbado na hora da mudança).
+
+    python -m services.reconciliacao --max-arquivos 5000
+    python -m services.reconciliacao --completo      # ignora os checkpoints
+"""
+import argparse
+import hashlib
+import os
+import threading
+import time
+
+from services.arquivo import arquivos_referenciados
+from services.banco import (
+    contar_arquivos_sinalizados,
+    contratos_por_arquivo,
+    gravar_estado_reconciliacao,
+    ler_estado_reconciliacao,
+    listar_contratos_alterados,
+    listar_contratos_com_arquivo,
+    marcar_arquivos_contratos,
+    trava_exclusiva,
+)
+
+DIR_CONTRATOS = "contratos"
+DIR_QUARENTENA = os.path.join(DIR_CONTRATOS, "_quarentena")
+CARENCIA_S = int(os.getenv("RECONCILIACAO_CARENCIA_S", "300"))
+QUARENTENA_DIAS = int(os.getenv("RECONCILIACAO_QUARENTENA_DIAS", "30"))
+INTERVALO_S = int(os.getenv("RECONCILIACAO_INTERVALO_S", "600"))
+TAMANHO_LOTE = 500
+MAX_POR_EXECUCAO = 5000
+
+AUSENTE = "AUSENTE"
+COLISAO = "COLISAO"
+
+_CP_DISCO = "disco"
+_CP_BANCO = "banco"
+_CP_RONDA = "ronda"
+RONDA_POR_EXECUCAO = int(os.getenv("RECONCILIACAO_RONDA", "1000"))
+
+
+# -----------------------------
+# Utilitários
+# -----------------------------
+def hash_arquivo(caminho: str) -> str:
+    h = hashlib.sha256()
+    with open(caminho, "rb") as f:
+        for bloco in iter(lambda: f.read(1 << 20), b""):
+            h.update(bloco)
+    return h.hexdigest()
+
+def _remover(caminho: str) -> bool:
+    try:
+        os.remove(caminho)
+        return True
+    except FileNotFoundError:
+        return False
+
+def _quarentenar(caminho: str) -> str | None:
+    os.makedirs(DIR_QUARENTENA, exist_ok=True)
+    destino = os.path.join(DIR_QUARENTENA, os.path.basename(caminho))
+    if os.path.exists(destino):
+        base, ext = os.path.splitext(destino)
+        destino = f"{base}.{time.time_ns()}{ext}"
+    try:
+        os.replace(caminho, destino)
+    except FileNotFoundError:
+        return None
+    # o rename preserva o mtime (o do último render, talvez antigo): carimba a
+    # entrada na quarentena, que é o que _esvaziar_quarentena compara
+    os.utime(destino)
+    return destino
+
+def _ler_checkpoint(chave: str) -> tuple:
+    valor = ler_estado_reconciliacao(chave)
+    if not valor:
+        return (0, "") if chave == _CP_DISCO else ("", 0)
+    a, b = valor.split("|", 1)
+    return (int(a), b) if chave == _CP_DISCO else (a, int(b))
+
+def _gravar_checkpoint(chave: str, cp: tuple):
+    gravar_estado_reconciliacao(chave, f"{cp[0]}|{cp[1]}")
+
+
+# -----------------------------
+# disco -> banco
+# -----------------------------
+def _novos_no_disco(depois_de: tuple, ate_ns: int) -> list:
+    """
+    (mtime_ns, nome) dos arquivos .docx de contratos/ entre o checkpoint e o
+    limite da carência, em ordem. Só lê o diretório e faz stat; nada é aberto.
+    """
+    if not os.path.isdir(DIR_CONTRATOS):
+        return []
+    novos = []
+    with os.scandir(DIR_CONTRATOS) as it:
+        for e in it:
+            if not e.name.endswith(".docx") or not e.is_file(follow_symlinks=False):
+                continue
+            chave = (e.stat(follow_symlinks=False).st_mtime_ns, e.name)
+            if depois_de < chave and chave[0] <= ate_ns:
+                novos.append(chave)
+    novos.sort()
+    return novos
+
+def _conferir_arquivos(lote: list, relatorio: dict, remover_orfaos: bool):
+    caminhos = {nome: os.path.join(DIR_CONTRATOS, nome) for _mtime, nome in lote}
+    donos = contratos_por_arquivo(caminhos.values())
+    sem_ativo = [c for c in caminhos.values() if not any(not d[2] for d in donos.get(c, []))]
+    arquivados = arquivos_referenciados(sem_ativo)
+    marcacoes = []
+
+    for nome, caminho in caminhos.items():
+        contratos = donos.get(caminho, [])
+        ativos = [c for c in contratos if not c[2]]
+
+        if not ativos and caminho in arquivados:
+            continue
+        if not contratos:
+            if remover_orfaos:
+                relatorio["orfaos_removidos"] += _remover(caminho)
+            elif _quarentenar(caminho):
+                relatorio["orfaos_em_quarentena"] += 1
+            continue
+        if not ativos:
+            relatorio["removidos_excluidos"] += _remover(caminho)
+            continue
+
+        try:
+            atual = hash_arquivo(caminho)
+        except FileNotFoundError:
+            continue  # sumiu no meio do caminho: a varredura do banco sinaliza
+
+        # dono: o ativo mais recente cujo hash bate (foi o último a gravar);
+        # nenhum bate (editado por fora, base sem hash): o mais recente.
+        # Com um único ativo não há disputa: só o hash gravado é atualizado.
+        dono = next((c for c in reversed(ativos) if c[1] == atual), ativos[-1])
+        if dono[1] is not None and dono[1] != atual:
+            relatorio["hashes_atualizados"] += 1
+
+        for cid, _hash, _excluido, renderizavel in ativos:
+            if cid == dono[0]:
+                marcacoes.append((cid, None, atual, False))
+            else:
+                relatorio["colisoes"] += 1
+                marcacoes.append((cid, COLISAO, None, renderizavel))
+
+    if marcacoes:
+        marcar_arquivos_contratos(marcacoes)
+
+def _varrer_disco(limite: int, relatorio: dict, remover_orfaos: bool, carencia_s: int) -> bool:
+    """
+    Retorna True se ainda restaram arquivos para a próxima execução.
+    """
+    cp = _ler_checkpoint(_CP_DISCO)
+    ate_ns = time.time_ns() - carencia_s * 1_000_000_000
+    novos = _novos_no_disco(cp, ate_ns)
+
+    for i in range(0, min(len(novos), limite), TAMANHO_LOTE):
+        lote = novos[i:min(i + TAMANHO_LOTE, limite)]
+        _conferir_arquivos(lote, relatorio, remover_orfaos)
+        relatorio["arquivos"] += len(lote)
+        _gravar_checkpoint(_CP_DISCO, lote[-1])
+
+    return len(novos) > limite
+
+
+# -----------------------------
+# banco -> disco
+# -----------------------------
+def _conferir_contratos(rows, relatorio: dict):
+    excluidos = {}
+    marcacoes = []
+    for cid, arquivo, situacao, excluido, _atualizado_em in rows:
+        if excluido:
+            excluidos[arquivo] = cid
+        elif not os.path.exists(arquivo):
+            if situacao != AUSENTE:
+                relatorio["ausentes"] += 1
+                marcacoes.append((cid, AUSENTE, None, False))
+        elif situacao == AUSENTE:
+            marcacoes.append((cid, None, None, False))
+
+    if excluidos:
+        # só remove se nenhum contrato ativo usa o mesmo caminho (colisão)
+        donos = contratos_por_arquivo(excluidos)
+        arquivados = arquivos_referenciados(excluidos)
+        for arquivo in excluidos:
+            if not any(not c[2] for c in donos.get(arquivo, [])) and arquivo not in arquivados:
+                relatorio["removidos_excluidos"] += _remover(arquivo)
+    if marcacoes:
+        marcar_arquivos_contratos(marcacoes)
+    relatorio["contratos"] += len(rows)
+
+def _varrer_banco(limite: int, relatorio: dict) -> bool:
+    """
+    Contratos alterados desde o checkpoint (exclusões, arquivos novos).
+    Retorna True se ainda restaram contratos para a próxima execução.
+    """
+    cp = _ler_checkpoint(_CP_BANCO)
+    vistos = 0
+    while vistos < limite:
+        rows = listar_contratos_alterados(cp, min(TAMANHO_LOTE, limite - vistos))
+        if not rows:
+            return False
+        _conferir_contratos(rows, relatorio)
+        vistos += len(rows)
+        cp = (rows[-1][4], rows[-1][0])
+        _gravar_checkpoint(_CP_BANCO, cp)
+    return True
+
+def _ronda_banco(limite: int, relatorio: dict):
+    """
+    Arquivo apagado por fora não altera nada no banco nem aparece no
+    diretório: uma ronda por id confere `limite` contratos por execução e
+    recomeça do início ao chegar ao fim.
+    """
+    valor = ler_estado_reconciliacao(_CP_RONDA)
+    ultimo_id = int(valor) if valor else 0
+    rows = listar_contratos_com_arquivo(ultimo_id, limite)
+    _conferir_contratos(rows, relatorio)
+    gravar_estado_reconciliacao(_CP_RONDA, str(rows[-1][0]) if len(rows) == limite else None)
+
+
+def _esvaziar_quarentena(dias: int) -> int:
+    if not os.path.isdir(DIR_QUARENTENA):
+        return 0
+    corte = time.time() - dias * 86400
+    removidos = 0
+    with os.scandir(DIR_QUARENTENA) as it:
+        for e in it:
+            if e.is_file(follow_symlinks=False) and e.stat().st_mtime < corte:
+                removidos += _remover(e.path)
+    return removidos
+
+
+# -----------------------------
+# Execução
+# -----------------------------
+def reconciliar(
+    max_arquivos: int = MAX_POR_EXECUCAO,
+    max_contratos: int = MAX_POR_EXECUCAO,
+    ronda: int = RONDA_POR_EXECUCAO,
+    remover_orfaos: bool = False,
+    completo: bool = False,
+    carencia_s: int = CARENCIA_S,
+) -> dict:
+    """
+    Executa (ou continua) as duas varreduras, até os limites por execução.
+    completo=True descarta os checkpoints e confere tudo de novo
+    (a ronda, porém, continua limitada a `ronda` contratos).
+    Se outra réplica já estiver reconciliando, retorna {"outra_replica": True, ...}.
+    """
+    with trava_exclusiva("reconciliacao") as minha:
+        if not minha:
+            return {"outra_replica": True, "pendente": False}
+        return _reconciliar(max_arquivos, max_contratos, ronda, remover_orfaos, completo, carencia_s)
+
+def _reconciliar(max_arquivos, max_contratos, ronda, remover_orfaos, completo, carencia_s) -> dict:
+    if completo:
+        gravar_estado_reconciliacao(_CP_DISCO, None)
+        gravar_estado_reconciliacao(_CP_BANCO, None)
+        gravar_estado_reconciliacao(_CP_RONDA, None)
+
+    t0 = time.perf_counter()
+    relatorio = {
+        "arquivos": 0,
+        "contratos": 0,
+        "orfaos_em_quarentena": 0,
+        "orfaos_removidos": 0,
+        "removidos_excluidos": 0,
+        "colisoes": 0,
+        "hashes_atualizados": 0,
+        "ausentes": 0,
+    }
+    pendente_disco = _varrer_disco(max_arquivos, relatorio, remover_orfaos, carencia_s)
+    pendente_banco = _varrer_banco(max_contratos, relatorio)
+    _ronda_banco(ronda, relatorio)
+    relatorio["quarentena_esvaziada"] = _esvaziar_quarentena(QUARENTENA_DIAS)
+    relatorio["pendente"] = pendente_disco or pendente_banco
+    relatorio["sinalizados"] = contar_arquivos_sinalizados()
+    relatorio["segundos"] = round(time.perf_counter() - t0, 2)
+    return relatorio
+
+
+_thread = None
+ultima_execucao = {}  # último relatório (ou {"erro": ...}) da thread de fundo
+
+
+def iniciar_em_segundo_plano(intervalo_s: int = INTERVALO_S):
+    """
+    Sobe (uma vez por processo) uma thread daemon que reconcilia a cada
+    intervalo_s segundos; com trabalho pendente, emenda a próxima execução.
+    intervalo_s <= 0 desliga.
+    """
+    global _thread
+    if intervalo_s <= 0 or (_thread is not None and _thread.is_alive()):
+        return
+
+    def _loop():
+        while True:
+            try:
+                r = reconciliar()
+                ultima_execucao.clear()
+                ultima_execucao.update(r)
+            except Exception as e:
+                r = {}
+                ultima_execucao.clear()
+                ultima_execucao["erro"] = str(e)
+            if not r.get("pendente"):
+                time.sleep(intervalo_s)
+
+    _thread = threading.Thread(target=_loop, name="reconciliacao", daemon=True)
+    _thread.start()
+
+
+def _main():
+    ap = argparse.ArgumentParser(description="Reconcilia contratos/ com o banco (órfãos, excluídos, ausentes, colisões)")
+    ap.add_argument("--max-arquivos", type=int, default=MAX_POR_EXECUCAO)
+    ap.add_argument("--max-contratos", type=int, default=MAX_POR_EXECUCAO)
+    ap.add_argument("--ronda", type=int, default=RONDA_POR_EXECUCAO, help="contratos conferidos por id a cada execução")
+    ap.add_argument("--carencia", type=int, default=CARENCIA_S, help="ignora arquivos com menos de N segundos")
+    ap.add_argument("--remover-orfaos", action="store_true", help="remove os órfãos em vez de mover para a quarentena")
+    ap.add_argument("--completo", action="store_true", help="ignora os checkpoints e confere tudo")
+    args = ap.parse_args()
+
+    r = reconciliar(
+        max_arquivos=args.max_arquivos,
+        max_contratos=args.max_contratos,
+        ronda=args.ronda,
+        remover_orfaos=args.remover_orfaos,
+        completo=args.completo,
+        carencia_s=args.carencia,
+    )
+    if r.get("outra_replica"):
+        print("Outra réplica está reconciliando agora; nada feito.")
+        return
+    estado = "parcial (rode de novo para continuar)" if r["pendente"] else "em dia"
+    print(f"{r['arquivos']} arquivo(s) e {r['contratos']} contrato(s) conferidos em {r['segundos']}s ({estado})")
+    print(f"  órfãos: {r['orfaos_em_quarentena']} em quarentena, {r['orfaos_removidos']} removido(s)")
+    print(f"  arquivos de contratos excluídos removidos: {r['removidos_excluidos']}")
+    print(f"  colisões: {r['colisoes']}  ausentes: {r['ausentes']}  quarentena esvaziada: {r['quarentena_esvaziada']}")
+    print(f"  hashes atualizados (arquivo alterado por fora): {r['hashes_atualizados']}")
+    if r["sinalizados"]:
+        print("  sinalizados no banco: " + ", ".join(f"{k}={v}" for k, v in sorted(r["sinalizados"].items())))
+
+
+if __name__ == "__main__":
+    _main()
@@ -0,0 +1,208 @@
+"""
+Re-render em massa depois de uma troca de modelo: todos os contratos de um
+tipo_modelo ainda em andamento (qualquer etapa menos FINALIZADO, não
+excluídos) passam para a versão ativa do modelo.
+
+- Seleção em páginas por id de quem ainda não está na versão ativa (hash):
+  interromper e rodar de novo retoma de onde parou, sem estado extra. Um
+  lote interrompido entre gravar os arquivos e o UPDATE é refeito igual,
+  porque o render é determinístico (mesmo modelo + mesmos valores => mesmos
+  bytes).
+- Valores: montados de novo a partir do cadastro do fornecedor guardado
+  (tabela fornecedores); sem cadastro, os gravados na criação. Os valores
+  usados ficam no contrato (o render sob demanda reproduz o mesmo DOCX).
+- Render num ProcessPoolExecutor (python-docx é CPU puro): cada processo
+  recebe o modelo uma vez e grava o DOCX novo num .tmp ao lado do arquivo
+  (o reconciliador só olha *.docx). Contratos sem arquivo (materialização
+  lazy) só trocam de versão.
+- Contrato finalizado ou excluído durante o job não é tocado: o lote é
+  conferido de novo antes de ir para o pool, e os .tmp só substituem os
+  arquivos (os.replace) dentro da transação do UPDATE, com as linhas
+  travadas e só para quem continua em andamento; os outros .tmp são apagados.
+- 1 UPDATE por lote (versão, valores, sha256 do arquivo); falhas ficam na
+  versão antiga e entram na próxima execução.
+Os renders do lote não entram nas estatísticas do modelo (tela de Modelos).
+
+    python -m services.rerender NDA --workers 4
+"""
+import argparse
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from services.banco import (
+    contar_contratos_para_rerender,
+    filtrar_contratos_para_rerender,
+    listar_contratos_para_rerender,
+    registrar_rerender_lote,
+)
+from services.modelos import carregar_modelo, modelo_ativo
+
+FINALIZADO = "FINALIZADO"
+TAMANHO_LOTE = 200
+
+
+# -----------------------------
+# Worker (processo do pool)
+# -----------------------------
+_modelo = {}
+
+
+def _iniciar_worker(conteudo: bytes, manifesto: dict):
+    _modelo["conteudo"] = conteudo
+    _modelo["manifesto"] = manifesto
+
+def _renderizar_para_tmp(tmp: str, subs: dict) -> str:
+    """
+    Renderiza com o modelo do worker, grava em `tmp` e devolve o sha256.
+    """
+    from services.contrato import renderizar_docx
+
+    blob = renderizar_docx(_modelo["conteudo"], _modelo["manifesto"], subs)
+    os.makedirs(os.path.dirname(tmp) or ".", exist_ok=True)
+    with open(tmp, "wb") as f:
+        f.write(blob)
+    return hashlib.sha256(blob).hexdigest()
+
+
+# -----------------------------
+# Job
+# -----------------------------
+def _substituicoes(numero: str, subs_json: str | None, cadastro_json: str | None) -> dict | None:
+    from services.contrato import montar_substituicoes
+
+    if cadastro_json:
+        return montar_substituicoes(json.loads(cadastro_json), numero)
+    return json.loads(subs_json) if subs_json else None
+
+def _apagar(caminho: str):
+    try:
+        os.remove(caminho)
+    except FileNotFoundError:
+        pass
+
+def _medir(relatorio: dict, t0: float):
+    relatorio["segundos"] = round(time.perf_counter() - t0, 2)
+    if relatorio["segundos"]:
+        relatorio["por_segundo"] = round(relatorio["renderizados"] / relatorio["segundos"], 1)
+
+def rerenderizar(
+    tipo_modelo: str,
+    workers: int | None = None,
+    tamanho_lote: int = TAMANHO_LOTE,
+    max_contratos: int | None = None,
+    progresso=None,
+) -> dict:
+    """
+    Passa os contratos em andamento de `tipo_modelo` para a versão ativa.
+    progresso(relatorio) é chamado ao fim de cada lote.
+    Retorna {modelo, versao, pendentes, renderizados, so_versao, pulados, falhas, segundos, por_segundo}
+    (pulados: finalizados ou excluídos enquanto o job rodava).
+    """
+    versao, modelo_hash = modelo_ativo(tipo_modelo)
+    carregado = carregar_modelo(modelo_hash)
+    if carregado is None:
+        raise ValueError(f"Versão ativa de {tipo_modelo} não encontrada no registro.")
+
+    relatorio = {
+        "modelo": tipo_modelo,
+        "versao": versao,
+        "pendentes": contar_contratos_para_rerender(tipo_modelo, modelo_hash, FINALIZADO),
+        "renderizados": 0,
+        "so_versao": 0,
+        "pulados": 0,
+        "falhas": [],
+        "segundos": 0.0,
+        "por_segundo": 0.0,
+    }
+    t0 = time.perf_counter()
+    feitos = 0
+    depois_de = 0
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_iniciar_worker, initargs=carregado) as pool:
+        while max_contratos is None or feitos < max_contratos:
+            limite = tamanho_lote if max_contratos is None else min(tamanho_lote, max_contratos - feitos)
+            rows = listar_contratos_para_rerender(tipo_modelo, modelo_hash, FINALIZADO, depois_de, limite)
+            if not rows:
+                break
+            depois_de = rows[-1][0]
+            feitos += len(rows)
+
+            # a listagem pode ter ficado velha enquanto o lote anterior renderizava
+            ainda_pendentes = filtrar_contratos_para_rerender([r[0] for r in rows], tipo_modelo, modelo_hash, FINALIZADO)
+
+            gravados = []
+            tarefas = {}
+            tmps = {}  # contrato_id -> (tmp, arquivo)
+            for contrato_id, numero, arquivo, subs_json, cadastro_json in rows:
+                if contrato_id not in ainda_pendentes:
+                    relatorio["pulados"] += 1
+                    continue
+                subs = _substituicoes(numero, subs_json, cadastro_json)
+                if subs is None:
+                    relatorio["falhas"].append((contrato_id, "sem valores de substituição nem cadastro do fornecedor"))
+                elif arquivo:
+                    tmps[contrato_id] = (f"{arquivo}.{contrato_id}.tmp", arquivo)
+                    tarefas[pool.submit(_renderizar_para_tmp, tmps[contrato_id][0], subs)] = (contrato_id, subs)
+                else:
+                    gravados.append((contrato_id, subs, None))
+
+            for futuro in as_completed(tarefas):
+                contrato_id, subs = tarefas[futuro]
+                try:
+                    gravados.append((contrato_id, subs, futuro.result()))
+                except Exception as e:
+                    _apagar(tmps.pop(contrato_id)[0])
+                    relatorio["falhas"].append((contrato_id, str(e)))
+
+            def _colocar_arquivos(ids):
+                for contrato_id in ids:
+                    if contrato_id in tmps:
+                        tmp, arquivo = tmps.pop(contrato_id)
+                        os.replace(tmp, arquivo)
+                        relatorio["renderizados"] += 1
+                    else:
+                        relatorio["so_versao"] += 1
+
+            try:
+                registrados = registrar_rerender_lote(
+                    tipo_modelo, modelo_hash, versao, gravados, FINALIZADO, _colocar_arquivos
+                )
+            finally:
+                for tmp, _arquivo in tmps.values():  # finalizados/excluídos no meio do caminho (ou erro)
+                    _apagar(tmp)
+            relatorio["pulados"] += len(gravados) - len(registrados)
+
+            _medir(relatorio, t0)
+            if progresso:
+                progresso(relatorio)
+
+    _medir(relatorio, t0)
+    return relatorio
+
+
+def _main():
+    ap = argparse.ArgumentParser(description="Renderiza de novo, na versão ativa do modelo, os contratos em andamento")
+    ap.add_argument("tipo_modelo", help='nome do modelo, ex.: "NDA"')
+    ap.add_argument("--workers", type=int, default=None, help="processos de render (padrão: nº de CPUs)")
+    ap.add_argument("--lote", type=int, default=TAMANHO_LOTE)
+    ap.add_argument("--max-contratos", type=int, default=None, help="para depois de N (rode de novo para continuar)")
+    args = ap.parse_args()
+
+    def _progresso(r):
+        feitos = r["renderizados"] + r["so_versao"] + r["pulados"] + len(r["falhas"])
+        print(f"  {feitos}/{r['pendentes']}  {r['por_segundo']} contratos/s", flush=True)
+
+    r = rerenderizar(args.tipo_modelo, args.workers, args.lote, args.max_contratos, _progresso)
+    print(
+        f"{r['modelo']} v{r['versao']}: {r['renderizados']} renderizado(s), {r['so_versao']} só trocaram de versão, "
+        f"{r['pulados']} finalizado(s)/excluído(s) no meio do caminho, {len(r['falhas'])} falha(s) em {r['segundos']}s ({r['por_segundo']} contratos/s)"
+    )
+    for contrato_id, erro in r["falhas"]:
+        print(f"  falha no contrato {contrato_id}: {erro}")
+
+
+if __name__ == "__main__":
+    _main()
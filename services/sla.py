@@ -0,0 +1,101 @@
+from datetime import datetime, timedelta
+
+from services.banco import obter_status_logs
+
+
+# -----------------------------
+# SLA (horas úteis seg-sex 09-18)
+# -----------------------------
+def parse_iso(ts: str) -> datetime:
+    # banco salva ISO com timezone UTC
+    return datetime.fromisoformat(ts)
+
+def business_seconds(start: datetime, end: datetime) -> int:
+    """
+    Conta segundos dentro do horário útil (09:00–18:00) em dias úteis (seg-sex).
+    Observação: Streamlit Cloud roda em UTC; aqui consideramos 09–18 UTC.
+    Se quiser 09–18 America/Sao_Paulo, eu ajusto com timezone depois.
+    """
+    if not start or not end or end <= start:
+        return 0
+
+    work_start_h = 9
+    work_end_h = 18
+
+    cur = start
+    total = 0
+
+    while cur < end:
+        # fim de semana
+        if cur.weekday() >= 5:
+            cur = datetime(cur.year, cur.month, cur.day, 0, 0, tzinfo=cur.tzinfo) + timedelta(days=1)
+            continue
+
+        day_start = datetime(cur.year, cur.month, cur.day, work_start_h, 0, tzinfo=cur.tzinfo)
+        day_end = datetime(cur.year, cur.month, cur.day, work_end_h, 0, tzinfo=cur.tzinfo)
+
+        window_start = max(cur, day_start)
+        window_end = min(end, day_end)
+
+        if window_end > window_start:
+            total += int((window_end - window_start).total_seconds())
+
+        cur = datetime(cur.year, cur.month, cur.day, 0, 0, tzinfo=cur.tzinfo) + timedelta(days=1)
+
+    return total
+
+def sec_to_hours(sec: int) -> float:
+    return round(sec / 3600, 2)
+
+def sec_to_business_days(sec: int) -> float:
+    # 9h úteis = 1 dia útil
+    return round((sec / 3600) / 9, 2)
+
+def sla_por_etapa(contrato_id: int) -> dict:
+    """
+    Retorna {status: segundos_uteis} para um contrato, até FINALIZADO.
+    Usa status_log (entrada em cada etapa).
+    """
+    logs = obter_status_logs(contrato_id)  # (de_status, para_status, alterado_em)
+    timeline = []
+    for _de, para, ts in logs:
+        if para and ts:
+            timeline.append((para, parse_iso(ts)))
+
+    if not timeline:
+        return {}
+
+    by_stage = {}
+    for i, (status_i, t_i) in enumerate(timeline):
+        if status_i == "FINALIZADO":
+            break
+        if i + 1 >= len(timeline):
+            break
+        status_next, t_next = timeline[i + 1]
+        # Se o próximo já é FINALIZADO, conta tempo até ele e para
+        sec = business_seconds(t_i, t_next)
+        by_stage[status_i] = by_stage.get(status_i, 0) + sec
+        if status_next == "FINALIZADO":
+            break
+
+    return by_stage
+
+def sla_medias_finalizados():
+    """
+    Retorna médias (dias úteis) para:
+      - Total (criado_em -> finalizado_em)
+      - Por etapa: Jurídico, Demandante, Fornecedor (e fila se quiser)
+    Considera apenas contratos FINALIZADOS.
+    (Calculado pela análise vetorizada; ver services/sla_analise.py.)
+    """
+    from services.sla_analise import analisar_sla
+
+    r = analisar_sla()
+    if not r:
+        return None
+
+    return {
+        "N": r["N"],
+        "TOTAL_DIAS_UTEIS": r["TOTAL"]["media"],
+        "POR_ETAPA_DIAS_UTEIS": {k: v["media"] for k, v in r["POR_ETAPA"].items()},
+    }
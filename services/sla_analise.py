@@ -0,0 +1,246 @@
+"""
+Análise de SLA vetorizada (numpy): percentis p50/p90/p95 e média em dias
+úteis, por etapa, com filtros (período, modelo, fornecedor) e quebra por mês.
+
+Tudo vem de UMA consulta (contratos finalizados + status_log) e o cálculo
+de horas úteis é feito em forma fechada sobre arrays, sem laço por dia.
+Resultados ficam em cache por (filtros, geração dos dados).
+"""
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+import numpy as np
+
+from services.banco import conectar, geracao_dados, listar_mais_antigos_por_etapa
+from services.status import STATUS_ORDEM
+
+HORA_INICIO = 9
+HORA_FIM = 18
+SEG_DIA_UTIL = (HORA_FIM - HORA_INICIO) * 3600  # 9h úteis = 1 dia útil
+PERCENTIS = (50, 90, 95)
+
+ETAPAS_SLA = [s for s in STATUS_ORDEM if s != "FINALIZADO"]
+_CODIGO_ETAPA = {s: i for i, s in enumerate(STATUS_ORDEM)}
+_FINALIZADO = _CODIGO_ETAPA["FINALIZADO"]
+
+# 1970-01-01 foi quinta (weekday 3). _UTEIS_ANTES[r] = dias úteis entre
+# os r primeiros dias de uma "semana" que começa numa quinta.
+_UTEIS_ANTES = np.array([sum(1 for k in range(r) if (3 + k) % 7 < 5) for r in range(8)], dtype=np.int64)
+
+
+# -----------------------------
+# Horas úteis em forma fechada
+# -----------------------------
+def segundos_uteis_acumulados(epoch) -> np.ndarray:
+    """
+    Segundos úteis (seg-sex, 09–18 UTC) desde 1970-01-01 até cada instante.
+    business_seconds(a, b) == acumulado(b) - acumulado(a).
+    """
+    t = np.asarray(epoch, dtype=np.float64)
+    dia = np.floor(t / 86400).astype(np.int64)
+    seg_no_dia = t - dia * 86400.0
+
+    semanas, resto = np.divmod(dia, 7)
+    dias_uteis = semanas * 5 + _UTEIS_ANTES[resto]
+
+    dia_util = (dia + 3) % 7 < 5
+    parcial = np.clip(seg_no_dia - HORA_INICIO * 3600, 0, SEG_DIA_UTIL) * dia_util
+
+    return dias_uteis * SEG_DIA_UTIL + parcial
+
+def iso_para_epoch(valores) -> np.ndarray:
+    """
+    Converte ISO-8601 (como salvo pelo banco, em UTC) para epoch em segundos.
+    Caminho rápido via datetime64 quando tudo termina em +00:00.
+    """
+    if len(valores) == 0:
+        return np.zeros(0, dtype=np.float64)
+
+    arr = np.asarray(valores, dtype=str)
+    if np.char.endswith(arr, "+00:00").all():
+        sem_tz = np.char.replace(arr, "+00:00", "")
+        return sem_tz.astype("datetime64[us]").astype(np.int64) / 1e6
+
+    return np.array([datetime.fromisoformat(v).timestamp() for v in valores], dtype=np.float64)
+
+
+# -----------------------------
+# Consulta única
+# -----------------------------
+def _carregar(inicio: str | None, fim: str | None, tipo_modelo: str | None, fornecedor_cnpj: str | None):
+    """
+    Uma consulta: finalizados (filtrados) + seus logs, já ordenados por contrato/log.
+    """
+    sql = """
+        SELECT c.id, COALESCE(c.criado_em,''), COALESCE(c.finalizado_em,''),
+               COALESCE(l.para_status,''), COALESCE(l.alterado_em,'')
+        FROM contratos c
+        LEFT JOIN status_log l ON l.contrato_id = c.id
+        WHERE c.status = 'FINALIZADO'
+          AND (c.excluido_em IS NULL OR c.excluido_em = '')
+          AND COALESCE(c.criado_em,'') != ''
+          AND COALESCE(c.finalizado_em,'') != ''
+    """
+    params = []
+    if inicio:
+        sql += " AND c.finalizado_em >= ?"
+        params.append(inicio)
+    if fim:
+        sql += " AND c.finalizado_em < ?"
+        params.append(fim)
+    if tipo_modelo:
+        sql += " AND c.tipo_modelo = ?"
+        params.append(tipo_modelo)
+    if fornecedor_cnpj:
+        sql += " AND c.fornecedor_cnpj = ?"
+        params.append(fornecedor_cnpj)
+    sql += " ORDER BY c.id, l.id"
+
+    conn = conectar()
+    cur = conn.cursor()
+    cur.execute(sql, params)
+    rows = cur.fetchall()
+    conn.close()
+    return rows
+
+
+# -----------------------------
+# Cálculo vetorizado
+# -----------------------------
+def _estatisticas(segundos: np.ndarray) -> dict:
+    if segundos.size == 0:
+        return {"media": 0.0, **{f"p{p}": 0.0 for p in PERCENTIS}}
+    dias = segundos / SEG_DIA_UTIL
+    pct = np.percentile(dias, PERCENTIS)
+    return {
+        "media": round(float(dias.mean()), 2),
+        **{f"p{p}": round(float(v), 2) for p, v in zip(PERCENTIS, pct)},
+    }
+
+def _resumo(total: np.ndarray, por_etapa: np.ndarray, mascara=None) -> dict:
+    if mascara is not None:
+        total = total[mascara]
+        por_etapa = por_etapa[mascara]
+    return {
+        "N": int(total.size),
+        "TOTAL": _estatisticas(total),
+        "POR_ETAPA": {s: _estatisticas(por_etapa[:, _CODIGO_ETAPA[s]]) for s in ETAPAS_SLA},
+    }
+
+def _calcular(rows, por_mes: bool) -> dict | None:
+    if not rows:
+        return None
+
+    ids = np.fromiter((r[0] for r in rows), dtype=np.int64, count=len(rows))
+
+    # 1 linha por contrato (a primeira de cada grupo)
+    novo = np.ones(len(rows), dtype=bool)
+    novo[1:] = ids[1:] != ids[:-1]
+    inicio_grupo = np.flatnonzero(novo)
+    grupo = np.cumsum(novo) - 1
+    n = inicio_grupo.size
+
+    criado = iso_para_epoch([rows[i][1] for i in inicio_grupo])
+    finalizado = iso_para_epoch([rows[i][2] for i in inicio_grupo])
+    total = np.maximum(segundos_uteis_acumulados(finalizado) - segundos_uteis_acumulados(criado), 0)
+
+    # timeline de logs (só linhas com status + data)
+    etapa = np.fromiter((_CODIGO_ETAPA.get(r[3], -1) if r[4] else -1 for r in rows), dtype=np.int64, count=len(rows))
+    tem_log = etapa >= 0
+    idx_log = np.flatnonzero(tem_log)
+    etapa = etapa[idx_log]
+    grupo_log = grupo[idx_log]
+    t = segundos_uteis_acumulados(iso_para_epoch([rows[i][4] for i in idx_log]))
+
+    por_etapa = np.zeros((n, len(STATUS_ORDEM)), dtype=np.float64)
+    if idx_log.size > 1:
+        # FINALIZADO já visto (inclusive) dentro do contrato: depois dele nada conta
+        fin = (etapa == _FINALIZADO).astype(np.int64)
+        acum = np.cumsum(fin)
+        inicio_log = np.ones(idx_log.size, dtype=bool)
+        inicio_log[1:] = grupo_log[1:] != grupo_log[:-1]
+        base = (acum - fin)[np.flatnonzero(inicio_log)]
+        visto = acum - base[np.cumsum(inicio_log) - 1]
+
+        i = np.arange(idx_log.size - 1)
+        valido = (grupo_log[i] == grupo_log[i + 1]) & (visto[i] == 0)
+        i = i[valido]
+        dur = np.maximum(t[i + 1] - t[i], 0)
+        np.add.at(por_etapa, (grupo_log[i], etapa[i]), dur)
+
+    resultado = _resumo(total, por_etapa)
+
+    if por_mes:
+        meses = np.array([rows[i][2][:7] for i in inicio_grupo])
+        resultado["POR_MES"] = {
+            m: _resumo(total, por_etapa, meses == m)
+            for m in sorted(set(meses.tolist()))
+        }
+
+    return resultado
+
+
+# -----------------------------
+# API pública (com cache)
+# -----------------------------
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+_CACHE_MAX = 64
+
+def analisar_sla(
+    inicio: str | None = None,
+    fim: str | None = None,
+    tipo_modelo: str | None = None,
+    fornecedor_cnpj: str | None = None,
+    por_mes: bool = False,
+) -> dict | None:
+    """
+    Estatísticas de SLA (dias úteis) dos contratos FINALIZADOS.
+    inicio/fim filtram finalizado_em (ISO, fim exclusivo).
+    Retorna None se não houver contratos no filtro.
+    """
+    chave = (inicio, fim, tipo_modelo, fornecedor_cnpj, por_mes, geracao_dados())
+    with _cache_lock:
+        if chave in _cache:
+            _cache.move_to_end(chave)
+            return _cache[chave]
+
+    resultado = _calcular(_carregar(inicio, fim, tipo_modelo, fornecedor_cnpj), por_mes)
+
+    with _cache_lock:
+        _cache[chave] = resultado
+        while len(_cache) > _CACHE_MAX:
+            _cache.popitem(last=False)
+    return resultado
+
+
+# -----------------------------
+# Envelhecimento (contratos em andamento)
+# -----------------------------
+def contratos_parados(k: int = 10, agora: datetime | None = None) -> dict:
+    """
+    Para cada etapa em andamento, os K contratos há mais tempo nela, com a idade
+    em dias úteis calculada em lote (sem ler o status_log).
+    Retorna {etapa: [{id, numero, fornecedor, tipo_modelo, desde, dias_uteis}, ...]}.
+    """
+    rows = listar_mais_antigos_por_etapa(ETAPAS_SLA, k)
+    resultado = {e: [] for e in ETAPAS_SLA}
+    if not rows:
+        return resultado
+
+    agora = agora or datetime.now(timezone.utc)
+    desde = iso_para_epoch([r[5] for r in rows])
+    idade = segundos_uteis_acumulados(agora.timestamp()) - segundos_uteis_acumulados(desde)
+    dias = np.round(np.maximum(idade, 0) / SEG_DIA_UTIL, 2)
+
+    for (status, cid, numero, forn, tipo, entrada), d in zip(rows, dias.tolist()):
+        resultado[status].append({
+            "id": cid,
+            "numero": numero,
+            "fornecedor": forn,
+            "tipo_modelo": tipo,
+            "desde": entrada,
+            "dias_uteis": d,
+        })
+    return resultado
@@ -0,0 +1,17 @@
+STATUS_LABEL = {
+    "FILA_INICIO": "🧾 Fila de Início",
+    "ANALISE_JURIDICA_LGPD": "🟨 Jurídico/LGPD",
+    "ANALISE_DEMANDANTE": "🟦 Demandante",
+    "ANALISE_FORNECEDOR": "🟧 Fornecedor",
+    "FINALIZADO": "🟩 Finalizado",
+}
+STATUS_ORDEM = list(STATUS_LABEL.keys())
+
+# só existe no status_log (exclusão), não é etapa
+EXCLUIDO = "EXCLUIDO"
+
+# etapas em que cada perfil atua: recebe aviso quando um contrato entra nelas
+ETAPAS_POR_PERFIL = {
+    "ADMIN": ["FILA_INICIO"],
+    "DEMANDANTE": ["ANALISE_DEMANDANTE"],
+}